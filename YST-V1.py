@@ -1,67 +1,162 @@
 # YST-V1.py
 
-import gradio as gr
+import time
+_import_start = time.perf_counter()
+
+import argparse
+import inspect
+import os
+import tempfile
+
 import numpy as np
-import matplotlib.pyplot as plt
-import io
-from PIL import Image
-import math
-import calendar
-import pandas as pd
-import plotly.express as px
-
-# GHI values of Nigeria States
-ghi = {
-    'Abia': 4.71, 'Adamawa': 5.70, 'Akwa Ibom': 4.21, 'Anambra': 4.81, 'Bauchi': 5.77, 'Bayelsa': 4.88,
-    'Benue': 5.19, 'Borno': 5.90, 'Cross River': 4.74, 'Delta': 4.53, 'Ebonyi': 5.05, 'Edo': 4.66,
-    'Ekiti': 4.94, 'Enugu': 4.92, 'FCT': 5.45, 'Gombe': 5.77, 'Imo': 4.71, 'Jigawa': 6.16, 'Kaduna': 5.64,
-    'Kano': 5.87, 'Katsina': 5.94, 'Kebbi': 5.62, 'Kogi': 5.40, 'Kwara': 5.16, 'Lagos': 4.74, 'Nassarawa': 5.36,
-    'Niger': 5.51, 'Ogun': 4.74, 'Ondo': 4.66, 'Osun': 4.89, 'Oyo': 5.11, 'Plateau': 5.52, 'Rivers': 4.13,
-    'Sokoto': 6.24, 'Taraba': 5.53, 'Yobe': 6.11, 'Zamfara': 6.01
-}
-
-# Monthly variation factors
-monthly_variation_factors = {
-    'January': 0.95, 'February': 0.92, 'March': 0.97, 'April': 1.05,
-    'May': 1.12, 'June': 1.18, 'July': 1.20, 'August': 1.15,
-    'September': 1.08, 'October': 1.03, 'November': 0.98, 'December': 0.92
-}
-
-def calculate_monthly_pv_potential(panel_length, panel_width, panel_efficiency, inverter_efficiency, state):
-    ghi_value = ghi[state]
-    panel_area = panel_length * panel_width
-    panel_efficiency /= 100
-    inverter_efficiency /= 100
-
-    months = ['January', 'February', 'March', 'April', 'May', 'June',
-              'July', 'August', 'September', 'October', 'November', 'December']
-    monthly_factors = [monthly_variation_factors[month] for month in months]
-
-    monthly_pv_potential = [ghi_value * panel_area * panel_efficiency * inverter_efficiency * factor
-                            for factor in monthly_factors]
-
-    return monthly_pv_potential, months
-
-def plot_monthly_pv_potential(months, monthly_pv_potential, state):
-    # Plotting
-    plt.figure(figsize=(14, 6))
-    plt.plot(months, monthly_pv_potential, marker='o', linestyle='-', color='orange')
-    plt.title(f'Monthly PV Potential for a Single Panel in {state}')
-    plt.xlabel('Month')
-    plt.ylabel('PV Potential (kWh)')
-    plt.grid(True)
-    plt.tight_layout()
-
-    buf = io.BytesIO()
-    plt.savefig(buf, format='png')
-    plt.close()
-    buf.seek(0)
-    img = Image.open(buf)
-
-    return img
+
+import startup
+from pv_model import ghi, months, calculate_monthly_pv_potential, size_pv_system, calculate_emissions
+from charts import plot_monthly_pv_potential, plot_monthly_generation
+from cost_model import simulate_costs
+from monte_carlo import run_monte_carlo
+from optimizer import optimize_system
+from hourly_sim import simulate_hourly, LOAD_PROFILES, HOUR_MONTH
+from stage_graph import model_graph, GraphState
+from result_cache import normalize_key
+import irradiance
+import workers
+from instrumentation import instrumented, stage
+import instrumentation
+import scenario_store
+from scenario_store import recorded, report
+
+# Heavy UI/plotting/data libraries are imported on first use. The spawned simulation workers
+# re-import this script and never touch them. The server needs gradio before it can build the UI,
+# and importing gradio also imports pandas and matplotlib, so of these only plotly is still missing
+# once the server is listening; it is imported on first use or by the background pre-warm.
+gr = startup.LazyModule('gradio')
+pd = startup.LazyModule('pandas')
+px = startup.LazyModule('plotly.express')
+go = startup.LazyModule('plotly.graph_objects')
+portfolio = startup.LazyModule('portfolio')  # imports pandas
+startup.record('imports', time.perf_counter() - _import_start)
+
+# Rows of the Portfolio results table; every row is in the downloadable CSV
+PORTFOLIO_TABLE_ROWS = 1000
+
+def plot_percentile_bands(years, pv_bands, grid_bands, percentiles, title, yaxis_title):
+    # Shaded low-high band with the median line for each energy source
+    fig = go.Figure()
+    for name, bands, color in [('PV System', pv_bands, '#FDB813'), ('Grid Supply', grid_bands, '#0077c2')]:
+        low, median, high = bands
+        fig.add_trace(go.Scatter(x=years, y=high, mode='lines', line=dict(width=0, color=color),
+                                 showlegend=False, hoverinfo='skip'))
+        fig.add_trace(go.Scatter(x=years, y=low, mode='lines', line=dict(width=0, color=color), fill='tonexty',
+                                 name=f'{name} P{percentiles[0]}-P{percentiles[2]}', opacity=0.3))
+        fig.add_trace(go.Scatter(x=years, y=median, mode='lines', line=dict(color=color),
+                                 name=f'{name} P{percentiles[1]}'))
+    fig.update_layout(title=title, xaxis_title='Year', yaxis_title=yaxis_title, legend_title_text='Energy Source')
+
+    return fig
+
+def run_heavy_job(function, *args, **kwargs):
+    # Heavy simulations go to the process pool; a full pool is reported to the user instead of queueing forever
+    try:
+        return workers.run_heavy(function, *args, **kwargs)
+    except workers.ServerBusy as error:
+        raise gr.Error(str(error))
+
+def monthly_potential(*args):
+    # Unknown states and locations outside the irradiance dataset are reported to the user
+    try:
+        return calculate_monthly_pv_potential(*args)
+    except ValueError as error:
+        raise gr.Error(str(error))
+
+def size_system(*args):
+    # Inputs the system cannot be sized with (e.g. 0% efficiency) are reported to the user
+    try:
+        return size_pv_system(*args)
+    except ValueError as error:
+        raise gr.Error(str(error))
+
+def live_triggers(component):
+    # Sliders update when released and numbers when submitted or left, rather than on every step or keystroke
+    if isinstance(component, gr.Slider):
+        return [component.release]
+    if isinstance(component, gr.Number):
+        return [component.submit, component.blur]
+    return [component.change]
+
+# Runs in the browser: clicks the hidden button `id` only while live updates are on, so that edits made
+# with them off never reach the server
+LIVE_CLICK_JS = """(live) => {
+    const app = document.querySelector('gradio-app');
+    if (live) ((app && app.shadowRoot) || document).getElementById('%s').click();
+    return [];
+}"""
+
+def register_live_updates(action, view, targets, inputs, outputs, live_toggle):
+    # While live updates are on, re-render `view` when one of `inputs` (the inputs of `action`) changes.
+    # The per-session GraphState recomputes only the stages whose own inputs or upstream results changed,
+    # and `view` renders the outputs from them: its parameters are stage names, which get the stage
+    # results, and input names, which get the raw inputs it shows (the state in a chart title, the battery
+    # rating). Live edits are not recorded as scenarios; runs of `action` from its button are.
+    graph_state = gr.State(GraphState(model_graph))
+    last_values = gr.State({})
+    names = list(inspect.signature(action).parameters)
+    graph_inputs = model_graph.inputs(targets)
+    view_names = list(inspect.signature(view).parameters)
+
+    def render(graph_state, last_values, values, force):
+        key = normalize_key(values)
+        if not force and last_values.get('values') == key:
+            return tuple(gr.update() for _ in outputs)
+        values_by_name = dict(zip(names, values))
+        try:
+            with stage('compute'):
+                graph_state.evaluate(targets, **{name: values_by_name[name] for name in graph_inputs})
+        except ValueError as error:
+            raise gr.Error(str(error))
+        results = view(**{name: graph_state.results[name] if name in model_graph.stages else values_by_name[name]
+                          for name in view_names})
+        last_values['values'] = key
+        return results
+
+    def live_action(graph_state, last_values, *values):
+        return render(graph_state, last_values, values, force=False)
+
+    def refresh_action(graph_state, last_values, *values):
+        # Live updates were just turned on: the outputs may show a button run with other inputs
+        return render(graph_state, last_values, values, force=True)
+
+    for handler, suffix, components in [(live_action, 'live', inputs), (refresh_action, 'refresh', [live_toggle])]:
+        handler.__name__ = f'{action.__name__}_{suffix}'
+        button = gr.Button(visible=False, elem_id=handler.__name__.replace('_', '-'))
+        button.click(instrumented(handler), inputs=[graph_state, last_values] + inputs, outputs=outputs,
+                     show_progress='minimal')
+        for component in components:
+            for trigger in live_triggers(component):
+                trigger(None, inputs=[live_toggle], outputs=None, _js=LIVE_CLICK_JS % button.elem_id)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Yellow Sun Tool - PV System Performance Analysis")
+    parser.add_argument('--concurrency', type=int, default=int(os.environ.get('YST_CONCURRENCY', 8)),
+                        help="Handler threads serving requests in parallel (default: 8)")
+    parser.add_argument('--queue-size', type=int, default=int(os.environ.get('YST_QUEUE_SIZE', 100)),
+                        help="Requests that may wait in the queue before new ones are rejected (default: 100)")
+    parser.add_argument('--process-workers', type=int, default=workers.PROCESS_WORKERS,
+                        help="Processes for heavy simulations; 1 runs them in the handler thread (default: CPU count)")
+    parser.add_argument('--max-heavy-jobs', type=int, default=None,
+                        help="Heavy simulations admitted at once before new ones wait (default: 2 x process workers)")
+    parser.add_argument('--no-prewarm', action='store_true', default=os.environ.get('YST_PREWARM', '1') == '0',
+                        help="Do not import plotting libraries and start worker processes in the background after launch")
+    parser.add_argument('--metrics-port', type=int, default=instrumentation.METRICS_PORT,
+                        help="Serve per-handler metrics in the Prometheus text format on this local port (default: off)")
+    parser.add_argument('--trace-log', default=instrumentation.TRACE_LOG,
+                        help="Append the stage timings of every request to this file as JSON lines (default: off)")
+    parser.add_argument('--scenario-db', default=scenario_store.SCENARIO_DB,
+                        help="SQLite file recording every computed scenario; '' disables (default: %(default)s)")
+    return parser.parse_args(argv)
 
 # Main app using gradio Blocks
-def main():
+def build_app():
     with gr.Blocks() as app:
         gr.Markdown("# Yellow Sun Tool - PV System Performance Analysis")
 
@@ -71,7 +166,17 @@ def main():
         panel_width = gr.Number(label="Solar Panel Width (m)", value=1.0)
         panel_efficiency = gr.Slider(minimum=0, maximum=100, label="Solar Panel Efficiency (%)", value=20)
         inverter_efficiency = gr.Slider(minimum=0, maximum=100, label="Inverter Efficiency (%)", value=95)
-        state = gr.Dropdown(choices=list(ghi.keys()), label="Project State", value='Lagos')
+        if irradiance.available():
+            # Sites outside the state list are resolved through the gridded irradiance dataset
+            state = gr.Dropdown(choices=list(ghi.keys()), label="Project State or Site", value='Lagos',
+                                allow_custom_value=True,
+                                info="Pick a state, or type an LGA (e.g. 'Ikeja, Lagos') or 'latitude, longitude' "
+                                     "to use the irradiance of the nearest grid cell")
+        else:
+            state = gr.Dropdown(choices=list(ghi.keys()), label="Project State", value='Lagos')
+        live_updates = gr.Checkbox(label="Live Updates", value=False,
+                                   info="Update the Monthly PV Potential, PV System Designer, Cost Simulation and "
+                                        "Carbon Emission Matrix results as soon as an input changes")
 
         # How to Use Tab
         with gr.Tab("How to Use"):
@@ -89,9 +194,12 @@ def main():
             - **Solar Panel Efficiency (%):** The efficiency rating of the solar panel.
             - **Inverter Efficiency (%):** The efficiency of the inverter used in the system.
             - **Project State:** Select the Nigerian state where the project is located.
+              If a gridded irradiance dataset is installed, you can instead type the project's LGA or its coordinates as `latitude, longitude`; the monthly irradiance of the nearest grid cell is then used.
 
             These inputs are shared across all calculators and should be entered first.
 
+            Tick **Live Updates** to refresh the results of the first four calculators whenever one of their inputs changes, instead of pressing their buttons. Only the steps affected by the change are recomputed (e.g. changing the inflation rate only reruns the cost simulation).
+
             ### **2. Monthly PV Potential**
 
             - Click on the **Monthly PV Potential** tab.
@@ -126,6 +234,8 @@ def main():
               - A cost table detailing annual costs.
               - An annual cost comparison graph between the PV system and grid supply.
               - A cumulative life cycle cost comparison graph over the specified number of years.
+              - A financial summary with the NPV of both options at the chosen discount rate, the levelized cost of energy (LCOE) and the payback year.
+            - Open **Monte Carlo Uncertainty Analysis** to give ranges for inflation, the grid rate and component/maintenance costs, then click **Run Monte Carlo Simulation** to see P10/P50/P90 cost bands and the probability of breaking even by each year.
 
             ### **5. Carbon Emission Matrix**
 
@@ -139,6 +249,36 @@ def main():
               - Total carbon emissions from the PV system's solar energy over the specified years.
               - A pie chart comparing the carbon emissions.
 
+            ### **6. System Optimizer**
+
+            - Click on the **System Optimizer** tab.
+            - Edit the panel and battery catalogs and list the autonomy days to consider.
+            - Click the **Optimize System** button.
+            - The app sizes and costs every combination using the PV System Designer and Cost Simulation inputs and displays:
+              - The least-cost system.
+              - The Pareto-optimal systems, trading lifetime cost against autonomy and emissions.
+              - A chart of lifetime cost against autonomy days.
+
+            ### **7. Hourly Simulation**
+
+            - Click on the **Hourly Simulation** tab.
+            - Choose a daily load profile, or select **Custom** and enter 24 hourly load weights.
+            - Click the **Run Hourly Simulation** button.
+            - The app simulates the PV System Designer's system for every hour of a year and displays:
+              - Loss-of-load hours, unmet load, curtailed energy and battery cycling.
+              - Monthly unmet load and curtailed energy.
+              - The battery state of charge over the year.
+
+            ### **8. Portfolio**
+
+            - Click on the **Portfolio** tab.
+            - Upload a CSV site list with a **State** (or LGA, or **Latitude** and **Longitude**), **Load** (kWh/day) and **Budget** (₦) for each site.
+            - Click the **Analyze Portfolio** button.
+            - Every site is designed and costed with the PV System Designer, Cost Simulation and Carbon Emission Matrix inputs. Results appear while the list is being computed:
+              - Progress and running totals of panels, batteries, capital cost and emissions.
+              - The results of the first sites, including whether each system fits its budget.
+              - A CSV file with the results of every site once the analysis is done.
+
             ### **Tips**
 
             - **Ensure Inputs Are Accurate:** Double-check your inputs for accuracy to get reliable results.
@@ -158,21 +298,29 @@ def main():
 
             btn_calculate_pv = gr.Button("Calculate Monthly PV Potential")
 
-            pv_potential_output = gr.Image(type="pil", label="Monthly PV Potential Graph")
+            pv_potential_output = gr.Image(type="filepath", label="Monthly PV Potential Graph")
             pv_potential_table = gr.Dataframe(label="Monthly PV Potential (kWh)")
 
+            @instrumented
+            @recorded
             def calculate_pv_potential_action(panel_length, panel_width, panel_efficiency, inverter_efficiency, state):
-                monthly_pv_potential, months = calculate_monthly_pv_potential(
-                    panel_length, panel_width, panel_efficiency, inverter_efficiency, state)
-                img = plot_monthly_pv_potential(months, monthly_pv_potential, state)
-                df = pd.DataFrame([monthly_pv_potential], columns=months)
+                with stage('compute'):
+                    monthly_pv_potential, months = monthly_potential(
+                        panel_length, panel_width, panel_efficiency, inverter_efficiency, state)
+                report('potential', monthly_pv_potential)
+                return pv_potential_view(monthly_pv_potential, state)
+
+            def pv_potential_view(potential, state):
+                with stage('render'):
+                    img = plot_monthly_pv_potential(months, potential, state)
+                with stage('dataframe'):
+                    df = pd.DataFrame([potential], columns=months)
                 return img, df
 
-            btn_calculate_pv.click(
-                calculate_pv_potential_action,
-                inputs=[panel_length, panel_width, panel_efficiency, inverter_efficiency, state],
-                outputs=[pv_potential_output, pv_potential_table]
-            )
+            pv_potential_inputs = [panel_length, panel_width, panel_efficiency, inverter_efficiency, state]
+            pv_potential_outputs = [pv_potential_output, pv_potential_table]
+            btn_calculate_pv.click(calculate_pv_potential_action, inputs=pv_potential_inputs, outputs=pv_potential_outputs)
+            register_live_updates(calculate_pv_potential_action, pv_potential_view, ['potential'], pv_potential_inputs, pv_potential_outputs, live_updates)
 
         # Code Block 2: PV System Designer
         with gr.Tab("PV System Designer"):
@@ -190,63 +338,39 @@ def main():
             num_panels_output = gr.Textbox(label="Number of Panels")
             num_batteries_output = gr.Textbox(label="Number of Batteries")
             total_battery_capacity_output = gr.Number(label="Total Battery Capacity (Ah)")
-            monthly_generation_output = gr.Image(type="pil", label="Monthly Energy Generation Graph")
+            monthly_generation_output = gr.Image(type="filepath", label="Monthly Energy Generation Graph")
 
+            @instrumented
+            @recorded
             def design_pv_system_action(panel_length, panel_width, panel_efficiency, inverter_efficiency, state,
                                         daily_target_energy, autonomy_days, battery_voltage, depth_of_discharge,
                                         battery_efficiency, battery_capacity):
-                ghi_value = ghi[state]
-                panel_area = panel_length * panel_width
-                panel_efficiency /= 100
-                inverter_efficiency /= 100
-
-                months = ['January', 'February', 'March', 'April', 'May', 'June',
-                          'July', 'August', 'September', 'October', 'November', 'December']
-                monthly_factors = [monthly_variation_factors[month] for month in months]
-
-                monthly_pv_potential = [ghi_value * panel_area * panel_efficiency * inverter_efficiency * factor
-                                        for factor in monthly_factors]
-
-                min_pv_potential = min(monthly_pv_potential)
-                min_panels = math.ceil(daily_target_energy / min_pv_potential)
-
-                depth_of_discharge /= 100
-                battery_efficiency /= 100
-                total_battery_capacity = (((daily_target_energy * autonomy_days * 1000) / battery_voltage)
-                                          * (1 / battery_efficiency) * (1 / depth_of_discharge))
-                total_battery_capacity = math.ceil(total_battery_capacity)
-                number_of_batteries = math.ceil(total_battery_capacity / battery_capacity)
-
-                # Plot generation across months
-                days_in_month = [calendar.monthrange(2023, i+1)[1] for i in range(12)]
-                total_potential = [min_panels * potential * days for potential, days in zip(monthly_pv_potential, days_in_month)]
-
-                plt.figure(figsize=(14, 6))
-                plt.bar(months, total_potential, color='orange')
-                plt.title('Monthly Energy Generation for Designed PV System')
-                plt.xlabel('Month')
-                plt.ylabel('Energy Generation (kWh)')
-                plt.grid(axis='y', linestyle='--', alpha=0.7)
-                plt.tight_layout()
-
-                buf = io.BytesIO()
-                plt.savefig(buf, format='png')
-                plt.close()
-                buf.seek(0)
-                img = Image.open(buf)
+                with stage('compute'):
+                    sizing = size_system(
+                        panel_length, panel_width, panel_efficiency, inverter_efficiency, state,
+                        daily_target_energy, autonomy_days, battery_voltage, depth_of_discharge,
+                        battery_efficiency, battery_capacity)
+                    monthly_pv_potential = sizing[3]
+                report('potential', monthly_pv_potential)
+                report('sizing', sizing)
+                return design_view(sizing, panel_length, panel_width, battery_voltage, battery_capacity)
+
+            def design_view(sizing, panel_length, panel_width, battery_voltage, battery_capacity):
+                min_panels, total_battery_capacity, number_of_batteries, _, total_potential = sizing
+                with stage('render'):
+                    img = plot_monthly_generation(months, total_potential)
 
                 num_panels_text = f"{min_panels} panels ({panel_length}m x {panel_width}m)"
                 num_batteries_text = f"{number_of_batteries} batteries (Rating: {battery_capacity}Ah, {battery_voltage}V)"
 
                 return num_panels_text, num_batteries_text, total_battery_capacity, img
 
-            btn_design_system.click(
-                design_pv_system_action,
-                inputs=[panel_length, panel_width, panel_efficiency, inverter_efficiency, state,
-                        daily_target_energy, autonomy_days, battery_voltage, depth_of_discharge,
-                        battery_efficiency, battery_capacity],
-                outputs=[num_panels_output, num_batteries_output, total_battery_capacity_output, monthly_generation_output]
-            )
+            design_inputs = [panel_length, panel_width, panel_efficiency, inverter_efficiency, state,
+                             daily_target_energy, autonomy_days, battery_voltage, depth_of_discharge,
+                             battery_efficiency, battery_capacity]
+            design_outputs = [num_panels_output, num_batteries_output, total_battery_capacity_output, monthly_generation_output]
+            btn_design_system.click(design_pv_system_action, inputs=design_inputs, outputs=design_outputs)
+            register_live_updates(design_pv_system_action, design_view, ['sizing'], design_inputs, design_outputs, live_updates)
 
         # Code Block 3: Cost Simulation
         with gr.Tab("Cost Simulation"):
@@ -280,12 +404,18 @@ def main():
             maintenance_cost_per_battery = gr.Number(label="Maintenance Cost per Battery (₦)", value=500)
             maintenance_misc_cost = gr.Number(label="Miscellaneous Maintenance Costs (₦)", value=500)
 
+            # Financial analysis
+            discount_rate = gr.Slider(minimum=0, maximum=100, label="Discount Rate for NPV/LCOE (%)", value=10)
+
             btn_simulate_cost = gr.Button("Simulate Costs")
 
             cost_table_output = gr.Dataframe(label="Cost Table")
             annual_cost_plot = gr.Plot(label="Annual Cost Comparison")
             cumulative_cost_plot = gr.Plot(label="Cumulative Life Cycle Cost Comparison")
+            financial_summary_output = gr.Dataframe(label="Financial Summary (NPV, LCOE, Payback)")
 
+            @instrumented
+            @recorded
             def simulate_costs_action(panel_length, panel_width, panel_efficiency, inverter_efficiency, state,
                                       daily_target_energy, autonomy_days, battery_voltage, depth_of_discharge,
                                       battery_efficiency, battery_capacity,
@@ -293,86 +423,149 @@ def main():
                                       solar_panel_install_cost, controller_install_cost, inverter_install_cost, battery_install_cost, misc_install_cost,
                                       maintenance_visits_per_year, warranty_years, grid_rate, inflation_rate, num_years,
                                       maintenance_cost_per_panel, maintenance_cost_controller, maintenance_cost_inverter,
-                                      maintenance_cost_per_battery, maintenance_misc_cost):
-                # Reuse calculations from previous code blocks
-                ghi_value = ghi[state]
-                panel_area = panel_length * panel_width
-                panel_efficiency /= 100
-                inverter_efficiency /= 100
-
-                months = ['January', 'February', 'March', 'April', 'May', 'June',
-                          'July', 'August', 'September', 'October', 'November', 'December']
-                monthly_factors = [monthly_variation_factors[month] for month in months]
-
-                monthly_pv_potential = [ghi_value * panel_area * panel_efficiency * inverter_efficiency * factor
-                                        for factor in monthly_factors]
-
-                min_pv_potential = min(monthly_pv_potential)
-                min_panels = math.ceil(daily_target_energy / min_pv_potential)
-
-                depth_of_discharge /= 100
-                battery_efficiency /= 100
-                total_battery_capacity = (((daily_target_energy * autonomy_days * 1000) / battery_voltage)
-                                          * (1 / battery_efficiency) * (1 / depth_of_discharge))
-                total_battery_capacity = math.ceil(total_battery_capacity)
-                number_of_batteries = math.ceil(total_battery_capacity / battery_capacity)
-
-                # Procurement and installation costs
-                total_procurement_cost = (solar_panel_unit_cost * min_panels) + controller_cost + inverter_cost + (battery_unit_cost * number_of_batteries) + misc_procurement_cost
-                total_installation_cost = (solar_panel_install_cost * min_panels) + controller_install_cost + inverter_install_cost + (battery_install_cost * number_of_batteries) + misc_install_cost
-                commission_cost = total_procurement_cost + total_installation_cost
-
-                # Maintenance costs
-                maintenance_cost = (maintenance_cost_per_panel * min_panels) + maintenance_cost_controller + maintenance_cost_inverter + (maintenance_cost_per_battery * number_of_batteries) + maintenance_misc_cost
-                usage_cost = maintenance_cost * maintenance_visits_per_year
-                inflation_rate /= 100
-
-                # Initialize cost tables
-                pv_cost_table = []
-                grid_cost_table = []
-
-                for i in range(int(num_years)):
-                    # Grid cost
-                    if i == 0:
-                        grid_cost_table.append(daily_target_energy * grid_rate * 365)
-                    else:
-                        grid_cost_table.append(grid_cost_table[i-1] * (1 + inflation_rate))
-
-                    # PV cost
-                    if warranty_years > 0 and i < warranty_years:
-                        pv_cost_table.append(0)
-                    else:
-                        pv_cost_table.append(usage_cost * ((1 + inflation_rate) ** i))
-
-                # Include commissioning cost
-                if commission_cost is not None:
-                    pv_cost_table[0] += commission_cost
-
-                # Create DataFrame
-                cost_data = {
-                    'Year': list(range(1, int(num_years) + 1)),
-                    'PV Cost': pv_cost_table,
-                    'Grid Cost': grid_cost_table
-                }
-                cost_df = pd.DataFrame(cost_data)
-                cost_df['Cumulative PV Cost'] = cost_df['PV Cost'].cumsum()
-                cost_df['Cumulative Grid Cost'] = cost_df['Grid Cost'].cumsum()
+                                      maintenance_cost_per_battery, maintenance_misc_cost, discount_rate):
+                with stage('compute'):
+                    # Reuse calculations from previous code blocks
+                    sizing = size_system(
+                        panel_length, panel_width, panel_efficiency, inverter_efficiency, state,
+                        daily_target_energy, autonomy_days, battery_voltage, depth_of_discharge,
+                        battery_efficiency, battery_capacity)
+                    min_panels, total_battery_capacity, number_of_batteries, monthly_pv_potential, _ = sizing
+
+                    # Procurement, installation and maintenance costs, cost tables and financial metrics
+                    costs = simulate_costs(
+                        min_panels, number_of_batteries,
+                        solar_panel_unit_cost, controller_cost, inverter_cost, battery_unit_cost, misc_procurement_cost,
+                        solar_panel_install_cost, controller_install_cost, inverter_install_cost, battery_install_cost, misc_install_cost,
+                        maintenance_visits_per_year, warranty_years, grid_rate, inflation_rate, num_years,
+                        maintenance_cost_per_panel, maintenance_cost_controller, maintenance_cost_inverter,
+                        maintenance_cost_per_battery, maintenance_misc_cost, daily_target_energy, discount_rate)
+                report('potential', monthly_pv_potential)
+                report('sizing', sizing)
+                report('cost', costs)
+                return cost_view(costs, num_years)
+
+            def cost_view(cost, num_years):
+                pv_cost_table, grid_cost_table = cost['pv_cost_table'], cost['grid_cost_table']
+
+                with stage('dataframe'):
+                    cost_df = pd.DataFrame({
+                        'Year': np.arange(1, int(num_years) + 1),
+                        'PV Cost': pv_cost_table,
+                        'Grid Cost': grid_cost_table,
+                        'Cumulative PV Cost': np.cumsum(pv_cost_table),
+                        'Cumulative Grid Cost': np.cumsum(grid_cost_table)
+                    })
+
+                    # Financial summary
+                    payback_year = cost['payback_year']
+                    summary_df = pd.DataFrame({
+                        'Metric': ['PV Cost NPV (₦)', 'Grid Cost NPV (₦)', 'NPV Savings (₦)',
+                                   'PV LCOE (₦/kWh)', 'Grid LCOE (₦/kWh)', 'Payback Year'],
+                        'Value': [f"{cost['npv_pv_cost']:,.2f}", f"{cost['npv_grid_cost']:,.2f}",
+                                  f"{cost['npv_savings']:,.2f}", f"{cost['lcoe_pv']:,.2f}",
+                                  f"{cost['lcoe_grid']:,.2f}",
+                                  f"Year {int(payback_year)}" if not np.isnan(payback_year) else f"Not within {int(num_years)} years"]
+                    })
 
                 # Plotting
-                fig1 = px.line(cost_df, x='Year', y=['PV Cost', 'Grid Cost'],
-                               labels={'value': 'Cost (₦)', 'variable': 'Energy Source'},
-                               title=f'Annual Cost of Electricity: PV System vs Grid Supply over {int(num_years)} Years')
-                fig1.update_layout(legend_title_text='Energy Source')
+                with stage('render'):
+                    fig1 = px.line(cost_df, x='Year', y=['PV Cost', 'Grid Cost'],
+                                   labels={'value': 'Cost (₦)', 'variable': 'Energy Source'},
+                                   title=f'Annual Cost of Electricity: PV System vs Grid Supply over {int(num_years)} Years')
+                    fig1.update_layout(legend_title_text='Energy Source')
+
+                    fig2 = px.line(cost_df, x='Year', y=['Cumulative PV Cost', 'Cumulative Grid Cost'],
+                                   labels={'value': 'Cumulative Cost (₦)', 'variable': 'Energy Source'},
+                                   title=f'{int(num_years)}-Year Cumulative Life Cycle Cost Comparison: PV System vs Grid Electricity')
+                    fig2.update_layout(legend_title_text='Energy Source')
+
+                return cost_df, fig1, fig2, summary_df
+
+            cost_inputs = [panel_length, panel_width, panel_efficiency, inverter_efficiency, state,
+                           daily_target_energy, autonomy_days, battery_voltage, depth_of_discharge,
+                           battery_efficiency, battery_capacity,
+                           solar_panel_unit_cost, controller_cost, inverter_cost, battery_unit_cost, misc_procurement_cost,
+                           solar_panel_install_cost, controller_install_cost, inverter_install_cost, battery_install_cost, misc_install_cost,
+                           maintenance_visits_per_year, warranty_years, grid_rate, inflation_rate, num_years,
+                           maintenance_cost_per_panel, maintenance_cost_controller, maintenance_cost_inverter,
+                           maintenance_cost_per_battery, maintenance_misc_cost, discount_rate]
+            cost_outputs = [cost_table_output, annual_cost_plot, cumulative_cost_plot, financial_summary_output]
+            btn_simulate_cost.click(simulate_costs_action, inputs=cost_inputs, outputs=cost_outputs)
+            register_live_updates(simulate_costs_action, cost_view, ['cost'], cost_inputs, cost_outputs, live_updates)
+
+            # Monte Carlo uncertainty mode
+            with gr.Accordion("Monte Carlo Uncertainty Analysis", open=False):
+                gr.Markdown("Inflation (sampled for every year) and the grid rate follow triangular distributions "
+                            "around the rates entered above; component and maintenance costs vary uniformly by the given spread.")
+                mc_inflation_low = gr.Number(label="Inflation Rate Low (%)", value=5)
+                mc_inflation_high = gr.Number(label="Inflation Rate High (%)", value=25)
+                mc_grid_rate_low = gr.Number(label="Grid Electricity Rate Low (₦/kWh)", value=40)
+                mc_grid_rate_high = gr.Number(label="Grid Electricity Rate High (₦/kWh)", value=80)
+                mc_component_cost_spread = gr.Slider(minimum=0, maximum=100, label="Component Cost Uncertainty (±%)", value=10)
+                mc_maintenance_cost_spread = gr.Slider(minimum=0, maximum=100, label="Maintenance Cost Uncertainty (±%)", value=20)
+                mc_num_samples = gr.Slider(minimum=1000, maximum=100000, step=1000, label="Number of Samples", value=10000)
+                mc_seed = gr.Number(label="Random Seed", value=42, precision=0)
+
+                btn_monte_carlo = gr.Button("Run Monte Carlo Simulation")
+
+                break_even_output = gr.Textbox(label="Break-even Probability")
+                mc_annual_cost_plot = gr.Plot(label="Annual Cost Uncertainty Bands")
+                mc_cumulative_cost_plot = gr.Plot(label="Cumulative Cost Uncertainty Bands")
+                break_even_plot = gr.Plot(label="Probability of Break-even by Year")
+
+            @instrumented
+            def simulate_costs_monte_carlo_action(panel_length, panel_width, panel_efficiency, inverter_efficiency, state,
+                                                  daily_target_energy, autonomy_days, battery_voltage, depth_of_discharge,
+                                                  battery_efficiency, battery_capacity,
+                                                  solar_panel_unit_cost, controller_cost, inverter_cost, battery_unit_cost, misc_procurement_cost,
+                                                  solar_panel_install_cost, controller_install_cost, inverter_install_cost, battery_install_cost, misc_install_cost,
+                                                  maintenance_visits_per_year, warranty_years, grid_rate, inflation_rate, num_years,
+                                                  maintenance_cost_per_panel, maintenance_cost_controller, maintenance_cost_inverter,
+                                                  maintenance_cost_per_battery, maintenance_misc_cost, discount_rate,
+                                                  mc_inflation_low, mc_inflation_high, mc_grid_rate_low, mc_grid_rate_high,
+                                                  mc_component_cost_spread, mc_maintenance_cost_spread, mc_num_samples, mc_seed):
+                with stage('compute'):
+                    min_panels, _, number_of_batteries, _, _ = size_system(
+                        panel_length, panel_width, panel_efficiency, inverter_efficiency, state,
+                        daily_target_energy, autonomy_days, battery_voltage, depth_of_discharge,
+                        battery_efficiency, battery_capacity)
 
-                fig2 = px.line(cost_df, x='Year', y=['Cumulative PV Cost', 'Cumulative Grid Cost'],
-                               labels={'value': 'Cumulative Cost (₦)', 'variable': 'Energy Source'},
-                               title=f'{int(num_years)}-Year Cumulative Life Cycle Cost Comparison: PV System vs Grid Electricity')
-                fig2.update_layout(legend_title_text='Energy Source')
+                    costs = simulate_costs(
+                        min_panels, number_of_batteries,
+                        solar_panel_unit_cost, controller_cost, inverter_cost, battery_unit_cost, misc_procurement_cost,
+                        solar_panel_install_cost, controller_install_cost, inverter_install_cost, battery_install_cost, misc_install_cost,
+                        maintenance_visits_per_year, warranty_years, grid_rate, inflation_rate, num_years,
+                        maintenance_cost_per_panel, maintenance_cost_controller, maintenance_cost_inverter,
+                        maintenance_cost_per_battery, maintenance_misc_cost, daily_target_energy, discount_rate)
+                    commission_cost, usage_cost = costs['commission_cost'], costs['usage_cost']
 
-                return cost_df, fig1, fig2
+                    summary = run_heavy_job(run_monte_carlo, daily_target_energy, num_years, warranty_years, commission_cost, usage_cost,
+                                            mc_inflation_low, inflation_rate, mc_inflation_high,
+                                            mc_grid_rate_low, grid_rate, mc_grid_rate_high,
+                                            mc_component_cost_spread, mc_maintenance_cost_spread,
+                                            num_samples=mc_num_samples, seed=int(mc_seed))
 
-            btn_simulate_cost.click(
-                simulate_costs_action,
+                # Plotting
+                with stage('render'):
+                    years = np.arange(1, int(num_years) + 1)
+                    percentiles = summary['percentiles']
+                    fig1 = plot_percentile_bands(years, summary['annual_pv'], summary['annual_grid'], percentiles,
+                                                 f'Annual Cost Uncertainty over {int(num_years)} Years', 'Cost (₦)')
+                    fig2 = plot_percentile_bands(years, summary['cumulative_pv'], summary['cumulative_grid'], percentiles,
+                                                 f'{int(num_years)}-Year Cumulative Life Cycle Cost Uncertainty', 'Cumulative Cost (₦)')
+                    fig3 = px.line(x=years, y=summary['break_even_probability'] * 100, markers=True,
+                                   labels={'x': 'Year', 'y': 'Probability (%)'},
+                                   title='Probability that the PV System has Broken Even by Each Year')
+                    fig3.update_yaxes(range=[0, 100])
+
+                break_even_text = (f"Probability that the PV system breaks even within {int(num_years)} years: "
+                                   f"{summary['break_even_probability'][-1]:.1%} ({int(mc_num_samples):,} samples)")
+
+                return break_even_text, fig1, fig2, fig3
+
+            btn_monte_carlo.click(
+                simulate_costs_monte_carlo_action,
                 inputs=[panel_length, panel_width, panel_efficiency, inverter_efficiency, state,
                         daily_target_energy, autonomy_days, battery_voltage, depth_of_discharge,
                         battery_efficiency, battery_capacity,
@@ -380,8 +573,10 @@ def main():
                         solar_panel_install_cost, controller_install_cost, inverter_install_cost, battery_install_cost, misc_install_cost,
                         maintenance_visits_per_year, warranty_years, grid_rate, inflation_rate, num_years,
                         maintenance_cost_per_panel, maintenance_cost_controller, maintenance_cost_inverter,
-                        maintenance_cost_per_battery, maintenance_misc_cost],
-                outputs=[cost_table_output, annual_cost_plot, cumulative_cost_plot]
+                        maintenance_cost_per_battery, maintenance_misc_cost, discount_rate,
+                        mc_inflation_low, mc_inflation_high, mc_grid_rate_low, mc_grid_rate_high,
+                        mc_component_cost_spread, mc_maintenance_cost_spread, mc_num_samples, mc_seed],
+                outputs=[break_even_output, mc_annual_cost_plot, mc_cumulative_cost_plot, break_even_plot]
             )
 
         # Code Block 4: Carbon Emission Matrix
@@ -397,18 +592,17 @@ def main():
             solar_emissions_output = gr.Textbox(label="PV System Solar Energy Emissions")
             emissions_plot = gr.Plot(label="Carbon Emissions Comparison")
 
+            @instrumented
+            @recorded
             def calculate_emissions_action(num_years_emission, daily_target_energy_emission):
-                # Carbon factors
-                grid_cf = 402  # gCO2/kWh
-                solar_cf = 41  # gCO2/kWh
-
-                # Calculate carbon emissions per day
-                grid_emission = daily_target_energy_emission * grid_cf / 1000  # kgCO2/day
-                solar_emission = daily_target_energy_emission * solar_cf / 1000  # kgCO2/day
+                with stage('compute'):
+                    total_grid_emission, total_solar_emission = calculate_emissions(
+                        daily_target_energy_emission, num_years_emission)
+                report('emissions', (total_grid_emission, total_solar_emission))
+                return emissions_view((total_grid_emission, total_solar_emission), num_years_emission)
 
-                # Total emissions over the years
-                total_grid_emission = grid_emission * 365 * num_years_emission
-                total_solar_emission = solar_emission * 365 * num_years_emission
+            def emissions_view(emissions, num_years_emission):
+                total_grid_emission, total_solar_emission = emissions
 
                 # Data for pie chart
                 data = {
@@ -416,23 +610,329 @@ def main():
                     'Carbon Emission (kgCO2)': [total_grid_emission, total_solar_emission]
                 }
 
-                fig = px.pie(data, values='Carbon Emission (kgCO2)', names='Energy Source',
-                             title=f'Carbon Emissions over {int(num_years_emission)} Years',
-                             color_discrete_sequence=['#0077c2', '#FDB813'])
-                fig.update_traces(textposition='inside', textinfo='percent+label')
+                with stage('render'):
+                    fig = px.pie(data, values='Carbon Emission (kgCO2)', names='Energy Source',
+                                 title=f'Carbon Emissions over {int(num_years_emission)} Years',
+                                 color_discrete_sequence=['#0077c2', '#FDB813'])
+                    fig.update_traces(textposition='inside', textinfo='percent+label')
 
                 grid_emissions_text = f"Total carbon emissions from Grid Electricity over {int(num_years_emission)} years: {total_grid_emission:,.2f} kgCO₂"
                 solar_emissions_text = f"Total carbon emissions from PV System's Solar Energy over {int(num_years_emission)} years: {total_solar_emission:,.2f} kgCO₂"
 
                 return grid_emissions_text, solar_emissions_text, fig
 
-            btn_calculate_emissions.click(
-                calculate_emissions_action,
-                inputs=[num_years_emission, daily_target_energy_emission],
-                outputs=[grid_emissions_output, solar_emissions_output, emissions_plot]
+            emissions_inputs = [num_years_emission, daily_target_energy_emission]
+            emissions_outputs = [grid_emissions_output, solar_emissions_output, emissions_plot]
+            btn_calculate_emissions.click(calculate_emissions_action, inputs=emissions_inputs, outputs=emissions_outputs)
+            register_live_updates(calculate_emissions_action, emissions_view, ['emissions'], emissions_inputs, emissions_outputs, live_updates)
+
+        # Code Block 5: System Optimizer
+        with gr.Tab("System Optimizer"):
+            gr.Markdown("### Least-Cost System Optimizer")
+            gr.Markdown("Every combination of the panel and battery models below and the autonomy options is sized for the "
+                        "Daily Target Energy of the PV System Designer and costed with the Cost Simulation inputs.")
+
+            panel_catalog = gr.Dataframe(
+                headers=['Length (m)', 'Width (m)', 'Efficiency (%)', 'Unit Cost (₦)'],
+                datatype=['number', 'number', 'number', 'number'],
+                value=[[1.6, 1.0, 17, 45000], [1.6, 1.0, 20, 50000], [2.0, 1.0, 21, 65000], [2.3, 1.1, 22, 90000]],
+                label="Solar Panel Catalog", interactive=True)
+            battery_catalog = gr.Dataframe(
+                headers=['Capacity (Ah)', 'Voltage (V)', 'Unit Cost (₦)'],
+                datatype=['number', 'number', 'number'],
+                value=[[100, 12, 35000], [200, 12, 60000], [200, 24, 110000], [100, 48, 180000]],
+                label="Battery Catalog", interactive=True)
+            autonomy_options = gr.Textbox(label="Autonomy Days to Consider (comma separated)", value="1, 2, 3")
+
+            btn_optimize = gr.Button("Optimize System")
+
+            optimal_system_output = gr.Textbox(label="Least-Cost System")
+            pareto_table_output = gr.Dataframe(label="Pareto-Optimal Systems")
+            pareto_plot = gr.Plot(label="Lifetime Cost vs Autonomy")
+
+            @instrumented
+            def optimize_system_action(inverter_efficiency, state,
+                                       daily_target_energy, depth_of_discharge, battery_efficiency,
+                                       controller_cost, inverter_cost, misc_procurement_cost,
+                                       solar_panel_install_cost, controller_install_cost, inverter_install_cost, battery_install_cost, misc_install_cost,
+                                       maintenance_visits_per_year, warranty_years, grid_rate, inflation_rate, num_years, discount_rate,
+                                       maintenance_cost_per_panel, maintenance_cost_controller, maintenance_cost_inverter,
+                                       maintenance_cost_per_battery, maintenance_misc_cost,
+                                       panel_catalog, battery_catalog, autonomy_options):
+                panel_catalog = panel_catalog.apply(pd.to_numeric, errors='coerce').dropna()
+                battery_catalog = battery_catalog.apply(pd.to_numeric, errors='coerce').dropna()
+                autonomy_options = [float(days) for days in autonomy_options.split(',') if days.strip()]
+                if panel_catalog.empty or battery_catalog.empty or not autonomy_options:
+                    raise gr.Error("Enter at least one panel, one battery and one autonomy option.")
+
+                with stage('compute'):
+                    try:
+                        result = run_heavy_job(
+                            optimize_system, state, daily_target_energy, inverter_efficiency, depth_of_discharge, battery_efficiency,
+                            {'length': panel_catalog.iloc[:, 0].to_numpy(), 'width': panel_catalog.iloc[:, 1].to_numpy(),
+                             'efficiency': panel_catalog.iloc[:, 2].to_numpy(), 'unit_cost': panel_catalog.iloc[:, 3].to_numpy()},
+                            {'capacity': battery_catalog.iloc[:, 0].to_numpy(), 'voltage': battery_catalog.iloc[:, 1].to_numpy(),
+                             'unit_cost': battery_catalog.iloc[:, 2].to_numpy()},
+                            autonomy_options,
+                            controller_cost, inverter_cost, misc_procurement_cost,
+                            solar_panel_install_cost, controller_install_cost, inverter_install_cost, battery_install_cost, misc_install_cost,
+                            maintenance_visits_per_year, warranty_years, grid_rate, inflation_rate, num_years, discount_rate,
+                            maintenance_cost_per_panel, maintenance_cost_controller, maintenance_cost_inverter,
+                            maintenance_cost_per_battery, maintenance_misc_cost)
+                    except ValueError as error:
+                        raise gr.Error(str(error))
+
+                with stage('dataframe'):
+                    pareto = result['pareto']
+                    panels = panel_catalog.to_numpy()[result['panel'][pareto]]
+                    batteries = battery_catalog.to_numpy()[result['battery'][pareto]]
+                    pareto_df = pd.DataFrame({
+                        'Panel': [f"{length}m x {width}m, {efficiency}%" for length, width, efficiency, _ in panels],
+                        'Panels': result['min_panels'][pareto].astype(int),
+                        'Battery': [f"{capacity}Ah, {voltage}V" for capacity, voltage, _ in batteries],
+                        'Batteries': result['number_of_batteries'][pareto].astype(int),
+                        'Autonomy Days': result['autonomy_days'][pareto],
+                        'Commissioning Cost (₦)': result['commission_cost'][pareto].round(2),
+                        'Lifetime Cost NPV (₦)': result['lifetime_cost'][pareto].round(2),
+                        'LCOE (₦/kWh)': result['lcoe'][pareto].round(2),
+                        'Emissions (kgCO2)': result['emissions'][pareto].round(2)
+                    })
+
+                with stage('render'):
+                    fig = px.scatter(pareto_df, x='Autonomy Days', y='Lifetime Cost NPV (₦)', color='Emissions (kgCO2)',
+                                     hover_data=['Panel', 'Panels', 'Battery', 'Batteries'],
+                                     title=f'Pareto Front of {len(result["panel"]):,} Evaluated Systems in {state}')
+
+                best = pareto_df.iloc[0]
+                optimal_system_text = (f"{best['Panels']} x {best['Panel']} panels with {best['Batteries']} x {best['Battery']} "
+                                       f"batteries ({best['Autonomy Days']:g} autonomy days): "
+                                       f"lifetime cost ₦{best['Lifetime Cost NPV (₦)']:,.2f}")
+
+                return optimal_system_text, pareto_df, fig
+
+            btn_optimize.click(
+                optimize_system_action,
+                inputs=[inverter_efficiency, state,
+                        daily_target_energy, depth_of_discharge, battery_efficiency,
+                        controller_cost, inverter_cost, misc_procurement_cost,
+                        solar_panel_install_cost, controller_install_cost, inverter_install_cost, battery_install_cost, misc_install_cost,
+                        maintenance_visits_per_year, warranty_years, grid_rate, inflation_rate, num_years, discount_rate,
+                        maintenance_cost_per_panel, maintenance_cost_controller, maintenance_cost_inverter,
+                        maintenance_cost_per_battery, maintenance_misc_cost,
+                        panel_catalog, battery_catalog, autonomy_options],
+                outputs=[optimal_system_output, pareto_table_output, pareto_plot]
+            )
+
+        # Code Block 6: Hourly Simulation
+        with gr.Tab("Hourly Simulation"):
+            gr.Markdown("### Hourly (8760) Battery Dispatch Simulation")
+            gr.Markdown("Simulates the system designed in the PV System Designer hour by hour over a year, "
+                        "using a synthetic irradiance profile built from the site's monthly GHI.")
+
+            load_profile_choice = gr.Dropdown(choices=list(LOAD_PROFILES) + ['Custom'], label="Load Profile",
+                                              value='Residential (evening peak)')
+            custom_load_profile = gr.Textbox(label="Custom Hourly Load Weights (24 comma-separated values, used when Load Profile is Custom)",
+                                             value=", ".join(str(weight) for weight in LOAD_PROFILES['Flat']))
+
+            btn_simulate_hourly = gr.Button("Run Hourly Simulation")
+
+            hourly_summary_output = gr.Dataframe(label="Hourly Simulation Summary")
+            hourly_monthly_plot = gr.Plot(label="Monthly Unmet Load and Curtailed Energy")
+            hourly_soc_plot = gr.Plot(label="Battery State of Charge")
+
+            @instrumented
+            def simulate_hourly_action(panel_length, panel_width, panel_efficiency, inverter_efficiency, state,
+                                       daily_target_energy, autonomy_days, battery_voltage, depth_of_discharge,
+                                       battery_efficiency, battery_capacity, load_profile_choice, custom_load_profile):
+                if load_profile_choice == 'Custom':
+                    try:
+                        load_profile = [float(weight) for weight in custom_load_profile.split(',')]
+                    except ValueError:
+                        raise gr.Error("Custom load weights must be numbers.")
+                    if len(load_profile) != 24 or min(load_profile) < 0 or sum(load_profile) <= 0:
+                        raise gr.Error("Enter 24 non-negative load weights with a positive total.")
+                else:
+                    load_profile = LOAD_PROFILES[load_profile_choice]
+
+                with stage('compute'):
+                    min_panels, _, number_of_batteries, _, _ = size_system(
+                        panel_length, panel_width, panel_efficiency, inverter_efficiency, state,
+                        daily_target_energy, autonomy_days, battery_voltage, depth_of_discharge,
+                        battery_efficiency, battery_capacity)
+                    battery_bank_capacity = number_of_batteries * battery_capacity * battery_voltage / 1000  # kWh
+
+                    result = run_heavy_job(simulate_hourly, panel_length, panel_width, panel_efficiency, inverter_efficiency, state,
+                                           min_panels, daily_target_energy, load_profile,
+                                           battery_bank_capacity, depth_of_discharge, battery_efficiency)
+
+                with stage('dataframe'):
+                    load = float(result['load'][0])
+                    unmet_energy = float(result['unmet_energy'][0])
+                    summary_df = pd.DataFrame({
+                        'Metric': ['Panels / Batteries', 'Battery Bank (kWh)', 'Annual PV Generation (kWh)', 'Annual Load (kWh)',
+                                   'Loss-of-Load Hours', 'Unmet Load (kWh)', 'Load Served (%)',
+                                   'Curtailed Energy (kWh)', 'Equivalent Full Battery Cycles'],
+                        'Value': [f"{min_panels} / {number_of_batteries}", f"{battery_bank_capacity:,.2f}",
+                                  f"{float(result['pv_generation'][0]):,.2f}", f"{load:,.2f}",
+                                  f"{int(result['loss_of_load_hours'][0]):,}", f"{unmet_energy:,.2f}",
+                                  f"{100 * (1 - unmet_energy / load):.2f}" if load > 0 else "n/a",
+                                  f"{float(result['curtailed_energy'][0]):,.2f}", f"{float(result['equivalent_cycles'][0]):,.1f}"]
+                    })
+
+                    # Monthly totals for plotting
+                    monthly_df = pd.DataFrame({
+                        'Month': months,
+                        'Unmet Load': np.bincount(HOUR_MONTH, weights=result['hourly_unmet'], minlength=12),
+                        'Curtailed Energy': np.bincount(HOUR_MONTH, weights=result['hourly_curtailed'], minlength=12)
+                    })
+
+                with stage('render'):
+                    fig1 = px.bar(monthly_df, x='Month', y=['Unmet Load', 'Curtailed Energy'], barmode='group',
+                                  labels={'value': 'Energy (kWh)', 'variable': 'Energy Flow'},
+                                  title=f'Monthly Unmet Load and Curtailed Energy in {state}',
+                                  color_discrete_sequence=['#0077c2', '#FDB813'])
+
+                    fig2 = px.line(x=np.arange(1, len(result['hourly_soc']) + 1), y=result['hourly_soc'],
+                                   labels={'x': 'Hour of Year', 'y': 'State of Charge (kWh)'},
+                                   title='Battery State of Charge over the Year')
+                    fig2.update_traces(line=dict(color='#FDB813', width=1))
+
+                return summary_df, fig1, fig2
+
+            btn_simulate_hourly.click(
+                simulate_hourly_action,
+                inputs=[panel_length, panel_width, panel_efficiency, inverter_efficiency, state,
+                        daily_target_energy, autonomy_days, battery_voltage, depth_of_discharge,
+                        battery_efficiency, battery_capacity, load_profile_choice, custom_load_profile],
+                outputs=[hourly_summary_output, hourly_monthly_plot, hourly_soc_plot]
             )
 
-    app.launch()
+        # Code Block 7: Portfolio
+        with gr.Tab("Portfolio"):
+            gr.Markdown("### Portfolio Analysis")
+            gr.Markdown("Sizes and costs every site of a CSV site list with the PV System Designer, Cost Simulation and "
+                        "Carbon Emission Matrix inputs. Each row gives a site's **State** (or an LGA, or **Latitude** and "
+                        "**Longitude** columns), its **Load** in kWh/day and optionally its **Budget** in ₦ and a **Site** name. "
+                        "Sites without a load use the Daily Target Energy of the PV System Designer.")
+
+            site_file = gr.File(label="Site List (CSV)", file_types=['.csv'])
+            btn_portfolio = gr.Button("Analyze Portfolio")
+
+            portfolio_progress = gr.Markdown()
+            portfolio_totals = gr.Dataframe(label="Portfolio Totals")
+            portfolio_table = gr.Dataframe(label=f"Site Results (first {PORTFOLIO_TABLE_ROWS:,} sites)")
+            portfolio_download = gr.File(label="All Site Results (CSV)", visible=False)
+
+            @instrumented
+            def portfolio_action(site_file, panel_length, panel_width, panel_efficiency, inverter_efficiency,
+                                 daily_target_energy, autonomy_days, battery_voltage, depth_of_discharge,
+                                 battery_efficiency, battery_capacity,
+                                 solar_panel_unit_cost, controller_cost, inverter_cost, battery_unit_cost, misc_procurement_cost,
+                                 solar_panel_install_cost, controller_install_cost, inverter_install_cost, battery_install_cost, misc_install_cost,
+                                 maintenance_visits_per_year, warranty_years, grid_rate, inflation_rate, num_years,
+                                 maintenance_cost_per_panel, maintenance_cost_controller, maintenance_cost_inverter,
+                                 maintenance_cost_per_battery, maintenance_misc_cost, discount_rate, num_years_emission):
+                # A generator, so Gradio streams every yield to the browser: results appear chunk by chunk
+                design = dict(
+                    panel_length=panel_length, panel_width=panel_width, panel_efficiency=panel_efficiency,
+                    inverter_efficiency=inverter_efficiency, daily_target_energy=daily_target_energy,
+                    autonomy_days=autonomy_days, battery_voltage=battery_voltage, depth_of_discharge=depth_of_discharge,
+                    battery_efficiency=battery_efficiency, battery_capacity=battery_capacity,
+                    solar_panel_unit_cost=solar_panel_unit_cost, controller_cost=controller_cost, inverter_cost=inverter_cost,
+                    battery_unit_cost=battery_unit_cost, misc_procurement_cost=misc_procurement_cost,
+                    solar_panel_install_cost=solar_panel_install_cost, controller_install_cost=controller_install_cost,
+                    inverter_install_cost=inverter_install_cost, battery_install_cost=battery_install_cost,
+                    misc_install_cost=misc_install_cost, maintenance_visits_per_year=maintenance_visits_per_year,
+                    warranty_years=warranty_years, grid_rate=grid_rate, inflation_rate=inflation_rate, num_years=num_years,
+                    maintenance_cost_per_panel=maintenance_cost_per_panel, maintenance_cost_controller=maintenance_cost_controller,
+                    maintenance_cost_inverter=maintenance_cost_inverter, maintenance_cost_per_battery=maintenance_cost_per_battery,
+                    maintenance_misc_cost=maintenance_misc_cost, discount_rate=discount_rate,
+                    num_years_emission=num_years_emission)
+                if site_file is None:
+                    raise gr.Error("Upload a site list first.")
+                path = getattr(site_file, 'name', site_file)
+                total_sites = portfolio.count_sites(path)
+
+                totals = dict.fromkeys(portfolio.TOTALS, 0)
+                shown = []
+                results_file = tempfile.NamedTemporaryFile('w', prefix='portfolio_', suffix='.csv', delete=False, newline='')
+                chunks = portfolio.stream_portfolio(path, design)
+                try:
+                    with results_file:
+                        while True:
+                            try:
+                                with stage('compute'):
+                                    results = next(chunks, None)
+                            except workers.ServerBusy as error:
+                                raise gr.Error(str(error))
+                            except (ValueError, KeyError) as error:
+                                raise gr.Error(f"Could not read the site list: {error}")
+                            if results is None:
+                                break
+
+                            with stage('dataframe'):
+                                results.to_csv(results_file, header=results_file.tell() == 0, index=False)
+                                for name, value in portfolio.chunk_totals(results).items():
+                                    totals[name] += value
+                                if sum(len(rows) for rows in shown) < PORTFOLIO_TABLE_ROWS:
+                                    shown.append(results.head(PORTFOLIO_TABLE_ROWS - sum(len(rows) for rows in shown)))
+                                totals_df = pd.DataFrame({'Metric': list(totals),
+                                                          'Value': [f"{value:,.2f}" if isinstance(value, float) else f"{value:,}"
+                                                                    for value in totals.values()]})
+
+                            done = totals['Sites']
+                            progress = f"**Computed {done:,} of about {max(total_sites, done):,} sites ({100 * done / max(total_sites, done, 1):.0f}%)**"
+                            yield progress, totals_df, pd.concat(shown), gr.update()
+                    chunks.close()
+                    if totals['Sites'] == 0:
+                        raise gr.Error("The site list has no sites.")
+
+                    yield f"**Done: {totals['Sites']:,} sites**", totals_df, pd.concat(shown), gr.update(value=results_file.name, visible=True)
+                finally:
+                    # Gradio copies the download when it postprocesses the last yield, before resuming this generator;
+                    # a failed or abandoned run (the browser went away) leaves nothing to download either
+                    chunks.close()
+                    os.remove(results_file.name)
+
+            portfolio_inputs = [site_file, panel_length, panel_width, panel_efficiency, inverter_efficiency,
+                                daily_target_energy, autonomy_days, battery_voltage, depth_of_discharge,
+                                battery_efficiency, battery_capacity,
+                                solar_panel_unit_cost, controller_cost, inverter_cost, battery_unit_cost, misc_procurement_cost,
+                                solar_panel_install_cost, controller_install_cost, inverter_install_cost, battery_install_cost, misc_install_cost,
+                                maintenance_visits_per_year, warranty_years, grid_rate, inflation_rate, num_years,
+                                maintenance_cost_per_panel, maintenance_cost_controller, maintenance_cost_inverter,
+                                maintenance_cost_per_battery, maintenance_misc_cost, discount_rate, num_years_emission]
+            portfolio_outputs = [portfolio_progress, portfolio_totals, portfolio_table, portfolio_download]
+            btn_portfolio.click(portfolio_action, inputs=portfolio_inputs, outputs=portfolio_outputs, show_progress='minimal')
+
+    return app
+
+def main(argv=None):
+    args = parse_args(argv)
+    workers.configure(process_workers=args.process_workers, max_heavy_jobs=args.max_heavy_jobs)
+    # Before the UI is built: handlers are only wrapped when instrumentation is on
+    instrumentation.configure(metrics_port=args.metrics_port, trace_log=args.trace_log)
+    scenario_store.configure(args.scenario_db)
+    with startup.phase('scenario store'):
+        scenario_store.get_store()
+
+    # Recorded as the `import gradio` phase; it also loads pandas and matplotlib
+    startup.ensure_loaded(gr)
+    with startup.phase('ui build'):
+        app = build_app()
+
+    # Queue every event: `concurrency` worker threads, bounded waiting list for backpressure
+    app.queue(concurrency_count=args.concurrency, max_size=args.queue_size)
+    instrumentation.instrument_app(app)
+    if instrumentation.start():
+        print(f"Metrics: http://{instrumentation.METRICS_HOST}:{instrumentation.METRICS_PORT}/metrics")
+    with startup.phase('launch'):
+        app.launch(max_threads=args.concurrency, prevent_thread_lock=True)
+    print(f"Startup: {startup.report()}")
+
+    if not args.no_prewarm:
+        startup.prewarm([px, go], tasks=[workers.warm_up])
+    app.block_thread()
 
 if __name__ == "__main__":
     main()
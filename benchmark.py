@@ -0,0 +1,357 @@
+# benchmark.py
+#
+# Performance benchmarks for the Yellow Sun Tool, run outside the UI. The app is
+# built (never launched) so every Gradio action runs exactly as in production,
+# with its default inputs, and the outputs go through Gradio's postprocessing.
+#
+# - Action cases time each real handler end to end, and its compute, dataframe,
+#   render and serialize stages as timed by the handler's own stage() blocks
+#   (instrumentation.collect_stages). Latency is reported as percentiles and
+#   memory as the peak Python heap (tracemalloc) of the action and of each stage.
+# - Streaming actions (the portfolio) are timed to their first update and to
+#   their last, over a generated site list of PORTFOLIO_SITES sites.
+# - Scaling cases run the batch pipeline over growing numbers of scenarios.
+# - --save-baseline writes the results to JSON; --compare reruns and reports
+#   every metric that got worse than the saved baseline by more than
+#   --threshold (exit status 1 if any did).
+#
+# Stage caches are cleared before every iteration so the numbers reflect cold
+# requests; --warm-cache measures repeat requests served from the caches.
+#
+# Usage:
+#     python benchmark.py
+#     python benchmark.py --save-baseline baseline.json
+#     python benchmark.py --compare baseline.json --threshold 0.2
+
+import argparse
+import atexit
+import gc
+import importlib.util
+import inspect
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+import scenario_store
+import workers
+from instrumentation import collect_stages, stage
+from pv_model import ghi
+from result_cache import clear_caches
+from yst_batch import INPUT_COLUMNS, run_pipeline
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'YST-V1.py')
+
+COST_HORIZONS = [10, 50, 100]
+SCALING_SIZES = [1, 100, 1000, 10000, 100000]
+PORTFOLIO_SITES = 10000
+
+# Metrics compared against a baseline; differences below the floor are treated as noise
+COMPARED_METRICS = {'p50_ms': 0.05, 'peak_kib': 64, 'total_ms': 0.05}
+
+# One batch scenario per row, with the app's default inputs (states and loads vary per row)
+SCALING_SCENARIO = {
+    'panel_length': 1.6, 'panel_width': 1.0, 'panel_efficiency': 20, 'inverter_efficiency': 95,
+    'daily_target_energy': 10, 'autonomy_days': 2, 'battery_voltage': 12, 'depth_of_discharge': 50,
+    'battery_efficiency': 95, 'battery_capacity': 200,
+    'solar_panel_unit_cost': 50000, 'controller_cost': 20000, 'inverter_cost': 100000,
+    'battery_unit_cost': 60000, 'misc_procurement_cost': 10000, 'maintenance_cost': 500,
+    'maintenance_visits_per_year': 2, 'warranty_years': 2, 'grid_rate': 50, 'inflation_rate': 10,
+    'num_years': 10, 'num_years_emission': 10,
+}
+
+
+def load_app():
+    """Import YST-V1.py as a module and build (not launch) its Blocks app."""
+    spec = importlib.util.spec_from_file_location('yst_app', APP_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module, module.build_app()
+
+
+def app_actions(app):
+    """Every action of ``app`` as ``name -> (handler, default inputs by parameter, output components)``."""
+    actions = {}
+    for block_function in app.fns:
+        handler = block_function.fn
+        if handler is None or not handler.__name__.endswith('_action'):
+            continue
+        values = [component.preprocess(component.value) for component in block_function.inputs]
+        inputs = dict(zip(inspect.signature(handler).parameters, values))
+        actions[handler.__name__] = (handler, inputs, block_function.outputs)
+    return actions
+
+
+def postprocess(outputs, components):
+    """Convert handler outputs the way Gradio does before sending them to the browser."""
+    return [value if isinstance(value, dict) else component.postprocess(value)  # gr.update() dicts pass through
+            for component, value in zip(components, outputs)]
+
+
+def run_action(handler, inputs, outputs):
+    """Run an action and postprocess its outputs, timed as the ``serialize`` stage as in the app."""
+    results = handler(**inputs)
+    with stage('serialize'):
+        postprocess(results, outputs)
+
+
+def stream(handler, inputs, outputs, first_only=False):
+    """Run a streaming (generator) action, postprocessing every update; stop after the first if ``first_only``."""
+    updates = handler(**inputs)
+    try:
+        for update in updates:
+            with stage('serialize'):
+                postprocess(update, outputs)
+            if first_only:
+                break
+    finally:
+        updates.close()
+
+
+def portfolio_site_list(size, seed=0):
+    """Path of a generated site list of ``size`` sites in random states, with random loads and budgets."""
+    rng = np.random.default_rng(seed)
+    states = np.array(list(ghi))
+    sites = pd.DataFrame({
+        'Site': [f'Site {i + 1}' for i in range(size)],
+        'State': states[rng.integers(len(states), size=size)],
+        'Daily Target Energy (kWh)': rng.uniform(1, 50, size=size).round(1),
+        'Budget': rng.uniform(5e5, 5e6, size=size).round(-3),
+    })
+    file = tempfile.NamedTemporaryFile('w', prefix='benchmark_sites_', suffix='.csv', delete=False, newline='')
+    with file:
+        sites.to_csv(file, index=False)
+    atexit.register(os.remove, file.name)
+    return file.name
+
+
+def action_cases(app):
+    """Benchmark cases as ``name -> {run: callable}``; every action gets an ``action`` run."""
+    actions = app_actions(app)
+    variants = {'simulate_costs_action': [(f'[{years}y]', {'num_years': years}) for years in COST_HORIZONS]}
+    overrides = {'portfolio_action': {'site_file': portfolio_site_list(PORTFOLIO_SITES)}}
+
+    cases = {}
+    for name, (handler, defaults, outputs) in actions.items():
+        for suffix, case_overrides in variants.get(name, [('', {})]):
+            inputs = {**defaults, **overrides.get(name, {}), **case_overrides}
+            runs = {}
+            if inspect.isgeneratorfunction(handler):
+                runs['first'] = (lambda handler=handler, inputs=inputs, outputs=outputs:
+                                 stream(handler, inputs, outputs, first_only=True))
+                runs['action'] = (lambda handler=handler, inputs=inputs, outputs=outputs:
+                                  stream(handler, inputs, outputs))
+            else:
+                runs['action'] = (lambda handler=handler, inputs=inputs, outputs=outputs:
+                                  run_action(handler, inputs, outputs))
+            cases[name + suffix] = runs
+    return cases
+
+
+def latency_summary(latencies):
+    latencies = np.array(latencies)
+    return {
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p90_ms': float(np.percentile(latencies, 90)),
+        'p99_ms': float(np.percentile(latencies, 99)),
+        'mean_ms': float(latencies.mean()),
+    }
+
+
+def measure(run, iterations, warmup, warm_cache):
+    """Latency percentiles (ms) and peak Python heap (KiB) of ``run()``, the latencies (ms) of its stages and their
+    peak heap (KiB)."""
+    for _ in range(warmup):
+        if not warm_cache:
+            clear_caches()
+        run()
+
+    latencies = []
+    stage_latencies = defaultdict(list)
+    for _ in range(iterations):
+        if not warm_cache:
+            clear_caches()
+        with collect_stages() as stages:
+            start = time.perf_counter()
+            run()
+            latencies.append((time.perf_counter() - start) * 1000)
+        for name, seconds in stages.items():
+            stage_latencies[name].append(seconds * 1000)
+
+    peak = 0
+    stage_peaks = {}
+    tracemalloc.start()
+    for _ in range(min(iterations, 3)):
+        if not warm_cache:
+            clear_caches()
+        gc.collect()
+        # The handler's stages reset the traced peak, so the whole run is itself an enclosing stage
+        run_peaks = {}
+        with collect_stages(peaks=run_peaks), stage('run'):
+            run()
+        peak = max(peak, run_peaks.pop('run'))
+        for name, value in run_peaks.items():
+            stage_peaks[name] = max(stage_peaks.get(name, 0), value)
+    tracemalloc.stop()
+
+    stage_peaks_kib = {name: value / 1024 for name, value in stage_peaks.items()}
+    return {**latency_summary(latencies), 'peak_kib': peak / 1024}, stage_latencies, stage_peaks_kib
+
+
+def run_action_benchmarks(cases, iterations, warmup, warm_cache, only=None):
+    results = {}
+    for case, runs in cases.items():
+        if only and not any(pattern in case for pattern in only):
+            continue
+        for run_name, run in runs.items():
+            metrics, stage_latencies, stage_peaks = measure(run, iterations, warmup, warm_cache)
+            if run_name == 'action':
+                # Stages of the whole action as timed by the handler's own stage() blocks
+                for stage_name, latencies in stage_latencies.items():
+                    results[f'{case}/{stage_name}'] = {**latency_summary(latencies),
+                                                       'peak_kib': stage_peaks.get(stage_name, 0.0)}
+            results[f'{case}/{run_name}'] = metrics
+    return results
+
+
+def scaling_scenarios(size, seed=0):
+    rng = np.random.default_rng(seed)
+    states = np.array(list(ghi))
+    columns = {INPUT_COLUMNS[name]: np.full(size, value) for name, value in SCALING_SCENARIO.items()}
+    columns[INPUT_COLUMNS['state']] = states[rng.integers(len(states), size=size)]
+    columns[INPUT_COLUMNS['daily_target_energy']] = rng.uniform(1, 50, size=size).round(1)
+    return pd.DataFrame(columns)
+
+
+def run_scaling_benchmarks(sizes, repeats):
+    results = {}
+    for size in sizes:
+        scenarios = scaling_scenarios(size)
+        run_pipeline(scenarios)  # warm-up
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            run_pipeline(scenarios)
+            timings.append(time.perf_counter() - start)
+
+        gc.collect()
+        tracemalloc.start()
+        run_pipeline(scenarios)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        total = min(timings)
+        results[f'scaling/{size}'] = {
+            'total_ms': total * 1000,
+            'per_row_us': total / size * 1e6,
+            'peak_kib': peak / 1024,
+        }
+    return results
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+    }
+
+
+def print_results(results):
+    print(f"{'benchmark':<52}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'mean ms':>10}{'peak KiB':>12}")
+    for key, metrics in results.items():
+        if key.startswith('scaling/'):
+            continue
+        peak = f"{metrics['peak_kib']:>12.1f}" if 'peak_kib' in metrics else f"{'-':>12}"
+        print(f"{key:<52}{metrics['p50_ms']:>10.2f}{metrics['p90_ms']:>10.2f}{metrics['p99_ms']:>10.2f}"
+              f"{metrics['mean_ms']:>10.2f}{peak}")
+
+    scaling = {key: metrics for key, metrics in results.items() if key.startswith('scaling/')}
+    if scaling:
+        print()
+        print(f"{'batch size':<52}{'total ms':>10}{'us/row':>10}{'peak KiB':>12}")
+        for key, metrics in scaling.items():
+            print(f"{key.split('/')[1]:<52}{metrics['total_ms']:>10.2f}{metrics['per_row_us']:>10.2f}"
+                  f"{metrics['peak_kib']:>12.1f}")
+
+
+def compare(results, baseline, threshold):
+    """Print the change of every compared metric against ``baseline``; return the regressed ones."""
+    regressions = []
+    print(f"\nComparison with baseline from {baseline['environment']['date']} (threshold {threshold:.0%}):")
+    print(f"{'benchmark':<52}{'metric':>10}{'baseline':>12}{'current':>12}{'change':>10}")
+    for key, metrics in results.items():
+        old_metrics = baseline['results'].get(key)
+        if old_metrics is None:
+            continue
+        for metric, noise_floor in COMPARED_METRICS.items():
+            if metric not in metrics or metric not in old_metrics:
+                continue
+            old, new = old_metrics[metric], metrics[metric]
+            change = (new - old) / old if old else 0.0
+            regressed = change > threshold and new - old > noise_floor
+            if regressed:
+                regressions.append((key, metric, change))
+            print(f"{key:<52}{metric:>10}{old:>12.2f}{new:>12.2f}{change:>+10.1%}{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Yellow Sun Tool actions and batch pipeline.")
+    parser.add_argument('--iterations', type=int, default=30, help="Timed runs per benchmark (default: 30)")
+    parser.add_argument('--warmup', type=int, default=3, help="Untimed runs before timing (default: 3)")
+    parser.add_argument('--only', nargs='+', help="Only run the action benchmarks whose name contains one of these")
+    parser.add_argument('--warm-cache', action='store_true', help="Keep the stage and chart caches between runs")
+    parser.add_argument('--no-actions', action='store_true', help="Skip the action benchmarks (no Gradio needed)")
+    parser.add_argument('--no-scaling', action='store_true', help="Skip the batch-size scaling benchmarks")
+    parser.add_argument('--scaling-sizes', type=int, nargs='+', default=SCALING_SIZES,
+                        help="Scenario counts for the scaling benchmarks")
+    parser.add_argument('--scaling-repeats', type=int, default=3, help="Runs per batch size, best is kept (default: 3)")
+    parser.add_argument('--save-baseline', metavar='PATH', help="Write the results to a JSON baseline")
+    parser.add_argument('--compare', metavar='PATH', help="Compare the results with a saved JSON baseline")
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help="Relative slowdown or memory growth reported as a regression (default: 0.1)")
+    args = parser.parse_args()
+
+    # Heavy simulations run in this process so that their time and memory are measured
+    workers.configure(process_workers=1)
+    # Benchmark runs are not user scenarios
+    scenario_store.configure('')
+
+    results = {}
+    if not args.no_actions:
+        _, app = load_app()
+        results.update(run_action_benchmarks(action_cases(app), args.iterations, args.warmup,
+                                             args.warm_cache, args.only))
+    if not args.no_scaling:
+        results.update(run_scaling_benchmarks(args.scaling_sizes, args.scaling_repeats))
+
+    print_results(results)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as file:
+            json.dump({'environment': environment(), 'results': results}, file, indent=2)
+        print(f"\nSaved baseline to {args.save_baseline}")
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} metric(s) regressed by more than {args.threshold:.0%}")
+            sys.exit(1)
+        print("\nNo regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+# charts.py
+#
+# Matplotlib chart rendering for the Monthly PV Potential and PV System
+# Designer tabs.
+#
+# - Figures are built once per chart type (per thread) and only their data and
+#   title are updated on each call, instead of creating a new figure and running
+#   tight_layout every time.
+# - Rendered PNGs are cached by a content hash of the plotted series, and a
+#   repeat request returns the cached file without drawing anything.
+# - Handlers receive a PNG file path, which Gradio sends as-is; returning a PIL
+#   image meant encoding to PNG, decoding it again and re-encoding it.
+# - An evicted PNG is removed only CHART_REMOVAL_DELAY seconds later, since
+#   another session may have just been handed its path and Gradio has yet to
+#   copy it. CHART_DIR is removed at exit unless it was given by YST_CHART_DIR.
+
+import atexit
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from result_cache import ResultCache, caches, normalize_key, DEFAULT_TTL
+
+CHART_CACHE_SIZE = int(os.environ.get('YST_CHART_CACHE_SIZE', 128))
+CHART_DIR = os.environ.get('YST_CHART_DIR')
+if not CHART_DIR:
+    CHART_DIR = tempfile.mkdtemp(prefix='yst-charts-')
+    atexit.register(shutil.rmtree, CHART_DIR, ignore_errors=True)
+CHART_REMOVAL_DELAY = float(os.environ.get('YST_CHART_REMOVAL_DELAY', 60))
+
+FIGURE_SIZE = (14, 6)
+# Fixed margins sized for the longest tick labels, so templates never need tight_layout
+FIGURE_MARGINS = dict(left=0.07, right=0.985, top=0.93, bottom=0.1)
+
+_templates = threading.local()
+
+_pending_removals = OrderedDict()  # evicted PNG path -> time after which it is removed, oldest first
+_removals_lock = threading.Lock()
+
+
+def _remove_chart(path):
+    with _removals_lock:
+        _pending_removals[path] = time.monotonic() + CHART_REMOVAL_DELAY
+
+
+def _remove_expired_charts():
+    now = time.monotonic()
+    with _removals_lock:
+        while _pending_removals:
+            path, deadline = next(iter(_pending_removals.items()))
+            if deadline > now:
+                break
+            del _pending_removals[path]
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+chart_cache = caches.setdefault('charts', ResultCache('charts', maxsize=CHART_CACHE_SIZE, ttl=DEFAULT_TTL,
+                                                      on_evict=_remove_chart))
+
+
+def _new_figure():
+    # Imported here so that importing this module does not load matplotlib
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=FIGURE_SIZE)
+    FigureCanvasAgg(fig)
+    fig.subplots_adjust(**FIGURE_MARGINS)
+    return fig, fig.add_subplot()
+
+
+def _line_template(months):
+    fig, ax = _new_figure()
+    line, = ax.plot(months, [0] * len(months), marker='o', linestyle='-', color='orange')
+    ax.set_xlabel('Month')
+    ax.set_ylabel('PV Potential (kWh)')
+    ax.grid(True)
+    return fig, ax, line
+
+
+def _bar_template(months):
+    fig, ax = _new_figure()
+    bars = ax.bar(months, [0] * len(months), color='orange')
+    ax.set_title('Monthly Energy Generation for Designed PV System')
+    ax.set_xlabel('Month')
+    ax.set_ylabel('Energy Generation (kWh)')
+    ax.grid(axis='y', linestyle='--', alpha=0.7)
+    return fig, ax, bars
+
+
+def _template(kind, months, build):
+    """This thread's figure template for ``kind``, rebuilt only if the x labels change."""
+    templates = _templates.__dict__
+    key = (kind, tuple(months))
+    if key not in templates:
+        templates[key] = build(months)
+    return templates[key]
+
+
+def _cached_render(kind, series, draw):
+    """Return the PNG path for ``series``, calling ``draw(path)`` only on a cache miss."""
+    _remove_expired_charts()
+    digest = hashlib.sha1(repr((kind, normalize_key(series))).encode()).hexdigest()
+    hit, path = chart_cache.get(digest)
+    if hit and os.path.exists(path):
+        return path
+
+    path = os.path.join(CHART_DIR, f'{kind}-{digest}.png')
+    partial_path = f'{path}.{threading.get_ident()}.tmp'
+    draw(partial_path)
+    with _removals_lock:
+        # Redrawn after an eviction: the pending removal must not delete the new file
+        _pending_removals.pop(path, None)
+        os.replace(partial_path, path)
+    chart_cache.put(digest, path)
+    return path
+
+
+def plot_monthly_pv_potential(months, monthly_pv_potential, state):
+    def draw(path):
+        fig, ax, line = _template('pv_potential', months, _line_template)
+        line.set_ydata(monthly_pv_potential)
+        ax.set_title(f'Monthly PV Potential for a Single Panel in {state}')
+        ax.relim()
+        ax.autoscale_view()
+        fig.savefig(path, format='png')
+
+    return _cached_render('pv_potential', (months, monthly_pv_potential, state), draw)
+
+
+def plot_monthly_generation(months, monthly_generation):
+    def draw(path):
+        fig, ax, bars = _template('generation', months, _bar_template)
+        for bar, energy in zip(bars, monthly_generation):
+            bar.set_height(energy)
+        ax.relim()
+        ax.autoscale_view()
+        fig.savefig(path, format='png')
+
+    return _cached_render('generation', (months, monthly_generation), draw)
@@ -0,0 +1,222 @@
+# cost_model.py
+#
+# Life-cycle cost model for the PV system vs grid supply. Like pv_model, every
+# function works on scalars or on column arrays of scenarios.
+
+import numpy as np
+
+from result_cache import cached_stage
+
+
+def commissioning_costs_batch(min_panels, number_of_batteries,
+                              solar_panel_unit_cost, controller_cost, inverter_cost, battery_unit_cost, misc_procurement_cost,
+                              solar_panel_install_cost, controller_install_cost, inverter_install_cost, battery_install_cost, misc_install_cost):
+    """Return ``(total_procurement_cost, total_installation_cost, commission_cost)`` arrays."""
+    min_panels = np.asarray(min_panels)
+    number_of_batteries = np.asarray(number_of_batteries)
+
+    total_procurement_cost = (np.multiply(solar_panel_unit_cost, min_panels) + controller_cost + inverter_cost
+                              + np.multiply(battery_unit_cost, number_of_batteries) + misc_procurement_cost)
+    total_installation_cost = (np.multiply(solar_panel_install_cost, min_panels) + controller_install_cost + inverter_install_cost
+                               + np.multiply(battery_install_cost, number_of_batteries) + misc_install_cost)
+    commission_cost = total_procurement_cost + total_installation_cost
+
+    return total_procurement_cost, total_installation_cost, commission_cost
+
+
+def maintenance_cost_batch(min_panels, number_of_batteries,
+                           maintenance_cost_per_panel, maintenance_cost_controller, maintenance_cost_inverter,
+                           maintenance_cost_per_battery, maintenance_misc_cost):
+    """Cost of a single maintenance visit for each scenario."""
+    return (np.multiply(maintenance_cost_per_panel, min_panels) + maintenance_cost_controller + maintenance_cost_inverter
+            + np.multiply(maintenance_cost_per_battery, number_of_batteries) + maintenance_misc_cost)
+
+
+def geometric_series_sum(ratio, start, stop):
+    """Closed-form ``sum(ratio ** i for i in range(start, stop))``, element-wise over arrays."""
+    ratio = np.asarray(ratio, dtype=float)
+    start = np.asarray(start, dtype=float)
+    stop = np.maximum(np.asarray(stop, dtype=float), start)
+
+    # ratio**start * (ratio**n - 1) / (ratio - 1), with expm1/log to stay accurate for ratios near 1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        series = ratio ** start * np.expm1((stop - start) * np.log(ratio)) / (ratio - 1)
+    return np.where(ratio == 1, stop - start, series)
+
+
+def cost_tables_batch(daily_target_energy, grid_rate, inflation_rate, num_years,
+                      usage_cost, warranty_years, commission_cost):
+    """Annual PV and grid cost tables for many scenarios.
+
+    ``inflation_rate`` is in percent and ``usage_cost`` is the yearly maintenance cost. Returns
+    ``(pv_cost_table, grid_cost_table)`` of shape (n_scenarios, max(num_years)); years beyond a
+    scenario's own ``num_years`` are zero so row sums give the totals over its simulation period.
+
+    Grid cost compounds by repeated multiplication (``np.cumprod``) and PV maintenance by
+    ``growth ** year``, matching the original year-by-year loop exactly.
+    """
+    num_years = np.atleast_1d(np.asarray(num_years).astype(np.int64))
+    n_scenarios = np.broadcast(*[np.asarray(arg) for arg in (
+        daily_target_energy, grid_rate, inflation_rate, num_years,
+        usage_cost, warranty_years, commission_cost)]).size
+    num_years = np.broadcast_to(num_years, (n_scenarios,))
+    max_years = max(int(num_years.max()), 0)
+    if max_years == 0:
+        # No scenario has a year to simulate
+        return np.zeros((n_scenarios, 0)), np.zeros((n_scenarios, 0))
+    years = np.arange(max_years)
+    growth = np.broadcast_to(1 + np.asarray(inflation_rate, dtype=float) / 100, (n_scenarios,))[:, np.newaxis]
+
+    # Grid cost: first-year bill, then compounded by inflation each year
+    grid_cost_table = np.empty((n_scenarios, max_years))
+    grid_cost_table[:, 0] = np.multiply(daily_target_energy, grid_rate) * 365
+    grid_cost_table[:, 1:] = growth
+    grid_cost_table = np.cumprod(grid_cost_table, axis=1)
+
+    # PV cost, free while under warranty
+    warranty_years = np.broadcast_to(np.asarray(warranty_years), (n_scenarios,))[:, np.newaxis]
+    in_warranty = (warranty_years > 0) & (years < warranty_years)
+    usage_cost = np.broadcast_to(np.asarray(usage_cost), (n_scenarios,))[:, np.newaxis]
+    pv_cost_table = np.where(in_warranty, 0, usage_cost * growth ** years)
+
+    # Include commissioning cost
+    pv_cost_table[:, 0] += commission_cost
+
+    beyond_horizon = years >= num_years[:, np.newaxis]
+    pv_cost_table[beyond_horizon] = 0
+    grid_cost_table[beyond_horizon] = 0
+
+    return pv_cost_table, grid_cost_table
+
+
+def payback_year_batch(pv_cost_table, grid_cost_table, num_years):
+    """First simulation year (1-based) in which cumulative PV cost is at or below cumulative grid cost.
+
+    NaN where the PV system does not pay back within its simulation period.
+    """
+    num_years = np.atleast_1d(np.asarray(num_years).astype(np.int64))
+    paid_back = np.cumsum(pv_cost_table, axis=1) <= np.cumsum(grid_cost_table, axis=1)
+    paid_back &= np.arange(pv_cost_table.shape[1]) < num_years[:, np.newaxis]
+
+    if not paid_back.shape[1]:
+        return np.full(len(paid_back), np.nan)
+    first_year = paid_back.argmax(axis=1) + 1.0
+    return np.where(paid_back.any(axis=1), first_year, np.nan)
+
+
+def life_cycle_metrics_batch(daily_target_energy, grid_rate, inflation_rate, num_years,
+                             usage_cost, warranty_years, commission_cost, discount_rate=0):
+    """Totals, NPV and levelized cost of energy for many scenarios without building yearly tables.
+
+    Every cost stream is a geometric series in ``(1 + inflation) / (1 + discount)``, so the sums over
+    any horizon are evaluated in closed form. Year 1 is undiscounted (commissioning is paid up
+    front) and rates are in percent. Returns a dict of arrays:
+
+    - ``total_pv_cost`` / ``total_grid_cost``: undiscounted life-cycle cost (₦)
+    - ``npv_pv_cost`` / ``npv_grid_cost``: present value of the same streams (₦)
+    - ``npv_savings``: ``npv_grid_cost - npv_pv_cost`` (₦)
+    - ``lcoe_pv`` / ``lcoe_grid``: discounted cost per discounted kWh delivered (₦/kWh)
+    """
+    num_years = np.asarray(num_years).astype(np.int64)
+    growth = 1 + np.asarray(inflation_rate, dtype=float) / 100
+    discount = 1 + np.asarray(discount_rate, dtype=float) / 100
+    first_grid_cost = np.multiply(daily_target_energy, grid_rate) * 365
+    annual_energy = np.multiply(daily_target_energy, 365)
+
+    # Maintenance is charged from the first year after the warranty
+    maintenance_start = np.where(np.asarray(warranty_years) > 0, np.ceil(warranty_years), 0)
+
+    def stream_sums(ratio):
+        grid_cost = first_grid_cost * geometric_series_sum(ratio, 0, num_years)
+        pv_cost = commission_cost + usage_cost * geometric_series_sum(ratio, maintenance_start, num_years)
+        return pv_cost, grid_cost
+
+    total_pv_cost, total_grid_cost = stream_sums(growth)
+    npv_pv_cost, npv_grid_cost = stream_sums(growth / discount)
+    npv_energy = annual_energy * geometric_series_sum(1 / discount, 0, num_years)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        lcoe_pv = npv_pv_cost / npv_energy
+        lcoe_grid = npv_grid_cost / npv_energy
+
+    return {
+        'total_pv_cost': total_pv_cost,
+        'total_grid_cost': total_grid_cost,
+        'npv_pv_cost': npv_pv_cost,
+        'npv_grid_cost': npv_grid_cost,
+        'npv_savings': npv_grid_cost - npv_pv_cost,
+        'lcoe_pv': lcoe_pv,
+        'lcoe_grid': lcoe_grid,
+    }
+
+
+def simulate_costs_batch(min_panels, number_of_batteries,
+                         solar_panel_unit_cost, controller_cost, inverter_cost, battery_unit_cost, misc_procurement_cost,
+                         solar_panel_install_cost, controller_install_cost, inverter_install_cost, battery_install_cost, misc_install_cost,
+                         maintenance_visits_per_year, warranty_years, grid_rate, inflation_rate, num_years,
+                         maintenance_cost_per_panel, maintenance_cost_controller, maintenance_cost_inverter,
+                         maintenance_cost_per_battery, maintenance_misc_cost, daily_target_energy, discount_rate=0):
+    """The cost stage of the UI for many scenarios, with per-component maintenance costs.
+
+    Returns a dict of arrays: ``total_procurement_cost``, ``total_installation_cost``, ``commission_cost``,
+    yearly ``usage_cost``, the (n_scenarios, max(num_years)) ``pv_cost_table`` and ``grid_cost_table``,
+    the outputs of ``life_cycle_metrics_batch`` and ``payback_year``.
+    """
+    total_procurement_cost, total_installation_cost, commission_cost = commissioning_costs_batch(
+        min_panels, number_of_batteries,
+        solar_panel_unit_cost, controller_cost, inverter_cost, battery_unit_cost, misc_procurement_cost,
+        solar_panel_install_cost, controller_install_cost, inverter_install_cost, battery_install_cost, misc_install_cost)
+    maintenance_cost = maintenance_cost_batch(
+        min_panels, number_of_batteries,
+        maintenance_cost_per_panel, maintenance_cost_controller, maintenance_cost_inverter,
+        maintenance_cost_per_battery, maintenance_misc_cost)
+    usage_cost = maintenance_cost * maintenance_visits_per_year
+
+    pv_cost_table, grid_cost_table = cost_tables_batch(
+        daily_target_energy, grid_rate, inflation_rate, num_years,
+        usage_cost, warranty_years, commission_cost)
+    metrics = life_cycle_metrics_batch(
+        daily_target_energy, grid_rate, inflation_rate, num_years,
+        usage_cost, warranty_years, commission_cost, discount_rate)
+    payback_year = payback_year_batch(pv_cost_table, grid_cost_table, num_years)
+
+    result = dict(metrics)
+    result.update({
+        'total_procurement_cost': total_procurement_cost,
+        'total_installation_cost': total_installation_cost,
+        'commission_cost': commission_cost,
+        'usage_cost': usage_cost,
+        'pv_cost_table': pv_cost_table,
+        'grid_cost_table': grid_cost_table,
+        'payback_year': payback_year,
+    })
+    return result
+
+
+@cached_stage('cost_table')
+def simulate_costs(min_panels, number_of_batteries,
+                   solar_panel_unit_cost, controller_cost, inverter_cost, battery_unit_cost, misc_procurement_cost,
+                   solar_panel_install_cost, controller_install_cost, inverter_install_cost, battery_install_cost, misc_install_cost,
+                   maintenance_visits_per_year, warranty_years, grid_rate, inflation_rate, num_years,
+                   maintenance_cost_per_panel, maintenance_cost_controller, maintenance_cost_inverter,
+                   maintenance_cost_per_battery, maintenance_misc_cost, daily_target_energy, discount_rate=0):
+    """Single-scenario cost stage used by the UI handlers.
+
+    Returns a dict with the ``commission_cost`` and yearly ``usage_cost``, read-only 1-D ``pv_cost_table``
+    and ``grid_cost_table`` arrays, the scalar outputs of ``life_cycle_metrics_batch`` and the ``payback_year``.
+    """
+    costs = simulate_costs_batch(
+        min_panels, number_of_batteries,
+        solar_panel_unit_cost, controller_cost, inverter_cost, battery_unit_cost, misc_procurement_cost,
+        solar_panel_install_cost, controller_install_cost, inverter_install_cost, battery_install_cost, misc_install_cost,
+        maintenance_visits_per_year, warranty_years, grid_rate, inflation_rate, num_years,
+        maintenance_cost_per_panel, maintenance_cost_controller, maintenance_cost_inverter,
+        maintenance_cost_per_battery, maintenance_misc_cost, daily_target_energy, discount_rate)
+
+    pv_cost_table, grid_cost_table = costs.pop('pv_cost_table')[0], costs.pop('grid_cost_table')[0]
+    pv_cost_table.flags.writeable = False
+    grid_cost_table.flags.writeable = False
+
+    result = {name: float(np.ravel(value)[0]) for name, value in costs.items()}
+    result.update({'pv_cost_table': pv_cost_table, 'grid_cost_table': grid_cost_table})
+    return result
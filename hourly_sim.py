@@ -0,0 +1,166 @@
+# hourly_sim.py
+#
+# Hourly (8760) simulation of a designed PV system with battery storage.
+#
+# The synthetic irradiance profile spreads each month's daily GHI over a
+# sine-shaped day between sunrise and sunset, so every day still adds up to
+# the monthly PV potential used by the sizing model. The battery state of
+# charge (SOC) is a running sum clipped to [minimum SOC, capacity]; clip-and-add
+# steps compose into another clip-and-add step, so the whole year is solved as
+# an associative scan (24 in-day steps plus ~log2(365) passes over days, all
+# vectorized across sites) instead of an hour-by-hour Python loop.
+
+import numpy as np
+
+from pv_model import calculate_monthly_pv_potential_batch, DAYS_IN_MONTH
+
+HOURS_PER_YEAR = 8760
+SUNRISE_HOUR = 6
+SUNSET_HOUR = 18
+
+# Month of every hour of the reference year
+HOUR_MONTH = np.repeat(np.arange(12), DAYS_IN_MONTH * 24)
+
+# Share of the daily GHI falling in each hour of the day
+_hours = np.arange(24) + 0.5
+DAILY_IRRADIANCE_SHAPE = np.where((_hours > SUNRISE_HOUR) & (_hours < SUNSET_HOUR),
+                                  np.sin(np.pi * (_hours - SUNRISE_HOUR) / (SUNSET_HOUR - SUNRISE_HOUR)), 0)
+DAILY_IRRADIANCE_SHAPE /= DAILY_IRRADIANCE_SHAPE.sum()
+
+# Hourly load weights (relative), scaled to the daily target energy
+LOAD_PROFILES = {
+    'Flat': [1] * 24,
+    'Residential (evening peak)': [3, 2, 2, 2, 2, 3, 5, 6, 4, 3, 3, 3,
+                                   3, 3, 3, 3, 4, 6, 9, 10, 9, 7, 5, 4],
+    'Commercial (daytime)': [1, 1, 1, 1, 1, 1, 2, 4, 8, 9, 9, 9,
+                             8, 9, 9, 9, 8, 6, 3, 2, 1, 1, 1, 1],
+}
+
+
+def hourly_pv_generation(panel_length, panel_width, panel_efficiency, inverter_efficiency, state, num_panels):
+    """Hourly AC output (kWh) of ``num_panels`` panels over the reference year, shape (n_sites, 8760)."""
+    monthly_pv_potential = calculate_monthly_pv_potential_batch(
+        panel_length, panel_width, panel_efficiency, inverter_efficiency, state)
+    daily_generation = np.atleast_1d(num_panels)[:, np.newaxis] * monthly_pv_potential  # kWh/day for each month
+
+    hourly_shape = np.tile(DAILY_IRRADIANCE_SHAPE, HOURS_PER_YEAR // 24)
+    return daily_generation[:, HOUR_MONTH] * hourly_shape
+
+
+def hourly_load(daily_target_energy, load_profile):
+    """Hourly load (kWh) over the reference year for a 24-value relative load profile, shape (n_sites, 8760)."""
+    load_profile = np.asarray(load_profile, dtype=float)
+    daily_shape = load_profile / load_profile.sum()
+    daily_target_energy = np.atleast_1d(np.asarray(daily_target_energy, dtype=float))
+
+    return daily_target_energy[:, np.newaxis] * np.tile(daily_shape, HOURS_PER_YEAR // 24)
+
+
+def compose_prefix_maps(shift, low, high):
+    """In-place Hillis-Steele scan of ``x -> clip(x + shift, low, high)`` maps along the last axis.
+
+    Afterwards element ``t`` holds the composition of maps ``0..t`` (earliest applied first).
+    """
+    span = 1
+    while span < shift.shape[-1]:
+        later_shift, later_low, later_high = shift[..., span:], low[..., span:], high[..., span:]
+        new_low = np.clip(low[..., :-span] + later_shift, later_low, later_high)
+        new_high = np.clip(high[..., :-span] + later_shift, later_low, later_high)
+        shift[..., span:] = shift[..., :-span] + later_shift
+        low[..., span:] = new_low
+        high[..., span:] = new_high
+        span *= 2
+
+
+def clipped_cumsum(flows, lower, upper, initial, block=24):
+    """``x[t] = clip(x[t-1] + flows[t], lower, upper)`` along the last axis, starting from ``initial``.
+
+    Each step is the map ``x -> clip(x + c, lower, upper)`` and composing two such maps gives another
+    one. Steps are composed sequentially inside blocks of ``block`` hours (vectorized over all sites
+    and blocks), the block maps are combined with a prefix scan, and each hour is then evaluated
+    from the state at the start of its block. The length of the last axis must be a multiple of ``block``.
+    """
+    flows = np.asarray(flows, dtype=float)
+    lower = np.asarray(lower, dtype=float)[..., np.newaxis, np.newaxis]
+    upper = np.asarray(upper, dtype=float)[..., np.newaxis, np.newaxis]
+    steps = flows.reshape(flows.shape[:-1] + (-1, block))
+
+    # Prefix maps within each block
+    shift = np.cumsum(steps, axis=-1)
+    low = np.empty_like(steps)
+    high = np.empty_like(steps)
+    low[..., 0] = np.broadcast_to(lower[..., 0], low[..., 0].shape)
+    high[..., 0] = np.broadcast_to(upper[..., 0], high[..., 0].shape)
+    for hour in range(1, block):
+        low[..., hour] = np.clip(low[..., hour - 1] + steps[..., hour], lower[..., 0], upper[..., 0])
+        high[..., hour] = np.clip(high[..., hour - 1] + steps[..., hour], lower[..., 0], upper[..., 0])
+
+    # Combine whole-block maps to get the state at the end of every block
+    block_shift, block_low, block_high = shift[..., -1].copy(), low[..., -1].copy(), high[..., -1].copy()
+    compose_prefix_maps(block_shift, block_low, block_high)
+    initial = np.asarray(initial, dtype=float)[..., np.newaxis]
+    block_end = np.clip(initial + block_shift, block_low, block_high)
+    block_start = np.concatenate([np.broadcast_to(initial, block_end[..., :1].shape), block_end[..., :-1]], axis=-1)
+
+    soc = np.clip(block_start[..., np.newaxis] + shift, low, high)
+    return soc.reshape(flows.shape)
+
+
+def simulate_hourly(panel_length, panel_width, panel_efficiency, inverter_efficiency, state,
+                    num_panels, daily_target_energy, load_profile,
+                    battery_bank_capacity, depth_of_discharge, battery_efficiency):
+    """Simulate a year of hourly operation for one or many sites.
+
+    ``battery_bank_capacity`` is the installed bank energy in kWh (batteries x Ah x V / 1000);
+    ``battery_efficiency`` is treated as the round-trip efficiency, split evenly between charge
+    and discharge. The bank starts full and never goes below ``1 - depth_of_discharge``.
+
+    Returns a dict of per-site arrays (``loss_of_load_hours``, ``unmet_energy``, ``curtailed_energy``,
+    ``equivalent_cycles``, ``pv_generation``, ``load``) and the hourly series of the first site
+    (``hourly_generation``, ``hourly_load``, ``hourly_soc``) in kWh.
+    """
+    generation = hourly_pv_generation(panel_length, panel_width, panel_efficiency, inverter_efficiency,
+                                      state, num_panels)
+    load = hourly_load(daily_target_energy, load_profile)
+    generation, load = np.broadcast_arrays(generation, load)
+
+    n_sites = generation.shape[0]
+    battery_bank_capacity = np.broadcast_to(np.asarray(battery_bank_capacity, dtype=float), (n_sites,))
+    minimum_soc = battery_bank_capacity * (1 - np.asarray(depth_of_discharge, dtype=float) / 100)
+    one_way_efficiency = np.sqrt(np.broadcast_to(np.asarray(battery_efficiency, dtype=float) / 100,
+                                                 (n_sites,)))[:, np.newaxis]
+
+    # Energy offered to (surplus) or requested from (deficit) the battery, at its terminals
+    net = generation - load
+    with np.errstate(divide='ignore'):
+        flows = np.where(net > 0, net * one_way_efficiency, net / one_way_efficiency)
+
+    soc = clipped_cumsum(flows, minimum_soc, battery_bank_capacity, battery_bank_capacity)
+    soc_change = np.diff(soc, axis=-1, prepend=battery_bank_capacity[:, np.newaxis])
+
+    charged = np.where(net > 0, soc_change / one_way_efficiency, 0)
+    discharged = np.where(net < 0, -soc_change, 0)
+    # Clip floating-point dust so balanced hours report exactly zero
+    curtailed = np.maximum(np.where(net > 0, net - charged, 0), 0)
+    unmet = np.maximum(np.where(net < 0, -net - discharged * one_way_efficiency, 0), 0)
+
+    usable_capacity = battery_bank_capacity - minimum_soc
+    with np.errstate(divide='ignore', invalid='ignore'):
+        equivalent_cycles = np.where(usable_capacity > 0, discharged.sum(axis=-1) / usable_capacity, 0)
+
+    # Ignore floating-point dust when counting hours with unmet load
+    tolerance = 1e-9 * np.maximum(load.max(axis=-1, keepdims=True), 1)
+
+    return {
+        'loss_of_load_hours': (unmet > tolerance).sum(axis=-1),
+        'unmet_energy': unmet.sum(axis=-1),
+        'curtailed_energy': curtailed.sum(axis=-1),
+        'equivalent_cycles': equivalent_cycles,
+        'pv_generation': generation.sum(axis=-1),
+        'load': load.sum(axis=-1),
+        'hourly_generation': generation[0],
+        'hourly_load': load[0],
+        'hourly_soc': soc[0],
+        'hourly_unmet': unmet[0],
+        'hourly_curtailed': curtailed[0],
+    }
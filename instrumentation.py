@@ -0,0 +1,342 @@
+# instrumentation.py
+#
+# Optional per-request instrumentation for the Gradio app: stage timings
+# (compute, dataframe, render, serialize), queue wait, call and error counts.
+# The numbers are served as Prometheus text on a local port and can also be
+# written as one JSON line per request to a trace log.
+#
+# Everything is off unless a metrics port or a trace log is configured. While
+# off, ``instrumented`` returns the handler unchanged and ``stage`` returns a
+# shared no-op context manager, except inside ``collect_stages`` (used by
+# benchmark.py to time the stages of the real handlers).
+#
+# Queue wait and serialization happen inside Gradio rather than in the
+# handlers. ``instrument_app`` measures them by wrapping the app's queue push,
+# ``process_api`` and ``postprocess_data``, which are the Gradio 3.40
+# (requirements.txt) code paths.
+
+import bisect
+import contextvars
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict, defaultdict, deque
+from contextlib import contextmanager, nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import startup
+from result_cache import cache_stats
+
+METRICS_PORT = int(os.environ.get('YST_METRICS_PORT', 0))  # 0 disables the endpoint
+METRICS_HOST = os.environ.get('YST_METRICS_HOST', '127.0.0.1')
+TRACE_LOG = os.environ.get('YST_TRACE_LOG') or None
+ENABLED = bool(METRICS_PORT or TRACE_LOG)
+
+# Upper bounds (seconds) of the latency histogram buckets
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# Queued events whose start has not been seen yet (e.g. the client left); older ones are dropped
+MAX_PENDING_EVENTS = 10000
+
+_NO_STAGE = nullcontext()
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram in the Prometheus format."""
+
+    def __init__(self):
+        self.bucket_counts = [0] * (len(DURATION_BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.bucket_counts[bisect.bisect_left(DURATION_BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+
+_lock = threading.Lock()
+_calls = defaultdict(int)
+_errors = defaultdict(int)
+_handler_seconds = defaultdict(Histogram)
+_request_seconds = defaultdict(Histogram)
+_stage_seconds = defaultdict(Histogram)
+_queue_wait_seconds = defaultdict(Histogram)
+
+_enqueued = OrderedDict()  # queue event id -> times its events were queued (a session may queue several)
+_enqueued_lock = threading.Lock()
+
+_trace_file = None
+_trace_lock = threading.Lock()
+
+# The request being handled; Gradio runs the handler in a worker thread with a copy of this context
+_current = contextvars.ContextVar('yst_request_trace', default=None)
+
+
+class RequestTrace:
+    """Timings of one request, recorded into the metrics (and trace log) when it finishes."""
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.started = time.time()
+        self.queue_wait = None
+        self.handler_seconds = None
+        self.request_seconds = None
+        self.stages = defaultdict(float)
+        self.stage_peaks = None  # {name: bytes} when collecting memory peaks
+        self.open_stages = []
+        self.error = None
+
+    def finish(self):
+        with _lock:
+            _calls[self.handler] += 1
+            if self.error is not None:
+                _errors[self.handler] += 1
+            if self.handler_seconds is not None:
+                _handler_seconds[self.handler].observe(self.handler_seconds)
+            if self.request_seconds is not None:
+                _request_seconds[self.handler].observe(self.request_seconds)
+            if self.queue_wait is not None:
+                _queue_wait_seconds[self.handler].observe(self.queue_wait)
+            for name, seconds in self.stages.items():
+                _stage_seconds[(self.handler, name)].observe(seconds)
+
+        if _trace_file is not None:
+            record = {
+                'time': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started)),
+                'handler': self.handler,
+                'queue_wait': self.queue_wait,
+                'handler_seconds': self.handler_seconds,
+                'request_seconds': self.request_seconds,
+                'stages': dict(self.stages),
+                'error': self.error,
+            }
+            with _trace_lock:
+                _trace_file.write(json.dumps(record) + '\n')
+
+
+class _Stage:
+    __slots__ = ('name', 'trace', 'start', 'heap_start', 'heap_peak')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.trace = _current.get()
+        if self.trace is not None and self.trace.stage_peaks is not None:
+            # Resetting the peak would lose what enclosing stages reached so far, so hand it to them first
+            peak = tracemalloc.get_traced_memory()[1]
+            for outer in self.trace.open_stages:
+                outer.heap_peak = max(outer.heap_peak, peak)
+            tracemalloc.reset_peak()
+            self.heap_start = self.heap_peak = tracemalloc.get_traced_memory()[0]
+            self.trace.open_stages.append(self)
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        if self.trace is not None:
+            self.trace.stages[self.name] += time.perf_counter() - self.start
+            if self.trace.stage_peaks is not None:
+                self.trace.open_stages.remove(self)
+                peak = max(self.heap_peak, tracemalloc.get_traced_memory()[1]) - self.heap_start
+                self.trace.stage_peaks[self.name] = max(self.trace.stage_peaks.get(self.name, 0), peak)
+
+
+def stage(name):
+    """Context manager adding the enclosed block's time to stage ``name`` of the current request."""
+    if not ENABLED and _current.get() is None:
+        return _NO_STAGE
+    return _Stage(name)
+
+
+@contextmanager
+def collect_stages(peaks=None):
+    """Time the stages run inside the ``with`` block into the yielded ``{name: seconds}``, without recording metrics.
+
+    If a dict ``peaks`` is given (and tracemalloc is tracing), the peak heap growth in bytes of each stage over
+    its starting heap is also recorded into it, keeping the largest when a stage runs more than once.
+    """
+    trace = RequestTrace(None)
+    trace.stage_peaks = peaks
+    token = _current.set(trace)
+    try:
+        yield trace.stages
+    finally:
+        _current.reset(token)
+
+
+def instrumented(handler):
+    """Record the calls, errors and stage timings of a Gradio handler (returned as-is when disabled).
+
+    Generator handlers are returned as-is too, since Gradio only streams from generator functions;
+    ``instrument_app`` still times each of their steps as a request.
+    """
+    if not ENABLED or inspect.isgeneratorfunction(handler):
+        return handler
+
+    @functools.wraps(handler)
+    def wrapper(*args, **kwargs):
+        trace = _current.get()
+        # Called outside instrument_app's request wrapper (e.g. from a script): the handler owns the trace
+        owner = trace is None
+        if owner:
+            trace = RequestTrace(handler.__name__)
+            token = _current.set(trace)
+        start = time.perf_counter()
+        try:
+            return handler(*args, **kwargs)
+        except Exception as error:
+            trace.error = type(error).__name__
+            raise
+        finally:
+            trace.handler_seconds = time.perf_counter() - start
+            if owner:
+                _current.reset(token)
+                trace.finish()
+
+    return wrapper
+
+
+def instrument_app(app):
+    """Measure queue wait, serialization and total time of every request to ``app``.
+
+    Must be called after ``app.queue()``.
+    """
+    if not ENABLED:
+        return
+
+    queue = app._queue
+    push = queue.push
+
+    def timed_push(event):
+        rank = push(event)
+        if rank is not None:
+            with _enqueued_lock:
+                _enqueued.setdefault(f'{event.session_hash}_{event.fn_index}', deque()).append(time.perf_counter())
+                while len(_enqueued) > MAX_PENDING_EVENTS:
+                    _enqueued.popitem(last=False)
+        return rank
+
+    process_api = app.process_api
+
+    async def timed_process_api(fn_index, *args, **kwargs):
+        start = time.perf_counter()
+        handler = app.fns[fn_index].fn
+        trace = RequestTrace(getattr(handler, '__name__', str(fn_index)))
+        with _enqueued_lock:
+            enqueued_at = _enqueued.get(kwargs.get('event_id'))
+            if enqueued_at:
+                trace.queue_wait = start - enqueued_at.popleft()
+                if not enqueued_at:
+                    del _enqueued[kwargs['event_id']]
+
+        token = _current.set(trace)
+        try:
+            return await process_api(fn_index, *args, **kwargs)
+        except Exception as error:
+            trace.error = trace.error or type(error).__name__
+            raise
+        finally:
+            _current.reset(token)
+            trace.request_seconds = time.perf_counter() - start
+            trace.finish()
+
+    postprocess_data = app.postprocess_data
+
+    def timed_postprocess_data(*args, **kwargs):
+        with stage('serialize'):
+            return postprocess_data(*args, **kwargs)
+
+    queue.push = timed_push
+    app.process_api = timed_process_api
+    app.postprocess_data = timed_postprocess_data
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _histogram_lines(name, histograms, label_names):
+    lines = [f'# TYPE {name} histogram']
+    for labels, histogram in sorted(histograms.items()):
+        labels = labels if isinstance(labels, tuple) else (labels,)
+        label_text = ','.join(f'{key}="{_label(value)}"' for key, value in zip(label_names, labels))
+        cumulative = 0
+        for bound, count in zip(DURATION_BUCKETS + ('+Inf',), histogram.bucket_counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_sum{{{label_text}}} {histogram.sum:.6f}')
+        lines.append(f'{name}_count{{{label_text}}} {histogram.count}')
+    return lines
+
+
+def render_metrics():
+    """All metrics in the Prometheus text exposition format."""
+    with _lock:
+        lines = ['# HELP yst_requests_total Requests handled, by handler.', '# TYPE yst_requests_total counter']
+        lines += [f'yst_requests_total{{handler="{_label(handler)}"}} {count}' for handler, count in sorted(_calls.items())]
+        lines += ['# HELP yst_request_errors_total Requests that raised an error, by handler.',
+                  '# TYPE yst_request_errors_total counter']
+        lines += [f'yst_request_errors_total{{handler="{_label(handler)}"}} {count}'
+                  for handler, count in sorted(_errors.items())]
+        lines += ['# HELP yst_request_duration_seconds Time from request start to serialized outputs.']
+        lines += _histogram_lines('yst_request_duration_seconds', _request_seconds, ['handler'])
+        lines += ['# HELP yst_handler_duration_seconds Time spent in the handler function.']
+        lines += _histogram_lines('yst_handler_duration_seconds', _handler_seconds, ['handler'])
+        lines += ['# HELP yst_stage_duration_seconds Time per request spent in each stage of a handler.']
+        lines += _histogram_lines('yst_stage_duration_seconds', _stage_seconds, ['handler', 'stage'])
+        lines += ['# HELP yst_queue_wait_seconds Time requests waited in the Gradio queue.']
+        lines += _histogram_lines('yst_queue_wait_seconds', _queue_wait_seconds, ['handler'])
+
+    stats = cache_stats()
+    for counter in ['hits', 'misses', 'evictions', 'expirations']:
+        lines += [f'# TYPE yst_cache_{counter}_total counter']
+        lines += [f'yst_cache_{counter}_total{{cache="{_label(name)}"}} {values[counter]}'
+                  for name, values in sorted(stats.items())]
+    lines += ['# TYPE yst_cache_entries gauge']
+    lines += [f'yst_cache_entries{{cache="{_label(name)}"}} {values["size"]}' for name, values in sorted(stats.items())]
+
+    lines += ['# HELP yst_startup_phase_seconds Time spent in each startup phase.', '# TYPE yst_startup_phase_seconds gauge']
+    lines += [f'yst_startup_phase_seconds{{phase="{_label(name)}"}} {seconds:.6f}'
+              for name, seconds in list(startup.timings.items())]
+    return '\n'.join(lines) + '\n'
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = render_metrics().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def configure(metrics_port=None, trace_log=None):
+    """Override the settings; must be called before the handlers are decorated."""
+    global METRICS_PORT, TRACE_LOG, ENABLED
+    if metrics_port is not None:
+        METRICS_PORT = metrics_port
+    if trace_log is not None:
+        TRACE_LOG = trace_log or None
+    ENABLED = bool(METRICS_PORT or TRACE_LOG)
+
+
+def start():
+    """Open the trace log and start the metrics endpoint, as configured."""
+    global _trace_file
+    if TRACE_LOG and _trace_file is None:
+        _trace_file = open(TRACE_LOG, 'a', buffering=1)
+    if METRICS_PORT:
+        server = ThreadingHTTPServer((METRICS_HOST, METRICS_PORT), _MetricsHandler)
+        threading.Thread(target=server.serve_forever, name='yst-metrics', daemon=True).start()
+        return server
@@ -0,0 +1,268 @@
+# irradiance.py
+#
+# Optional gridded irradiance dataset: average daily GHI per month for every
+# cell of a regular latitude/longitude grid. Sites given as "latitude,
+# longitude" or as an LGA name are resolved to their grid cell; the state GHI
+# table in pv_model remains the fallback and the default.
+#
+# A dataset is a directory of:
+#
+# - grid.json: grid origin, step and size (cell centres) plus free-form metadata
+# - monthly_ghi.npy: float32 (n_lat, n_lon, 12) kWh/m2/day, NaN where there is no data
+# - nearest.npy: int32 (n_lat, n_lon) flat index of the nearest cell with data
+# - lga.csv (optional): name, state, latitude, longitude of each LGA
+#
+# The arrays are memory-mapped on first use, so neither startup nor the
+# resident memory pays for the grid. On a regular grid the nearest cell is
+# found by arithmetic, and nearest.npy redirects cells without data (sea,
+# outside the border), so a lookup takes a few microseconds.
+#
+# Build a dataset from a CSV of cell centres (e.g. a NASA POWER regional export):
+#     python irradiance.py build cells.csv irradiance_data --lga lga.csv
+
+import argparse
+import csv
+import json
+import os
+import re
+import threading
+
+import numpy as np
+
+IRRADIANCE_DIR = os.environ.get('YST_IRRADIANCE_DIR',
+                                os.path.join(os.path.dirname(os.path.abspath(__file__)), 'irradiance_data'))
+
+MONTH_COLUMNS = ['JAN', 'FEB', 'MAR', 'APR', 'MAY', 'JUN', 'JUL', 'AUG', 'SEP', 'OCT', 'NOV', 'DEC']
+
+# "lat, lon" in decimal degrees, e.g. "13.06, 5.24"
+COORDINATES = re.compile(r'^\s*([-+]?\d+(?:\.\d*)?)\s*[,;\s]\s*([-+]?\d+(?:\.\d*)?)\s*$')
+
+
+class IrradianceGrid:
+    """A gridded monthly GHI dataset, memory-mapped from ``directory``."""
+
+    def __init__(self, directory):
+        with open(os.path.join(directory, 'grid.json')) as file:
+            self.grid = json.load(file)
+        self.lat0, self.lon0 = self.grid['lat0'], self.grid['lon0']
+        self.step_lat, self.step_lon = self.grid['step_lat'], self.grid['step_lon']
+        self.n_lat, self.n_lon = self.grid['n_lat'], self.grid['n_lon']
+
+        monthly_ghi = np.load(os.path.join(directory, 'monthly_ghi.npy'), mmap_mode='r')
+        self.monthly_ghi = monthly_ghi.reshape(self.n_lat * self.n_lon, 12)
+        self.nearest = np.load(os.path.join(directory, 'nearest.npy'), mmap_mode='r').reshape(-1)
+
+        self._lga_path = os.path.join(directory, 'lga.csv')
+        self._lgas = None
+
+    def cell_index(self, latitude, longitude):
+        """Flat index of the nearest cell with data; arrays of coordinates give an array of indices."""
+        latitude, longitude = np.asarray(latitude, dtype=float), np.asarray(longitude, dtype=float)
+        row = np.rint((latitude - self.lat0) / self.step_lat)
+        column = np.rint((longitude - self.lon0) / self.step_lon)
+        if np.any(self._outside(row, column)):
+            raise self._outside_error()
+        row = np.clip(row, 0, self.n_lat - 1).astype(np.intp)
+        column = np.clip(column, 0, self.n_lon - 1).astype(np.intp)
+        return self.nearest[row * self.n_lon + column]
+
+    def _outside(self, row, column):
+        # Points more than one cell beyond the grid are outside the dataset's coverage
+        return (row < -1) | (row > self.n_lat) | (column < -1) | (column > self.n_lon)
+
+    def _outside_error(self):
+        return ValueError(f"Location outside the irradiance dataset "
+                          f"({self.lat0:g} to {self.lat0 + (self.n_lat - 1) * self.step_lat:g} N, "
+                          f"{self.lon0:g} to {self.lon0 + (self.n_lon - 1) * self.step_lon:g} E)")
+
+    def lga_location(self, name):
+        """``(latitude, longitude)`` of an LGA, given as "Name" or "Name, State" for ambiguous names."""
+        if self._lgas is None:
+            self._lgas = load_lgas(self._lga_path) if os.path.exists(self._lga_path) else {}
+
+        name, _, state = name.partition(',')
+        matches = self._lgas.get(name.strip().lower(), [])
+        if state.strip():
+            matches = [match for match in matches if match[0].lower() == state.strip().lower()]
+        if len(matches) > 1:
+            raise ValueError(f"'{name.strip()}' is an LGA in several states "
+                             f"({', '.join(match[0] for match in matches)}); enter it as '{name.strip()}, State'")
+        if not matches:
+            raise KeyError(name)
+        return matches[0][1:]
+
+    def monthly_ghi_at(self, site):
+        """Monthly GHI (12,) of the cell nearest to a "lat, lon" or LGA ``site``."""
+        coordinates = COORDINATES.match(site)
+        if coordinates:
+            latitude, longitude = float(coordinates.group(1)), float(coordinates.group(2))
+        else:
+            latitude, longitude = self.lga_location(site)
+        # Plain float arithmetic: a single site is looked up in a few microseconds
+        row = round((latitude - self.lat0) / self.step_lat)
+        column = round((longitude - self.lon0) / self.step_lon)
+        if self._outside(row, column):
+            raise self._outside_error()
+        row, column = min(max(row, 0), self.n_lat - 1), min(max(column, 0), self.n_lon - 1)
+        return self.monthly_ghi[self.nearest[row * self.n_lon + column]].astype(float)
+
+
+def load_lgas(path):
+    """LGA name (lower case) -> list of ``(state, latitude, longitude)``."""
+    lgas = {}
+    with open(path, newline='') as file:
+        for row in csv.DictReader(file):
+            lgas.setdefault(row['name'].strip().lower(), []).append(
+                (row['state'].strip(), float(row['latitude']), float(row['longitude'])))
+    return lgas
+
+
+_grid = None
+_grid_lock = threading.Lock()
+
+
+def get_grid():
+    """The dataset in ``IRRADIANCE_DIR``, opened on first use; None if there is no dataset."""
+    global _grid
+    if _grid is None:
+        with _grid_lock:
+            if _grid is None and available():
+                _grid = IrradianceGrid(IRRADIANCE_DIR)
+    return _grid
+
+
+def available():
+    return os.path.exists(os.path.join(IRRADIANCE_DIR, 'grid.json'))
+
+
+def site_monthly_ghi(site):
+    """Monthly GHI (12,) in kWh/m2/day for a "lat, lon" or LGA ``site``.
+
+    Raises ValueError if the site cannot be resolved (including when no dataset is installed).
+    """
+    grid = get_grid()
+    if grid is None:
+        raise ValueError(f"Unknown state '{site}' (no gridded irradiance dataset is installed for other sites)")
+    try:
+        return grid.monthly_ghi_at(site)
+    except KeyError:
+        raise ValueError(f"Unknown state, LGA or 'latitude, longitude' location: '{site}'")
+
+
+def nearest_cells(has_data, latitude, longitude):
+    """Flat index of the nearest cell with data for every cell of the (n_lat, n_lon) mask ``has_data``.
+
+    Distances are on the ground (longitude scaled by cos(latitude)); ties go to the lower index. In a
+    grid row the nearest data cell is the first one left or right of the column, so the missing cells
+    of each row are searched over the rows with data, nearest latitude first, only as far as their best
+    distance: memory stays O(grid) and no dense distance matrix between missing and valid cells is built.
+    """
+    n_lat, n_lon = has_data.shape
+    columns = np.arange(n_lon)
+    left = np.maximum.accumulate(np.where(has_data, columns, -1), axis=1)
+    right = np.minimum.accumulate(np.where(has_data, columns, n_lon)[:, ::-1], axis=1)[:, ::-1]
+    scale = np.cos(np.radians(latitude))
+    nearest = np.arange(n_lat * n_lon).reshape(n_lat, n_lon)
+    data_rows = np.flatnonzero(has_data.any(axis=1))
+    if not len(data_rows):
+        raise ValueError("The grid has no cells with data")
+
+    for row in np.flatnonzero(~has_data.all(axis=1)):
+        missing = np.flatnonzero(~has_data[row])
+        best = np.full(len(missing), np.inf)
+        best_index = np.zeros(len(missing), dtype=np.intp)
+        others = data_rows[np.argsort(np.abs(data_rows - row), kind='stable')]
+        latitude_terms = (latitude[row] - latitude[others]) ** 2
+        # Candidate rows in batches that double in size, nearest latitude first; a cell leaves the
+        # search once the next row's latitude distance alone exceeds its best distance
+        active = np.arange(len(missing))
+        start, size = 0, 8
+        while start < len(others) and len(active):
+            batch = others[start:start + size]
+            cells = missing[active]
+            candidates = np.concatenate([left[batch[:, None], cells], right[batch[:, None], cells]])
+            found = (candidates >= 0) & (candidates < n_lon)
+            candidates = np.clip(candidates, 0, n_lon - 1)
+            distance = np.where(found, np.tile(latitude_terms[start:start + size], 2)[:, None]
+                                + ((longitude[cells] - longitude[candidates]) * scale[row]) ** 2, np.inf)
+            index = np.tile(batch, 2)[:, None] * n_lon + candidates
+            batch_best = distance.min(axis=0)
+            batch_index = np.where(distance == batch_best, index, n_lat * n_lon).min(axis=0)
+            better = (batch_best < best[active]) | ((batch_best == best[active]) & (batch_index < best_index[active]))
+            best[active[better]] = batch_best[better]
+            best_index[active[better]] = batch_index[better]
+            start, size = start + size, min(2 * size, 256)
+            if start < len(others):
+                active = active[best[active] >= latitude_terms[start]]
+        nearest[row, missing] = best_index
+    return nearest
+
+
+def build_dataset(cells_path, output_dir, lga_path=None, source=None):
+    """Write a dataset from a CSV of cell centres with LAT, LON and JAN..DEC (kWh/m2/day) columns."""
+    with open(cells_path, newline='') as file:
+        rows = list(csv.DictReader(file))
+    if not rows:
+        raise ValueError(f"{cells_path} has no cells")
+    header = {column.upper(): column for column in rows[0]}
+    missing = [column for column in ['LAT', 'LON'] + MONTH_COLUMNS if column not in header]
+    if missing:
+        raise ValueError(f"{cells_path} is missing columns: {', '.join(missing)}")
+
+    latitude = np.array([float(row[header['LAT']]) for row in rows])
+    longitude = np.array([float(row[header['LON']]) for row in rows])
+    values = np.array([[float(row[header[month]]) for month in MONTH_COLUMNS] for row in rows])
+
+    def axis(coordinates):
+        unique = np.unique(coordinates)
+        step = round(float(np.diff(unique).min()), 9) if len(unique) > 1 else 1.0
+        index = np.rint((coordinates - unique[0]) / step).astype(np.intp)
+        if not np.allclose(unique[0] + index * step, coordinates, atol=step * 1e-3):
+            raise ValueError("Cells must lie on a regular latitude/longitude grid")
+        return float(unique[0]), float(step), int(index.max()) + 1, index
+
+    lat0, step_lat, n_lat, rows_index = axis(latitude)
+    lon0, step_lon, n_lon, columns_index = axis(longitude)
+
+    monthly_ghi = np.full((n_lat, n_lon, 12), np.nan, dtype=np.float32)
+    monthly_ghi[rows_index, columns_index] = values
+
+    has_data = ~np.isnan(monthly_ghi[..., 0])
+    nearest = nearest_cells(has_data, lat0 + np.arange(n_lat) * step_lat, lon0 + np.arange(n_lon) * step_lon)
+
+    os.makedirs(output_dir, exist_ok=True)
+    np.save(os.path.join(output_dir, 'monthly_ghi.npy'), monthly_ghi)
+    np.save(os.path.join(output_dir, 'nearest.npy'), nearest.astype(np.int32))
+    with open(os.path.join(output_dir, 'grid.json'), 'w') as file:
+        json.dump({'lat0': lat0, 'lon0': lon0, 'step_lat': step_lat, 'step_lon': step_lon,
+                   'n_lat': n_lat, 'n_lon': n_lon, 'units': 'kWh/m2/day', 'source': source or os.path.basename(cells_path)},
+                  file, indent=2)
+
+    if lga_path:
+        with open(lga_path, newline='') as file:
+            lgas = [(row['name'].strip(), row['state'].strip(), float(row['latitude']), float(row['longitude']))
+                    for row in csv.DictReader(file)]
+        with open(os.path.join(output_dir, 'lga.csv'), 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(['name', 'state', 'latitude', 'longitude'])
+            writer.writerows(lgas)
+
+    return n_lat, n_lon, int(has_data.sum())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build a gridded irradiance dataset for the YST app.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build = subparsers.add_parser('build', help="Build a dataset from a CSV of grid cells.")
+    build.add_argument('cells', help="CSV with LAT, LON and JAN..DEC monthly average GHI (kWh/m2/day).")
+    build.add_argument('output_dir', nargs='?', default=IRRADIANCE_DIR)
+    build.add_argument('--lga', help="CSV with name, state, latitude, longitude of each LGA.")
+    build.add_argument('--source', help="Description of the data source, stored in grid.json.")
+    args = parser.parse_args(argv)
+
+    n_lat, n_lon, with_data = build_dataset(args.cells, args.output_dir, args.lga, args.source)
+    print(f"Wrote {n_lat} x {n_lon} grid ({with_data} cells with data) to {args.output_dir}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+# monte_carlo.py
+#
+# Monte Carlo uncertainty analysis for the life-cycle cost model. Inflation is
+# sampled independently for every simulated year, while the grid tariff and the
+# commissioning/maintenance costs are sampled once per trajectory. All
+# trajectories are simulated together as (n_years, n_samples) arrays, so the
+# per-year percentile reductions run over contiguous rows.
+
+import numpy as np
+
+PERCENTILES = (10, 50, 90)
+
+
+def sample_triangular(rng, low, mode, high, size):
+    """Triangular samples that also accept a degenerate (low == high) distribution."""
+    low, high = min(low, high), max(low, high)
+    mode = min(max(mode, low), high)
+    if low == high:
+        return np.full(size, float(low))
+    return rng.triangular(low, mode, high, size)
+
+
+def simulate_cost_trajectories(daily_target_energy, num_years, warranty_years,
+                               grid_rate, inflation_rate, commission_cost, usage_cost):
+    """Annual PV and grid cost for every sampled trajectory.
+
+    ``grid_rate``, ``commission_cost`` and ``usage_cost`` have shape (n_samples,) and
+    ``inflation_rate`` (in percent) has shape (num_years, n_samples). Returns
+    ``(pv_cost, grid_cost)`` arrays of shape (num_years, n_samples).
+    """
+    num_years = int(num_years)
+    n_samples = len(grid_rate)
+    years = np.arange(num_years)
+
+    # Price level relative to year 1: year i carries the inflation of the i years before it
+    price_level = np.empty((num_years, n_samples))
+    price_level[0] = 1
+    price_level[1:] = 1 + inflation_rate[:num_years - 1] / 100
+    np.cumprod(price_level, axis=0, out=price_level)
+
+    grid_cost = (daily_target_energy * 365 * grid_rate) * price_level
+
+    # PV cost, free while under warranty
+    pv_cost = usage_cost * price_level
+    if warranty_years > 0:
+        pv_cost[years < warranty_years] = 0
+    pv_cost[0] += commission_cost
+
+    return pv_cost, grid_cost
+
+
+def summarize_trajectories(pv_cost, grid_cost, percentiles=PERCENTILES):
+    """Percentile bands and break-even probability for a set of trajectories.
+
+    Returns a dict with ``(len(percentiles), num_years)`` bands for ``annual_pv``, ``annual_grid``,
+    ``cumulative_pv`` and ``cumulative_grid``, plus ``break_even_probability``: the fraction of
+    trajectories whose cumulative PV cost has fallen to or below the grid's by each year.
+    """
+    cumulative_pv = np.cumsum(pv_cost, axis=0)
+    cumulative_grid = np.cumsum(grid_cost, axis=0)
+
+    broken_even = np.logical_or.accumulate(cumulative_pv <= cumulative_grid, axis=0)
+
+    return {
+        'percentiles': percentiles,
+        'annual_pv': np.percentile(pv_cost, percentiles, axis=1),
+        'annual_grid': np.percentile(grid_cost, percentiles, axis=1),
+        'cumulative_pv': np.percentile(cumulative_pv, percentiles, axis=1),
+        'cumulative_grid': np.percentile(cumulative_grid, percentiles, axis=1),
+        'break_even_probability': broken_even.mean(axis=1),
+    }
+
+
+def run_monte_carlo(daily_target_energy, num_years, warranty_years, commission_cost, usage_cost,
+                    inflation_low, inflation_mode, inflation_high,
+                    grid_rate_low, grid_rate_mode, grid_rate_high,
+                    component_cost_spread, maintenance_cost_spread,
+                    num_samples=10000, seed=None):
+    """Sample ``num_samples`` cost trajectories and reduce them to percentile bands.
+
+    Inflation (%/year) and grid rate (₦/kWh) follow triangular distributions given by their
+    low/mode/high values. Commissioning and maintenance costs vary uniformly by up to
+    ``component_cost_spread`` and ``maintenance_cost_spread`` percent around their nominal values.
+    The same ``seed`` always reproduces the same result.
+    """
+    rng = np.random.default_rng(seed)
+    num_samples = int(num_samples)
+    num_years = int(num_years)
+
+    inflation_rate = sample_triangular(rng, inflation_low, inflation_mode, inflation_high, (num_years, num_samples))
+    grid_rate = sample_triangular(rng, grid_rate_low, grid_rate_mode, grid_rate_high, num_samples)
+    commission_cost = commission_cost * (1 + rng.uniform(-1, 1, num_samples) * component_cost_spread / 100)
+    usage_cost = usage_cost * (1 + rng.uniform(-1, 1, num_samples) * maintenance_cost_spread / 100)
+
+    pv_cost, grid_cost = simulate_cost_trajectories(daily_target_energy, num_years, warranty_years,
+                                                    grid_rate, inflation_rate, commission_cost, usage_cost)
+    return summarize_trajectories(pv_cost, grid_cost)
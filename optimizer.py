@@ -0,0 +1,141 @@
+# optimizer.py
+#
+# Least-cost system search. Every combination of panel model, battery model and
+# autonomy days in a catalog is sized and costed in one vectorized pass through
+# pv_model/cost_model, then pruned to the Pareto front of lifetime cost vs
+# autonomy and life-cycle emissions of the generated energy.
+
+import numpy as np
+
+from pv_model import size_pv_system_batch, SOLAR_CARBON_FACTOR
+from cost_model import commissioning_costs_batch, maintenance_cost_batch, life_cycle_metrics_batch
+
+
+def pareto_front(cost, autonomy, emissions):
+    """Indices of the configurations not dominated on (min cost, max autonomy, min emissions).
+
+    Each autonomy level is first reduced to its 2-D (cost, emissions) front with a sort and a running
+    minimum, which discards almost every candidate; the few survivors are then checked pairwise.
+    Every objective must be finite: an infinite or NaN cost would sort (or compare) as the best.
+    """
+    cost = np.asarray(cost, dtype=float)
+    autonomy = np.asarray(autonomy, dtype=float)
+    emissions = np.asarray(emissions, dtype=float)
+    if not (np.isfinite(cost).all() and np.isfinite(autonomy).all() and np.isfinite(emissions).all()):
+        raise ValueError("pareto_front needs finite objectives")
+    if len(cost) == 0:
+        return np.array([], dtype=np.intp)
+
+    candidates = []
+    for level in np.unique(autonomy):
+        index = np.flatnonzero(autonomy == level)
+        order = index[np.lexsort((emissions[index], cost[index]))]
+        # Strictly lower emissions than every cheaper configuration at this level
+        best_so_far = np.minimum.accumulate(emissions[order])
+        keep = np.ones(len(order), dtype=bool)
+        keep[1:] = emissions[order][1:] < best_so_far[:-1]
+        candidates.append(order[keep])
+    candidates = np.concatenate(candidates)
+
+    c, a, e = cost[candidates], autonomy[candidates], emissions[candidates]
+    no_worse = (c[:, np.newaxis] <= c) & (a[:, np.newaxis] >= a) & (e[:, np.newaxis] <= e)
+    better = (c[:, np.newaxis] < c) | (a[:, np.newaxis] > a) | (e[:, np.newaxis] < e)
+    dominated = (no_worse & better).any(axis=0)
+
+    front = candidates[~dominated]
+    return front[np.argsort(cost[front], kind='stable')]
+
+
+def invalid_catalog_rows(panel_catalog, battery_catalog):
+    """0-based indices of the panel and battery catalog rows with a value that is out of range or not finite."""
+    def invalid(catalog, positive):
+        values = {name: np.asarray(column, dtype=float) for name, column in catalog.items()}
+        bad = np.zeros(len(values['unit_cost']), dtype=bool)
+        for name, column in values.items():
+            bad |= ~np.isfinite(column) | ((column <= 0) if name in positive else (column < 0))
+        return np.flatnonzero(bad)
+
+    return (invalid(panel_catalog, ('length', 'width', 'efficiency')),
+            invalid(battery_catalog, ('capacity', 'voltage')))
+
+
+def optimize_system(state, daily_target_energy, inverter_efficiency, depth_of_discharge, battery_efficiency,
+                    panel_catalog, battery_catalog, autonomy_options,
+                    controller_cost, inverter_cost, misc_procurement_cost,
+                    solar_panel_install_cost, controller_install_cost, inverter_install_cost, battery_install_cost, misc_install_cost,
+                    maintenance_visits_per_year, warranty_years, grid_rate, inflation_rate, num_years, discount_rate,
+                    maintenance_cost_per_panel, maintenance_cost_controller, maintenance_cost_inverter,
+                    maintenance_cost_per_battery, maintenance_misc_cost):
+    """Evaluate every catalog combination for one site and return it with its Pareto front.
+
+    ``panel_catalog`` is a dict of equally long arrays ``length``, ``width``, ``efficiency`` (%) and
+    ``unit_cost``; ``battery_catalog`` holds ``capacity`` (Ah), ``voltage`` (V) and ``unit_cost``.
+    Lifetime cost is the NPV of the PV cost stream at ``discount_rate`` over ``num_years``.
+
+    Returns a dict of per-configuration arrays (``panel``/``battery`` catalog indices, ``autonomy_days``,
+    ``min_panels``, ``number_of_batteries``, ``commission_cost``, ``lifetime_cost``, ``lcoe``,
+    ``emissions``) plus ``pareto``, the indices of the non-dominated configurations sorted by cost.
+
+    Raises ValueError if a catalog entry or autonomy option is out of range (see ``invalid_catalog_rows``);
+    configurations that still cannot be sized (e.g. a 0% depth of discharge) never reach the front.
+    """
+    panel_rows, battery_rows = invalid_catalog_rows(panel_catalog, battery_catalog)
+    if len(panel_rows) or len(battery_rows):
+        raise ValueError(f"Invalid catalog entries (panel rows {list(panel_rows + 1)}, battery rows "
+                         f"{list(battery_rows + 1)}): sizes, efficiencies, capacities and voltages must be "
+                         f"positive and costs non-negative.")
+    autonomy_options = np.asarray(autonomy_options, dtype=float)
+    if not (np.isfinite(autonomy_options) & (autonomy_options >= 0)).all():
+        raise ValueError("Autonomy days must be non-negative numbers.")
+    panel_count = len(panel_catalog['length'])
+    battery_count = len(battery_catalog['capacity'])
+
+    # Cartesian product of the catalog, flattened to one row per configuration
+    panel, battery, autonomy = (grid.ravel() for grid in np.meshgrid(
+        np.arange(panel_count), np.arange(battery_count), np.arange(len(autonomy_options)), indexing='ij'))
+    autonomy_days = autonomy_options[autonomy]
+    panel_unit_cost = np.asarray(panel_catalog['unit_cost'], dtype=float)[panel]
+    battery_unit_cost = np.asarray(battery_catalog['unit_cost'], dtype=float)[battery]
+
+    sizing = size_pv_system_batch(
+        np.asarray(panel_catalog['length'], dtype=float)[panel], np.asarray(panel_catalog['width'], dtype=float)[panel],
+        np.asarray(panel_catalog['efficiency'], dtype=float)[panel], inverter_efficiency, state,
+        daily_target_energy, autonomy_days, np.asarray(battery_catalog['voltage'], dtype=float)[battery],
+        depth_of_discharge, battery_efficiency, np.asarray(battery_catalog['capacity'], dtype=float)[battery])
+    min_panels = sizing['min_panels']
+    number_of_batteries = sizing['number_of_batteries']
+
+    _, _, commission_cost = commissioning_costs_batch(
+        min_panels, number_of_batteries,
+        panel_unit_cost, controller_cost, inverter_cost, battery_unit_cost, misc_procurement_cost,
+        solar_panel_install_cost, controller_install_cost, inverter_install_cost, battery_install_cost, misc_install_cost)
+    usage_cost = maintenance_cost_batch(
+        min_panels, number_of_batteries,
+        maintenance_cost_per_panel, maintenance_cost_controller, maintenance_cost_inverter,
+        maintenance_cost_per_battery, maintenance_misc_cost) * maintenance_visits_per_year
+
+    metrics = life_cycle_metrics_batch(daily_target_energy, grid_rate, inflation_rate, num_years,
+                                       usage_cost, warranty_years, commission_cost, discount_rate)
+
+    # Oversized arrays generate (and carry the life-cycle footprint of) more energy than the target
+    emissions = sizing['monthly_generation'].sum(axis=1) * num_years * SOLAR_CARBON_FACTOR / 1000
+
+    lifetime_cost = metrics['npv_pv_cost']
+    feasible = np.flatnonzero(np.isfinite(lifetime_cost) & np.isfinite(emissions)
+                              & np.isfinite(min_panels) & np.isfinite(number_of_batteries))
+    if len(feasible) == 0:
+        raise ValueError("No catalog combination can be sized with these inputs: check the efficiencies "
+                         "and the depth of discharge.")
+
+    return {
+        'panel': panel,
+        'battery': battery,
+        'autonomy_days': autonomy_days,
+        'min_panels': min_panels,
+        'number_of_batteries': number_of_batteries,
+        'commission_cost': commission_cost,
+        'lifetime_cost': lifetime_cost,
+        'lcoe': metrics['lcoe_pv'],
+        'emissions': emissions,
+        'pareto': feasible[pareto_front(lifetime_cost[feasible], autonomy_days[feasible], emissions[feasible])],
+    }
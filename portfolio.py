@@ -0,0 +1,163 @@
+# portfolio.py
+#
+# Portfolio analysis: sizes and costs every site of an uploaded site list with
+# the design and cost inputs of the app. Each site brings its own location
+# (state, LGA or coordinates), daily load and budget.
+#
+# The list is read and computed in chunks, so memory does not grow with its
+# length. The first chunk is small and computed in the calling thread, which
+# gets the first rows to the user at once. Later chunks go through the shared
+# process pool, with a bounded number in flight.
+
+import os
+
+import numpy as np
+import pandas as pd
+
+import workers
+from cost_model import simulate_costs_batch
+from pv_model import site_errors, size_pv_system_batch, calculate_emissions_batch
+from stage_graph import model_graph
+
+FIRST_CHUNK = 200
+CHUNKSIZE = int(os.environ.get('YST_PORTFOLIO_CHUNKSIZE', 5000))
+
+# Accepted (lower case) headers of each site list column
+SITE_COLUMNS = {
+    'site': ['site', 'name', 'site name'],
+    'state': ['state', 'location', 'site location'],
+    'latitude': ['latitude', 'lat'],
+    'longitude': ['longitude', 'lon', 'lng'],
+    'daily_target_energy': ['daily target energy (kwh)', 'daily_target_energy', 'load', 'load (kwh/day)'],
+    'budget': ['budget', 'budget (naira)', 'budget (₦)'],
+}
+
+RESULT_COLUMNS = ['Site', 'Location', 'Daily Target Energy (kWh)', 'Budget (₦)', 'Panels', 'Batteries',
+                  'Capex (₦)', 'Within Budget', 'Payback Year', 'PV LCOE (₦/kWh)',
+                  'Grid Emissions (kgCO2)', 'PV Emissions (kgCO2)', 'Note']
+
+# Running totals over the computed sites, in display order
+TOTALS = ['Sites', 'Sites Computed', 'Sites Within Budget', 'Panels', 'Batteries', 'Capex (₦)',
+          'Grid Emissions (kgCO2)', 'PV Emissions (kgCO2)', 'Emissions Avoided (kgCO2)']
+
+
+def count_sites(path):
+    """Number of data lines in a site list, counted without parsing it, for progress reports.
+
+    An estimate: a quoted field that spans several lines, or a blank line, counts as an extra site.
+    """
+    lines = 0
+    last = b'\n'
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            lines += block.count(b'\n')
+            last = block[-1:]
+    return max(lines + (last != b'\n') - 1, 0)  # without the header, with an unterminated last line
+
+
+def normalize_sites(chunk):
+    """Site list rows as ``site``, ``state``, ``daily_target_energy`` and ``budget`` columns."""
+    headers = {str(column).strip().lower(): column for column in chunk.columns}
+    columns = {}
+    for name, aliases in SITE_COLUMNS.items():
+        column = next((headers[alias] for alias in aliases if alias in headers), None)
+        if column is not None:
+            columns[name] = chunk[column]
+    if 'state' not in columns and not ('latitude' in columns and 'longitude' in columns):
+        raise ValueError("The site list needs a State column or Latitude and Longitude columns")
+
+    sites = pd.DataFrame(index=chunk.index)
+    sites['site'] = columns['site'].astype(str) if 'site' in columns else [f"Site {i + 1}" for i in chunk.index]
+    state = columns['state'].fillna('').astype(str).str.strip() if 'state' in columns else pd.Series('', index=chunk.index)
+    if 'latitude' in columns and 'longitude' in columns:
+        # Sites without a state are located by their coordinates
+        coordinates = (pd.to_numeric(columns['latitude'], errors='coerce').map('{:g}'.format) + ', '
+                       + pd.to_numeric(columns['longitude'], errors='coerce').map('{:g}'.format))
+        state = state.where(state != '', coordinates.where(~coordinates.str.contains('nan'), ''))
+    sites['state'] = state
+    for name in ('daily_target_energy', 'budget'):
+        sites[name] = pd.to_numeric(columns[name], errors='coerce') if name in columns else np.nan
+    return sites
+
+
+def read_sites(path, first_chunk=FIRST_CHUNK, chunksize=CHUNKSIZE):
+    """Yield the normalized site list in chunks: ``first_chunk`` rows, then ``chunksize`` rows at a time."""
+    with pd.read_csv(path, chunksize=chunksize, skipinitialspace=True) as reader:
+        size = first_chunk
+        while True:
+            try:
+                chunk = reader.get_chunk(size)
+            except StopIteration:
+                return
+            size = chunksize
+            yield normalize_sites(chunk)
+
+
+def evaluate_sites(sites, design):
+    """Size, cost and carbon results of a chunk of normalized sites, as a DataFrame of ``RESULT_COLUMNS``.
+
+    ``design`` holds the app's inputs by name; a site without a load uses ``design['daily_target_energy']``.
+    Sites that cannot be located, have a negative or infinite load, or cannot be sized get NaN outputs and a
+    note instead of failing the chunk.
+    """
+    n_sites = len(sites)
+    states = sites['state'].to_numpy(dtype=object)
+    load = sites['daily_target_energy'].fillna(design['daily_target_energy']).to_numpy(dtype=float)
+    budget = sites['budget'].to_numpy(dtype=float)
+
+    notes = site_errors(states)
+    with np.errstate(invalid='ignore'):
+        bad_load = ~(np.isfinite(load) & (load >= 0))
+    notes[bad_load & (notes == '')] = f"{RESULT_COLUMNS[2]} must be a number of at least 0"
+    valid = notes == ''
+
+    outputs = {name: np.full(n_sites, np.nan) for name in
+               ('min_panels', 'number_of_batteries', 'commission_cost', 'payback_year', 'lcoe_pv')}
+    if valid.any():
+        per_site = {'state': states[valid], 'daily_target_energy': load[valid]}
+
+        def arguments(stage):
+            return [per_site[name] if name in per_site else design[name] for name in model_graph.stages[stage].inputs]
+
+        sizing = size_pv_system_batch(*arguments('potential'), *arguments('sizing'))
+        costs = simulate_costs_batch(sizing['min_panels'], sizing['number_of_batteries'], *arguments('cost'))
+        outputs['min_panels'][valid] = sizing['min_panels']
+        outputs['number_of_batteries'][valid] = sizing['number_of_batteries']
+        for name in ('commission_cost', 'payback_year', 'lcoe_pv'):
+            outputs[name][valid] = np.broadcast_to(costs[name], (int(valid.sum()),))
+        unsizable = valid & (np.isnan(outputs['min_panels']) | np.isnan(outputs['number_of_batteries']))
+        notes[unsizable] = ("Cannot be sized: efficiencies, depth of discharge, battery voltage and capacity "
+                            "must be positive")
+
+    total_grid_emission, total_solar_emission = calculate_emissions_batch(load, design['num_years_emission'])
+    total_grid_emission = np.where(valid, total_grid_emission, np.nan)
+    total_solar_emission = np.where(valid, total_solar_emission, np.nan)
+
+    capex = outputs['commission_cost']
+    within_budget = np.where(np.isnan(budget) | np.isnan(capex), '', np.where(capex <= budget, 'Yes', 'No'))
+
+    return pd.DataFrame(dict(zip(RESULT_COLUMNS, [
+        sites['site'].to_numpy(), states, load, budget,
+        outputs['min_panels'], outputs['number_of_batteries'], capex.round(2), within_budget,
+        outputs['payback_year'], outputs['lcoe_pv'].round(2),
+        total_grid_emission.round(2), total_solar_emission.round(2), notes])), index=sites.index)
+
+
+def chunk_totals(results):
+    """``TOTALS`` of a chunk of results; add them up over the chunks for the running totals."""
+    grid_emissions = results['Grid Emissions (kgCO2)'].sum()
+    pv_emissions = results['PV Emissions (kgCO2)'].sum()
+    return dict(zip(TOTALS, [
+        len(results), int(results['Panels'].notna().sum()), int((results['Within Budget'] == 'Yes').sum()),
+        results['Panels'].sum(), results['Batteries'].sum(), results['Capex (₦)'].sum(),
+        grid_emissions, pv_emissions, grid_emissions - pv_emissions]))
+
+
+def stream_portfolio(path, design, first_chunk=FIRST_CHUNK, chunksize=CHUNKSIZE):
+    """Yield the results of the site list at ``path`` chunk by chunk, in order."""
+    chunks = read_sites(path, first_chunk, chunksize)
+    first = next(chunks, None)
+    if first is None:
+        return
+    yield evaluate_sites(first, design)
+    yield from workers.imap_heavy(evaluate_sites, chunks, design)
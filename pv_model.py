@@ -0,0 +1,253 @@
+# pv_model.py
+#
+# PV sizing model shared by the Gradio app and the batch tools. Everything is
+# computed column-wise with NumPy so a whole portfolio of sites can be sized in
+# one call; the single-site helpers are thin wrappers around the batch engine,
+# memoized per stage by result_cache.
+
+import numpy as np
+
+import irradiance
+from result_cache import cached_stage
+
+# GHI values of Nigeria States
+ghi = {
+    'Abia': 4.71, 'Adamawa': 5.70, 'Akwa Ibom': 4.21, 'Anambra': 4.81, 'Bauchi': 5.77, 'Bayelsa': 4.88,
+    'Benue': 5.19, 'Borno': 5.90, 'Cross River': 4.74, 'Delta': 4.53, 'Ebonyi': 5.05, 'Edo': 4.66,
+    'Ekiti': 4.94, 'Enugu': 4.92, 'FCT': 5.45, 'Gombe': 5.77, 'Imo': 4.71, 'Jigawa': 6.16, 'Kaduna': 5.64,
+    'Kano': 5.87, 'Katsina': 5.94, 'Kebbi': 5.62, 'Kogi': 5.40, 'Kwara': 5.16, 'Lagos': 4.74, 'Nassarawa': 5.36,
+    'Niger': 5.51, 'Ogun': 4.74, 'Ondo': 4.66, 'Osun': 4.89, 'Oyo': 5.11, 'Plateau': 5.52, 'Rivers': 4.13,
+    'Sokoto': 6.24, 'Taraba': 5.53, 'Yobe': 6.11, 'Zamfara': 6.01
+}
+
+# Monthly variation factors
+monthly_variation_factors = {
+    'January': 0.95, 'February': 0.92, 'March': 0.97, 'April': 1.05,
+    'May': 1.12, 'June': 1.18, 'July': 1.20, 'August': 1.15,
+    'September': 1.08, 'October': 1.03, 'November': 0.98, 'December': 0.92
+}
+
+months = ['January', 'February', 'March', 'April', 'May', 'June',
+          'July', 'August', 'September', 'October', 'November', 'December']
+
+# Month-ordered factors so a site's monthly profile is a single broadcast
+MONTHLY_FACTORS = np.array([monthly_variation_factors[month] for month in months])
+# Days per month of the (non-leap) reference year used for generation totals
+DAYS_IN_MONTH = np.array([31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+
+
+def site_irradiance(site):
+    """Resolve sites to ``(scale, monthly_profile)`` with monthly GHI = ``scale * monthly_profile``.
+
+    A state name gives its GHI and ``MONTHLY_FACTORS``; any other site ("lat, lon" or an LGA) is
+    looked up in the gridded dataset of the irradiance module and gives 1 and the cell's monthly GHI.
+    The profile is (12,) when every site is a state, (n_sites, 12) otherwise.
+    """
+    site = np.asarray(site)
+    if site.ndim == 0:
+        name = site.item()
+        if name in ghi:
+            return np.asarray(ghi[name], dtype=float), MONTHLY_FACTORS
+        return np.asarray(1.0), irradiance.site_monthly_ghi(name)
+
+    # Resolve each distinct site once rather than once per row
+    unique_sites, inverse = np.unique(site, return_inverse=True)
+    inverse = inverse.reshape(site.shape)
+    scale = np.array([ghi.get(s, 1.0) for s in unique_sites], dtype=float)
+    if all(s in ghi for s in unique_sites):
+        return scale[inverse], MONTHLY_FACTORS
+    profile = np.array([MONTHLY_FACTORS if s in ghi else irradiance.site_monthly_ghi(s) for s in unique_sites])
+    return scale[inverse], profile[inverse]
+
+
+def site_errors(sites):
+    """Why each of ``sites`` cannot be resolved by ``site_irradiance``; '' for the sites that can.
+
+    Blank sites (empty or not a string, e.g. NaN from an empty CSV cell) and names that are neither a
+    state nor found in the gridded irradiance dataset get a message instead of failing the batch.
+    """
+    sites = np.asarray(sites, dtype=object)
+    errors = np.full(len(sites), '', dtype=object)
+    unknown = np.flatnonzero([site not in ghi for site in sites.tolist()])
+    messages = {}
+    for i in unknown:
+        site = sites[i] if isinstance(sites[i], str) else ''
+        if site not in messages:
+            if not site.strip():
+                messages[site] = "No state or coordinates"
+            else:
+                try:
+                    irradiance.site_monthly_ghi(site)
+                    messages[site] = ''
+                except ValueError as error:
+                    messages[site] = str(error)
+        errors[i] = messages[site]
+    return errors
+
+
+def calculate_monthly_pv_potential_batch(panel_length, panel_width, panel_efficiency, inverter_efficiency, state):
+    """Daily PV potential of a single panel per month, shape (n_sites, 12) in kWh/day.
+
+    All arguments may be scalars or equally sized 1-D arrays; efficiencies are in percent. ``state``
+    may also be an LGA or "lat, lon" site when a gridded irradiance dataset is installed.
+    """
+    ghi_value, monthly_profile = site_irradiance(state)
+    panel_area = np.asarray(panel_length, dtype=float) * np.asarray(panel_width, dtype=float)
+    panel_efficiency = np.asarray(panel_efficiency, dtype=float) / 100
+    inverter_efficiency = np.asarray(inverter_efficiency, dtype=float) / 100
+
+    # Same evaluation order as the original per-month expression so results match bit for bit
+    site_factor = np.atleast_1d(ghi_value * panel_area * panel_efficiency * inverter_efficiency)
+    return site_factor[:, np.newaxis] * monthly_profile
+
+
+def size_pv_system_batch(panel_length, panel_width, panel_efficiency, inverter_efficiency, state,
+                         daily_target_energy, autonomy_days, battery_voltage, depth_of_discharge,
+                         battery_efficiency, battery_capacity):
+    """Size panels and batteries for many sites in one vectorized pass.
+
+    Every argument may be a scalar or a 1-D array of length n_sites (scalars are broadcast).
+    Percentages are given in percent, as in the UI. Returns a dict of arrays:
+
+    - ``monthly_pv_potential``: (n_sites, 12) single-panel daily potential (kWh/day)
+    - ``min_panels``: (n_sites,) panels needed to cover the worst month
+    - ``total_battery_capacity``: (n_sites,) required bank capacity (Ah)
+    - ``number_of_batteries``: (n_sites,) batteries of ``battery_capacity`` Ah
+    - ``monthly_generation``: (n_sites, 12) energy generated by the designed system per month (kWh)
+    """
+    monthly_pv_potential = calculate_monthly_pv_potential_batch(
+        panel_length, panel_width, panel_efficiency, inverter_efficiency, state)
+
+    return size_from_potential_batch(monthly_pv_potential, daily_target_energy, autonomy_days, battery_voltage,
+                                     depth_of_discharge, battery_efficiency, battery_capacity)
+
+
+def size_from_potential_batch(monthly_pv_potential, daily_target_energy, autonomy_days, battery_voltage,
+                              depth_of_discharge, battery_efficiency, battery_capacity):
+    """Sizing step of ``size_pv_system_batch`` for an already computed monthly potential.
+
+    ``monthly_pv_potential`` is (n_sites, 12) or a single site's 12 values; the other arguments are
+    broadcast against it. Returns the same dict as ``size_pv_system_batch``.
+
+    Sites that cannot be sized (a monthly potential, battery voltage, capacity, depth of discharge or
+    efficiency that is not positive, or inputs that are not finite) get NaN panels, generation or battery
+    counts; the counts are int64 only when every site could be sized.
+    """
+    monthly_pv_potential = np.atleast_2d(np.asarray(monthly_pv_potential, dtype=float))
+    n_sites = np.broadcast(monthly_pv_potential[:, 0], *[np.asarray(arg) for arg in (
+        daily_target_energy, autonomy_days, battery_voltage, depth_of_discharge,
+        battery_efficiency, battery_capacity)]).size
+    monthly_pv_potential = np.broadcast_to(monthly_pv_potential, (n_sites, 12))
+
+    daily_target_energy = np.asarray(daily_target_energy, dtype=float)
+    min_pv_potential = monthly_pv_potential.min(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        min_panels = np.broadcast_to(np.ceil(daily_target_energy / min_pv_potential), (n_sites,))
+    panels_valid = (min_pv_potential > 0) & np.isfinite(min_pv_potential) & np.isfinite(min_panels)
+
+    battery_voltage = np.asarray(battery_voltage, dtype=float)
+    battery_capacity = np.asarray(battery_capacity, dtype=float)
+    depth_of_discharge = np.asarray(depth_of_discharge, dtype=float) / 100
+    battery_efficiency = np.asarray(battery_efficiency, dtype=float) / 100
+    with np.errstate(divide='ignore', invalid='ignore'):
+        total_battery_capacity = (((daily_target_energy * np.asarray(autonomy_days, dtype=float) * 1000)
+                                   / battery_voltage)
+                                  * (1 / battery_efficiency) * (1 / depth_of_discharge))
+        total_battery_capacity = np.broadcast_to(np.ceil(total_battery_capacity), (n_sites,))
+        number_of_batteries = np.broadcast_to(np.ceil(total_battery_capacity / battery_capacity), (n_sites,))
+    batteries_valid = ((battery_voltage > 0) & (battery_capacity > 0) & (depth_of_discharge > 0)
+                       & (battery_efficiency > 0) & np.isfinite(total_battery_capacity) & np.isfinite(number_of_batteries)
+                       # An infinite voltage, capacity or percentage would size the bank to 0 batteries
+                       & np.isfinite(battery_voltage * battery_capacity * depth_of_discharge * battery_efficiency))
+
+    with np.errstate(invalid='ignore'):
+        monthly_generation = min_panels[:, np.newaxis] * monthly_pv_potential * DAYS_IN_MONTH
+
+    return {
+        'monthly_pv_potential': monthly_pv_potential,
+        'min_panels': _counts(min_panels, panels_valid),
+        'total_battery_capacity': _counts(total_battery_capacity, batteries_valid),
+        'number_of_batteries': _counts(number_of_batteries, batteries_valid),
+        'monthly_generation': np.where(panels_valid[:, np.newaxis], monthly_generation, np.nan),
+    }
+
+
+def _counts(values, valid):
+    # Whole counts as int64, or as floats with NaN where a site could not be sized (int64 has no NaN)
+    valid = np.broadcast_to(valid, values.shape)
+    if valid.all():
+        return values.astype(np.int64)
+    return np.where(valid, values, np.nan)
+
+
+@cached_stage('potential')
+def calculate_monthly_pv_potential(panel_length, panel_width, panel_efficiency, inverter_efficiency, state):
+    monthly_pv_potential = calculate_monthly_pv_potential_batch(
+        panel_length, panel_width, panel_efficiency, inverter_efficiency, state)
+
+    return monthly_pv_potential[0].tolist(), list(months)
+
+
+def size_pv_system(panel_length, panel_width, panel_efficiency, inverter_efficiency, state,
+                   daily_target_energy, autonomy_days, battery_voltage, depth_of_discharge,
+                   battery_efficiency, battery_capacity):
+    """Single-site sizing used by the UI handlers.
+
+    Returns ``(min_panels, total_battery_capacity, number_of_batteries, monthly_pv_potential, monthly_generation)``.
+    The potential and sizing stages are cached separately, so a battery-only change reuses the potential.
+    """
+    monthly_pv_potential, _ = calculate_monthly_pv_potential(
+        panel_length, panel_width, panel_efficiency, inverter_efficiency, state)
+
+    return size_from_potential(monthly_pv_potential, daily_target_energy, autonomy_days, battery_voltage,
+                               depth_of_discharge, battery_efficiency, battery_capacity)
+
+
+@cached_stage('sizing')
+def size_from_potential(monthly_pv_potential, daily_target_energy, autonomy_days, battery_voltage,
+                        depth_of_discharge, battery_efficiency, battery_capacity):
+    """Single-site sizing from a monthly potential list; same return value as ``size_pv_system``.
+
+    Raises ValueError if the site cannot be sized.
+    """
+    sizing = size_from_potential_batch(monthly_pv_potential, daily_target_energy, autonomy_days, battery_voltage,
+                                       depth_of_discharge, battery_efficiency, battery_capacity)
+    if np.isnan(sizing['min_panels'][0]):
+        raise ValueError("The panels cannot be sized: the panel dimensions, panel and inverter efficiencies "
+                         "must be positive and the daily target energy a number.")
+    if np.isnan(sizing['number_of_batteries'][0]):
+        raise ValueError("The batteries cannot be sized: the battery voltage, capacity, depth of discharge "
+                         "and efficiency must be positive.")
+
+    return (int(sizing['min_panels'][0]),
+            int(sizing['total_battery_capacity'][0]),
+            int(sizing['number_of_batteries'][0]),
+            sizing['monthly_pv_potential'][0].tolist(),
+            sizing['monthly_generation'][0].tolist())
+
+
+# Carbon factors (gCO2/kWh)
+GRID_CARBON_FACTOR = 402
+SOLAR_CARBON_FACTOR = 41
+
+
+def calculate_emissions_batch(daily_target_energy, num_years):
+    """Total grid and PV emissions (kgCO2) over ``num_years`` for each scenario."""
+    daily_target_energy = np.asarray(daily_target_energy, dtype=float)
+
+    # Calculate carbon emissions per day
+    grid_emission = daily_target_energy * GRID_CARBON_FACTOR / 1000  # kgCO2/day
+    solar_emission = daily_target_energy * SOLAR_CARBON_FACTOR / 1000  # kgCO2/day
+
+    # Total emissions over the years
+    total_grid_emission = grid_emission * 365 * np.asarray(num_years)
+    total_solar_emission = solar_emission * 365 * np.asarray(num_years)
+
+    return total_grid_emission, total_solar_emission
+
+
+@cached_stage('emissions')
+def calculate_emissions(daily_target_energy, num_years):
+    total_grid_emission, total_solar_emission = calculate_emissions_batch(daily_target_energy, num_years)
+
+    return float(total_grid_emission), float(total_solar_emission)
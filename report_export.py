@@ -0,0 +1,387 @@
+# report_export.py
+#
+# Bulk report export: one report bundle per scenario of a scenario CSV (same
+# columns as flagged/log.csv and yst_batch), written into a single zip archive.
+#
+# Each bundle holds an HTML report with the design, cost and carbon tables and
+# charts, the monthly PV potential and generation PNGs and the yearly cost
+# table as CSV. The archive also has an index of every report and a summary CSV
+# of all computed columns.
+#
+# - Reports are rendered in the shared worker pool (workers.imap_heavy), a chunk
+#   of scenarios per task, with a bounded number of chunks in flight; the
+#   archive is written in input order as chunks complete, so memory stays flat
+#   for any number of scenarios.
+# - The charts and cost tables come from the same yst_batch.run_pipeline call
+#   as the report's numbers. Scenarios it could not compute get a short page
+#   with their inputs and the reason.
+# - plotly.js, the plotly theme and the stylesheet are written once under
+#   assets/ and referenced by every report, instead of ~3.5 MB of plotly.js in
+#   every chart file as in an HTML export from the app.
+# - Plotly figures are built once per worker with the app's styling; each
+#   report only fills in its data and titles.
+#
+# Usage:
+#     python report_export.py scenarios.csv reports.zip --workers 8
+
+import argparse
+import html
+import json
+import string
+import tempfile
+import time
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+from charts import plot_monthly_pv_potential, plot_monthly_generation
+from pv_model import months
+from workers import configure as configure_workers, imap_heavy, run_heavy
+from yst_batch import INPUT_COLUMNS, NOTE_COLUMN, run_pipeline
+
+# Columns used to name the reports, in order of preference; reports are numbered otherwise
+NAME_COLUMNS = ['Scenario', 'Name', 'Client', 'Site']
+
+# Report pages reference the shared assets relative to reports/<scenario>/
+ASSETS = '../../assets'
+
+STYLESHEET = """\
+body { font-family: sans-serif; margin: 2em auto; max-width: 1100px; color: #222; }
+h1 { border-bottom: 3px solid #FDB813; padding-bottom: .3em; }
+table { border-collapse: collapse; margin: 1em 0; }
+th, td { border: 1px solid #ccc; padding: .3em .8em; text-align: right; }
+th { background: #f5f5f5; text-align: left; }
+img { width: 100%; }
+.chart { height: 450px; }
+.scroll { max-height: 400px; overflow-y: auto; display: inline-block; }
+"""
+
+# Draws the figures of a report with the shared plotly theme
+REPORT_SCRIPT = """\
+var YST_THEME = $theme;
+function renderFigures(figures) {
+  for (var id in figures) {
+    var figure = figures[id];
+    figure.layout.template = YST_THEME;
+    Plotly.newPlot(id, figure.data, figure.layout, {responsive: true});
+  }
+}
+"""
+
+REPORT_PAGE = string.Template("""\
+<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>$title</title>
+<link rel="stylesheet" href="$assets/report.css">
+<script src="$assets/plotly.min.js"></script>
+<script src="$assets/report.js"></script>
+</head>
+<body>
+<p><a href="../../index.html">All reports</a></p>
+<h1>$title</h1>
+<h2>Inputs</h2>
+$inputs
+<h2>PV System Design</h2>
+$design
+<img src="monthly_pv_potential.png" alt="Monthly PV potential">
+<img src="monthly_energy_generation.png" alt="Monthly energy generation">
+<h2>Cost Simulation</h2>
+$costs
+<div id="annual_cost" class="chart"></div>
+<div id="cumulative_cost" class="chart"></div>
+<div class="scroll">$cost_table</div>
+<p><a href="cost_table.csv">Yearly costs (CSV)</a></p>
+<h2>Carbon Emissions</h2>
+$emissions
+<div id="emissions" class="chart"></div>
+<script>renderFigures($figures);</script>
+</body>
+</html>
+""")
+
+# Page of a scenario that could not be computed
+NOTE_PAGE = string.Template("""\
+<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>$title</title>
+<link rel="stylesheet" href="$assets/report.css">
+</head>
+<body>
+<p><a href="../../index.html">All reports</a></p>
+<h1>$title</h1>
+<p>$note</p>
+<h2>Inputs</h2>
+$inputs
+</body>
+</html>
+""")
+
+INDEX_HEAD = """\
+<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Yellow Sun Tool Reports</title>
+<link rel="stylesheet" href="assets/report.css">
+</head>
+<body>
+<h1>Yellow Sun Tool Reports</h1>
+<p><a href="summary.csv">All scenarios (CSV)</a></p>
+<table>
+<tr><th>Report</th><th>State</th><th>Daily Target Energy (kWh)</th><th>Panels</th><th>Batteries</th>
+<th>Commissioning Cost (₦)</th><th>PV LCOE (₦/kWh)</th><th>Payback Year</th><th>Note</th></tr>
+"""
+
+INDEX_TAIL = """\
+</table>
+</body>
+</html>
+"""
+
+# Entries that are already compressed are stored as they are
+STORED_SUFFIXES = ('.png',)
+
+# This worker's figure templates, by chart
+_figures = {}
+
+
+def _figure_template(chart):
+    """Plotly JSON of ``chart`` as styled in the app, without the theme; built once per worker."""
+    if chart not in _figures:
+        import plotly.express as px  # imported here so that only the workers load plotly
+
+        if chart == 'emissions':
+            fig = px.pie({'Energy Source': ['Grid Electricity', 'PV System Solar Energy'],
+                          'Carbon Emission (kgCO2)': [1, 1]},
+                         values='Carbon Emission (kgCO2)', names='Energy Source',
+                         color_discrete_sequence=['#0077c2', '#FDB813'])
+            fig.update_traces(textposition='inside', textinfo='percent+label')
+        else:
+            columns = ['PV Cost', 'Grid Cost'] if chart == 'annual_cost' else ['Cumulative PV Cost', 'Cumulative Grid Cost']
+            label = 'Cost (₦)' if chart == 'annual_cost' else 'Cumulative Cost (₦)'
+            fig = px.line(pd.DataFrame({'Year': [1], **{column: [0.0] for column in columns}}), x='Year', y=columns,
+                          labels={'value': label, 'variable': 'Energy Source'})
+        figure = json.loads(fig.to_json())
+        _figures['theme'] = figure['layout'].pop('template')
+        _figures[chart] = figure
+    return _figures[chart]
+
+
+def _figure(chart, title, series):
+    """``chart``'s figure with ``title``; ``series`` maps trace attributes to each trace's values."""
+    template = _figure_template(chart)
+    data = [{**trace, **{name: values[i] for name, values in series.items()}}
+            for i, trace in enumerate(template['data'])]
+    return {'data': data, 'layout': {**template['layout'], 'title': {'text': title}}}
+
+
+def _format(value):
+    """Display form of a table value: thousands separators, and two decimals unless it is a whole number."""
+    if isinstance(value, (float, np.floating)):
+        if np.isnan(value):
+            return ''
+        return f'{value:,.0f}' if value == int(value) else f'{value:,.2f}'
+    if isinstance(value, (int, np.integer)) and not isinstance(value, bool):
+        return f'{value:,}'
+    return str(value)
+
+
+def _payback(row):
+    if row[NOTE_COLUMN]:
+        return ''
+    payback_year = row['Payback Year']
+    return (f"Year {int(payback_year)}" if not np.isnan(payback_year)
+            else f"Not within {int(row[INPUT_COLUMNS['num_years']])} years")
+
+
+def _table(rows, header=('Metric', 'Value')):
+    """HTML table of ``(label, value)`` rows."""
+    cells = ''.join(f"<tr><th>{html.escape(str(label))}</th><td>{html.escape(_format(value))}</td></tr>\n"
+                    for label, value in rows)
+    return f"<table>\n<tr><th>{header[0]}</th><th>{header[1]}</th></tr>\n{cells}</table>"
+
+
+def _name_column(scenarios):
+    return next((name for name in NAME_COLUMNS if name in scenarios.columns), None)
+
+
+def report_names(scenarios):
+    """Directory name of each scenario's report: its number and, when there is a name column, a slug of its name."""
+    numbers = [f'{number:05d}' for number in scenarios.index + 1]
+    column = _name_column(scenarios)
+    if column is None:
+        return numbers
+    slugs = scenarios[column].fillna('').astype(str).str.lower().str.replace(r'[^a-z0-9]+', '-', regex=True)
+    return [f'{number}-{slug.strip("-")[:40]}'.rstrip('-') for number, slug in zip(numbers, slugs)]
+
+
+def report_titles(scenarios):
+    """Title of each scenario's report: its name, or "Scenario N" without a name column."""
+    column = _name_column(scenarios)
+    numbers = scenarios.index + 1
+    if column is None:
+        return [f'Scenario {number}' for number in numbers]
+    return [name if name else f'Scenario {number}'
+            for number, name in zip(numbers, scenarios[column].fillna('').astype(str))]
+
+
+def render_reports(scenarios):
+    """Report bundles of a chunk of scenarios.
+
+    Returns ``(entries, results)``: ``(archive name, bytes)`` of every file of the chunk's reports,
+    and the scenarios with their computed columns (``yst_batch.run_pipeline``).
+    """
+    results, series = run_pipeline(scenarios, return_series=True)
+
+    entries = []
+    for i, (name, title) in enumerate(zip(report_names(scenarios), report_titles(scenarios))):
+        row = results.iloc[i]
+        folder = f'reports/{name}/'
+        inputs = _table([(column, row[column]) for column in scenarios.columns])
+        if row[NOTE_COLUMN]:
+            page = NOTE_PAGE.substitute(title=html.escape(title), assets=ASSETS, note=html.escape(row[NOTE_COLUMN]),
+                                        inputs=inputs)
+            entries.append((folder + 'report.html', page.encode()))
+            continue
+
+        state = row[INPUT_COLUMNS['state']]
+        num_years = int(row[INPUT_COLUMNS['num_years']])
+        num_years_emission = int(row[INPUT_COLUMNS['num_years_emission']])
+
+        for file_name, path in [
+                ('monthly_pv_potential.png',
+                 plot_monthly_pv_potential(months, series['monthly_pv_potential'][i].tolist(), state)),
+                ('monthly_energy_generation.png',
+                 plot_monthly_generation(months, series['monthly_generation'][i].tolist()))]:
+            with open(path, 'rb') as file:
+                entries.append((folder + file_name, file.read()))
+
+        pv_cost_table = series['pv_cost_table'][i, :num_years]
+        grid_cost_table = series['grid_cost_table'][i, :num_years]
+        cost_df = pd.DataFrame({
+            'Year': np.arange(1, num_years + 1),
+            'PV Cost': pv_cost_table,
+            'Grid Cost': grid_cost_table,
+            'Cumulative PV Cost': np.cumsum(pv_cost_table),
+            'Cumulative Grid Cost': np.cumsum(grid_cost_table)
+        })
+        entries.append((folder + 'cost_table.csv', cost_df.to_csv(index=False).encode()))
+
+        years = cost_df['Year'].tolist()
+        figures = {
+            'annual_cost': _figure(
+                'annual_cost', f'Annual Cost of Electricity: PV System vs Grid Supply over {num_years} Years',
+                {'x': [years, years], 'y': [pv_cost_table.tolist(), grid_cost_table.tolist()]}),
+            'cumulative_cost': _figure(
+                'cumulative_cost',
+                f'{num_years}-Year Cumulative Life Cycle Cost Comparison: PV System vs Grid Electricity',
+                {'x': [years, years], 'y': [cost_df['Cumulative PV Cost'].tolist(),
+                                            cost_df['Cumulative Grid Cost'].tolist()]}),
+            'emissions': _figure(
+                'emissions', f'Carbon Emissions over {num_years_emission} Years',
+                {'values': [[row['Total Grid Carbon Emissions (kgCO2)'], row['Total PV Carbon Emissions (kgCO2)']]]}),
+        }
+
+        page = REPORT_PAGE.substitute(
+            title=html.escape(title),
+            assets=ASSETS,
+            inputs=inputs,
+            design=_table([(column, row[column]) for column in
+                           ['Number of Panels Required', 'Total Battery Capacity (Ah)', 'Number of Batteries Needed']]),
+            costs=_table([(column.replace('(Naira', '(₦'), row[column]) for column in
+                          ['Total Procurement Cost (Naira)', 'Total Installation Cost (Naira)',
+                           'Total Commissioning Cost (Naira)', 'Maintenance Cost per Year (Naira)',
+                           'Total Grid Electricity Cost Over Simulation Period (Naira)',
+                           'Total PV Electricity Cost Over Simulation Period (Naira)',
+                           'PV Cost NPV (Naira)', 'Grid Cost NPV (Naira)', 'PV LCOE (Naira/kWh)',
+                           'Grid LCOE (Naira/kWh)']] + [('Payback Year', _payback(row))]),
+            cost_table=cost_df.to_html(index=False, float_format='{:,.2f}'.format, border=0),
+            emissions=_table([(column, row[column]) for column in
+                              ['Total Grid Carbon Emissions (kgCO2)', 'Total PV Carbon Emissions (kgCO2)']]),
+            # "</" cannot appear inside a script element
+            figures=json.dumps(figures).replace('</', '<\\/'))
+        entries.append((folder + 'report.html', page.encode()))
+
+    return entries, results
+
+
+def shared_assets():
+    """``(archive name, bytes)`` of the files every report references."""
+    import plotly.offline
+
+    _figure_template('annual_cost')
+    script = string.Template(REPORT_SCRIPT).substitute(theme=json.dumps(_figures['theme']))
+    return [('assets/plotly.min.js', plotly.offline.get_plotlyjs().encode()),
+            ('assets/report.js', script.encode()),
+            ('assets/report.css', STYLESHEET.encode())]
+
+
+def _index_row(name, title, row):
+    cells = [row[INPUT_COLUMNS['state']], row[INPUT_COLUMNS['daily_target_energy']],
+             row['Number of Panels Required'], row['Number of Batteries Needed'],
+             row['Total Commissioning Cost (Naira)'], round(row['PV LCOE (Naira/kWh)'], 2), _payback(row),
+             row[NOTE_COLUMN]]
+    return (f'<tr><th><a href="reports/{name}/report.html">{html.escape(title)}</a></th>'
+            + ''.join(f'<td>{html.escape(_format(cell))}</td>' for cell in cells) + '</tr>\n')
+
+
+def export_reports(input_path, output_path, chunksize=25, workers=None):
+    """Write a report bundle for every scenario of ``input_path`` into the zip archive ``output_path``.
+
+    Chunks are rendered in the shared worker pool (``workers`` processes, default: the pool's setting)
+    with a bounded number in flight, and the archive is written in input order. Returns the number of
+    reports written.
+    """
+    if workers:
+        configure_workers(process_workers=workers)
+    reports = 0
+
+    with zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED) as archive, \
+            tempfile.TemporaryFile('w+', newline='') as summary, \
+            tempfile.TemporaryFile('w+') as index:
+        for entries, results in imap_heavy(render_reports, pd.read_csv(input_path, chunksize=chunksize)):
+            for name, data in entries:
+                compression = zipfile.ZIP_STORED if name.endswith(STORED_SUFFIXES) else zipfile.ZIP_DEFLATED
+                archive.writestr(name, data, compress_type=compression)
+            results.to_csv(summary, header=reports == 0, index=False)
+            for name, title, (_, row) in zip(report_names(results), report_titles(results), results.iterrows()):
+                index.write(_index_row(name, title, row))
+            reports += len(results)
+
+        # Built in a worker so that only the workers load plotly
+        for name, data in run_heavy(shared_assets):
+            archive.writestr(name, data, compress_type=zipfile.ZIP_STORED if name.endswith(STORED_SUFFIXES)
+                             else zipfile.ZIP_DEFLATED)
+        for name, file, head, tail in [('summary.csv', summary, '', ''), ('index.html', index, INDEX_HEAD, INDEX_TAIL)]:
+            file.seek(0)
+            info = zipfile.ZipInfo(name, time.localtime()[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED
+            with archive.open(info, 'w') as entry:
+                entry.write(head.encode())
+                for line in file:
+                    entry.write(line.encode())
+                entry.write(tail.encode())
+
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a report bundle for every scenario of a scenario CSV.")
+    parser.add_argument('input', help="Scenario CSV with the same columns as flagged/log.csv")
+    parser.add_argument('output', help="Zip archive to write the reports to")
+    parser.add_argument('--chunksize', type=int, default=25, help="Scenarios per worker task (default: 25)")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Worker processes; 1 renders in this process (default: CPU count)")
+    args = parser.parse_args()
+
+    reports = export_reports(args.input, args.output, chunksize=args.chunksize, workers=args.workers)
+    print(f"Wrote {reports:,} reports to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
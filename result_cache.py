@@ -0,0 +1,146 @@
+# result_cache.py
+#
+# Bounded, thread-safe memoization for the pure computation stages of the model
+# (monthly potential, sizing, cost table, emissions). Each stage gets its own
+# LRU cache with a time-to-live, keyed on normalized inputs so that e.g. 10 and
+# 10.0 from different Gradio components hit the same entry.
+#
+# Like functools.lru_cache, a hit returns the cached object itself; callers must
+# treat stage results as read-only.
+
+import functools
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+DEFAULT_MAXSIZE = int(os.environ.get('YST_CACHE_SIZE', 256))
+DEFAULT_TTL = float(os.environ.get('YST_CACHE_TTL', 3600))  # seconds, 0 disables expiry
+CACHE_ENABLED = os.environ.get('YST_CACHE', '1') != '0'
+
+
+def normalize_key(value):
+    """Hashable, type-insensitive form of a stage argument."""
+    if isinstance(value, bool) or value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (int, float, np.number)):
+        value = float(value) + 0.0  # folds -0.0 into 0.0
+        return value if value == value else 'nan'  # NaN != NaN would never match
+    if isinstance(value, np.ndarray):
+        return tuple(normalize_key(item) for item in value.tolist())
+    if isinstance(value, (list, tuple)):
+        return tuple(normalize_key(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, normalize_key(item)) for key, item in value.items()))
+    return value
+
+
+class ResultCache:
+    """LRU cache with size- and TTL-based eviction and hit/miss/eviction counters."""
+
+    def __init__(self, name, maxsize=DEFAULT_MAXSIZE, ttl=DEFAULT_TTL, on_evict=None):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # Called with each value dropped by eviction or expiry, outside the lock
+        self.on_evict = on_evict
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        """Return ``(True, value)`` on a hit, ``(False, None)`` otherwise."""
+        expired = []
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, value
+                del self._entries[key]
+                self.expirations += 1
+                expired.append(value)
+            self.misses += 1
+        self._evicted(expired)
+        return False, None
+
+    def put(self, key, value):
+        expires_at = time.monotonic() + self.ttl if self.ttl > 0 else None
+        evicted = []
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                evicted.append(self._entries.popitem(last=False)[1][1])
+                self.evictions += 1
+        self._evicted(evicted)
+
+    def _evicted(self, values):
+        if self.on_evict is not None:
+            for value in values:
+                self.on_evict(value)
+
+    def clear(self):
+        with self._lock:
+            values = [value for _, value in self._entries.values()]
+            self._entries.clear()
+        self._evicted(values)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+            }
+
+
+# One cache per stage, by stage name
+caches = {}
+
+
+def cached_stage(name, maxsize=DEFAULT_MAXSIZE, ttl=DEFAULT_TTL):
+    """Memoize a pure stage function in the ``name`` cache.
+
+    The wrapped function keeps a ``__wrapped__`` reference to the uncached implementation.
+    """
+    cache = caches.setdefault(name, ResultCache(name, maxsize=maxsize, ttl=ttl))
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not CACHE_ENABLED:
+                return function(*args, **kwargs)
+
+            key = (normalize_key(args), normalize_key(kwargs))
+            hit, value = cache.get(key)
+            if hit:
+                return value
+            value = function(*args, **kwargs)
+            cache.put(key, value)
+            return value
+
+        wrapper.cache = cache
+        return wrapper
+
+    return decorator
+
+
+def cache_stats():
+    """Counters of every stage cache, keyed by stage name."""
+    return {name: cache.stats() for name, cache in caches.items()}
+
+
+def clear_caches():
+    for cache in caches.values():
+        cache.clear()
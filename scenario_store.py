@@ -0,0 +1,466 @@
+# scenario_store.py
+#
+# Indexed store of every scenario computed by the app: one SQLite row per run
+# with its inputs (the stage graph's input names) and the outputs of the model
+# stages it ran. It replaces the wide flagged/log.csv, which can only be read
+# whole, with a table that is indexed on state, timestamp and the key
+# parameters, so it can be filtered and aggregated directly.
+#
+# Handlers decorated with ``recorded`` report their stage results with
+# ``report``. When the handler returns, the row is handed to a background
+# writer thread, which inserts queued rows in batches. A handler never waits
+# for the database, and when the queue is full the row is dropped and counted.
+#
+# Stored scenarios can be replayed through the current model to find results
+# that changed:
+#     python scenario_store.py import flagged/log.csv
+#     python scenario_store.py summary payback_year --by state --statistic median
+#     python scenario_store.py replay --since 2024-01-01
+
+import argparse
+import atexit
+import contextvars
+import functools
+import inspect
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from cost_model import simulate_costs_batch
+from pv_model import calculate_monthly_pv_potential_batch, size_pv_system_batch, calculate_emissions_batch
+from stage_graph import model_graph
+
+SCENARIO_DB = os.environ.get('YST_SCENARIO_DB',
+                             os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scenarios.db'))  # '' disables
+ENABLED = bool(SCENARIO_DB)
+
+# Rows waiting for the writer; beyond this, new rows are dropped rather than blocking a handler
+MAX_PENDING = 10000
+# Rows per insert transaction
+WRITE_BATCH = 500
+
+# Stored outputs of each stage, in column order
+STAGE_OUTPUTS = {
+    'potential': ['mean_daily_pv_potential'],
+    'sizing': ['min_panels', 'total_battery_capacity', 'number_of_batteries'],
+    'cost': ['total_procurement_cost', 'total_installation_cost', 'commission_cost', 'usage_cost',
+             'total_pv_cost', 'total_grid_cost', 'npv_pv_cost', 'npv_grid_cost', 'npv_savings',
+             'lcoe_pv', 'lcoe_grid', 'payback_year'],
+    'emissions': ['total_grid_emission', 'total_solar_emission'],
+}
+
+INPUTS = model_graph.inputs(list(model_graph.stages))
+OUTPUTS = [name for outputs in STAGE_OUTPUTS.values() for name in outputs]
+COLUMNS = ['timestamp', 'source'] + INPUTS + OUTPUTS
+
+INDEXES = {
+    'scenarios_timestamp': ['timestamp'],
+    'scenarios_state': ['state', 'timestamp'],
+    'scenarios_daily_target_energy': ['daily_target_energy'],
+    'scenarios_num_years': ['num_years'],
+    'scenarios_inflation_rate': ['inflation_rate'],
+}
+
+STATISTICS = ['count', 'mean', 'median', 'min', 'max', 'sum', 'std']
+
+
+def stage_outputs(stage, result):
+    """Stored output values of a stage result, as returned by the single-scenario model functions."""
+    if stage == 'potential':
+        values = [float(np.mean(result))]
+    elif stage == 'sizing':
+        values = list(result[:3])
+    elif stage == 'cost':
+        values = [result[name] for name in STAGE_OUTPUTS['cost']]
+    else:
+        values = list(result)
+    return {name: float(value) for name, value in zip(STAGE_OUTPUTS[stage], values)}
+
+
+def recompute(stage, inputs):
+    """Output columns of ``stage`` for arrays of stored ``inputs``, computed with the current model."""
+    if stage == 'emissions':
+        total_grid_emission, total_solar_emission = calculate_emissions_batch(
+            inputs['daily_target_energy_emission'], inputs['num_years_emission'])
+        return {'total_grid_emission': total_grid_emission, 'total_solar_emission': total_solar_emission}
+
+    site = [inputs[name] for name in ('panel_length', 'panel_width', 'panel_efficiency', 'inverter_efficiency', 'state')]
+    if stage == 'potential':
+        return {'mean_daily_pv_potential': calculate_monthly_pv_potential_batch(*site).mean(axis=1)}
+
+    sizing = size_pv_system_batch(*site, *[inputs[name] for name in model_graph.stages['sizing'].inputs])
+    if stage == 'sizing':
+        return {name: sizing[name] for name in STAGE_OUTPUTS['sizing']}
+
+    costs = simulate_costs_batch(sizing['min_panels'], sizing['number_of_batteries'],
+                                 *[inputs[name] for name in model_graph.stages['cost'].inputs])
+    return {name: costs[name] for name in STAGE_OUTPUTS['cost']}
+
+
+def parse_time(value):
+    """Unix time of a number or an ISO date/time string."""
+    if value is None or isinstance(value, (int, float)):
+        return value
+    return datetime.fromisoformat(str(value)).timestamp()
+
+
+class ScenarioStore:
+    """A scenario database with a background writer."""
+
+    def __init__(self, path):
+        self.path = path
+        self.written = 0
+        self.dropped = 0
+        self._queue = queue.Queue(MAX_PENDING)
+        self._writer = None
+        self._writer_lock = threading.Lock()
+        connection = self.connect()
+        try:
+            with connection:
+                self._create(connection)
+        finally:
+            connection.close()
+
+    def connect(self):
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.execute('PRAGMA journal_mode=WAL')  # readers do not wait for the writer
+        connection.execute('PRAGMA synchronous=NORMAL')
+        return connection
+
+    def _create(self, connection):
+        columns = ', '.join(f'{name} TEXT' if name in ('source', 'state') else f'{name} REAL' for name in COLUMNS)
+        connection.execute(f'CREATE TABLE IF NOT EXISTS scenarios (id INTEGER PRIMARY KEY, {columns})')
+        for name, indexed in INDEXES.items():
+            connection.execute(f'CREATE INDEX IF NOT EXISTS {name} ON scenarios ({", ".join(indexed)})')
+
+    def insert(self, scenarios, connection=None):
+        """Insert dicts of column values synchronously; returns the number of rows written."""
+        return self._insert_rows([tuple(scenario.get(name) for name in COLUMNS) for scenario in scenarios], connection)
+
+    def _insert_rows(self, rows, connection=None):
+        own_connection = connection is None
+        connection = connection or self.connect()
+        try:
+            with connection:
+                connection.executemany(
+                    f'INSERT INTO scenarios ({", ".join(COLUMNS)}) VALUES ({", ".join("?" * len(COLUMNS))})', rows)
+        finally:
+            if own_connection:
+                connection.close()
+        self.written += len(rows)
+        return len(rows)
+
+    def put(self, scenario):
+        """Queue a scenario for the background writer without waiting."""
+        if self._writer is None:
+            with self._writer_lock:
+                if self._writer is None:
+                    self._writer = threading.Thread(target=self._write_loop, name='yst-scenario-writer', daemon=True)
+                    self._writer.start()
+        try:
+            self._queue.put_nowait(scenario)
+        except queue.Full:
+            self.dropped += 1
+
+    def _write_loop(self):
+        connection = self.connect()
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < WRITE_BATCH:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.insert(batch, connection)
+            except sqlite3.Error as error:
+                self.dropped += len(batch)
+                print(f"Scenario store: could not write {len(batch)} scenarios: {error}", file=sys.stderr)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def flush(self, timeout=None):
+        """Wait until queued scenarios are written; returns False if ``timeout`` expired first."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+    def _where(self, state=None, since=None, until=None, source=None, **ranges):
+        clauses, parameters = [], []
+        if state is not None:
+            clauses.append('state = ?')
+            parameters.append(state)
+        if since is not None:
+            clauses.append('timestamp >= ?')
+            parameters.append(parse_time(since))
+        if until is not None:
+            clauses.append('timestamp < ?')
+            parameters.append(parse_time(until))
+        if source is not None:
+            clauses.append('source = ?')
+            parameters.append(source)
+        for name, value in ranges.items():
+            if name not in COLUMNS:
+                raise ValueError(f"Unknown scenario column: {name}")
+            if isinstance(value, (tuple, list)):
+                clauses.append(f'{name} BETWEEN ? AND ?')
+                parameters.extend(value)
+            else:
+                clauses.append(f'{name} = ?')
+                parameters.append(value)
+        return (' WHERE ' + ' AND '.join(clauses) if clauses else ''), parameters
+
+    def query(self, columns=None, limit=None, chunksize=None, **filters):
+        """Stored scenarios as a DataFrame (or an iterator of them with ``chunksize``).
+
+        ``filters`` are ``state``, ``since``/``until`` (Unix time or ISO string), ``source`` and
+        ``column=value`` or ``column=(low, high)`` for any other column.
+        """
+        import pandas as pd
+
+        columns = columns or ['id'] + COLUMNS
+        unknown = [name for name in columns if name != 'id' and name not in COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown scenario columns: {', '.join(unknown)}")
+        where, parameters = self._where(**filters)
+        sql = f'SELECT {", ".join(columns)} FROM scenarios{where} ORDER BY id'
+        if limit is not None:
+            sql += f' LIMIT {int(limit)}'
+
+        connection = self.connect()
+        if chunksize is None:
+            try:
+                return pd.read_sql_query(sql, connection, params=parameters)
+            finally:
+                connection.close()
+
+        def chunks():
+            try:
+                yield from pd.read_sql_query(sql, connection, params=parameters, chunksize=chunksize)
+            finally:
+                connection.close()
+        return chunks()
+
+    def summary(self, metric, by='state', statistic='median', **filters):
+        """``statistic`` of ``metric`` per value of ``by``, e.g. the median payback year by state."""
+        if statistic not in STATISTICS:
+            raise ValueError(f"Unknown statistic {statistic!r}, expected one of: {', '.join(STATISTICS)}")
+        frame = self.query([by, metric], **filters)
+        frame = frame.dropna(subset=[metric])
+        grouped = frame.groupby(by)[metric]
+        return grouped.agg(statistic).rename(f'{statistic}_{metric}').to_frame().assign(scenarios=grouped.size())
+
+    def replay(self, rtol=1e-9, atol=1e-6, chunksize=50000, **filters):
+        """Recompute stored scenarios with the current model and compare with their stored outputs.
+
+        Returns a DataFrame with, for every stored output, the number of scenarios compared and
+        mismatched, the largest absolute difference and up to 10 ids of mismatched scenarios.
+        Scenarios the current model cannot size have no costs to compare (e.g. yst_batch rows noted
+        "Cannot be sized", which still carry a maintenance cost); a change in what can be sized shows
+        up in the sizing outputs instead.
+        """
+        import pandas as pd
+
+        report = {name: {'stage': stage, 'compared': 0, 'mismatched': 0, 'max_abs_diff': 0.0, 'example_ids': []}
+                  for stage, outputs in STAGE_OUTPUTS.items() for name in outputs}
+        for frame in self.query(chunksize=chunksize, **filters):
+            for stage, outputs in STAGE_OUTPUTS.items():
+                inputs = model_graph.inputs([stage])
+                rows = frame[frame[outputs].notna().any(axis=1) & frame[inputs].notna().all(axis=1)]
+                if stage == 'cost' and not rows.empty:
+                    sizing_inputs = model_graph.inputs(['sizing'])
+                    sizing = recompute('sizing', {name: rows[name].to_numpy() for name in sizing_inputs})
+                    rows = rows[~(np.isnan(sizing['min_panels']) | np.isnan(sizing['number_of_batteries']))]
+                if rows.empty:
+                    continue
+                recomputed = recompute(stage, {name: rows[name].to_numpy() for name in inputs})
+                for name in outputs:
+                    # SQLite stores NaN (e.g. no payback) as NULL, so NULL compares equal to NaN
+                    stored = rows[name].to_numpy(dtype=float)
+                    current = np.broadcast_to(np.asarray(recomputed[name], dtype=float), stored.shape)
+                    mismatched = ~np.isclose(current, stored, rtol=rtol, atol=atol, equal_nan=True)
+                    entry = report[name]
+                    entry['compared'] += len(stored)
+                    entry['mismatched'] += int(mismatched.sum())
+                    if mismatched.any():
+                        difference = np.nan_to_num(np.abs(current - stored)[mismatched], nan=np.inf)
+                        entry['max_abs_diff'] = max(entry['max_abs_diff'], float(difference.max()))
+                        entry['example_ids'] += rows['id'].to_numpy()[mismatched][:10 - len(entry['example_ids'])].tolist()
+        return pd.DataFrame.from_dict(report, orient='index').rename_axis('output')
+
+    def import_csv(self, path, source='import', chunksize=50000):
+        """Load a flagged/log.csv or yst_batch output file; returns the number of scenarios imported."""
+        import pandas as pd
+        from yst_batch import INPUT_COLUMNS, OPTIONAL_INPUT_COLUMNS, OUTPUT_COLUMNS, FINANCIAL_COLUMNS
+
+        # The CSV has one maintenance cost per visit; it is the miscellaneous part of the per-component costs
+        inputs = {**INPUT_COLUMNS, **OPTIONAL_INPUT_COLUMNS}
+        inputs['maintenance_misc_cost'] = inputs.pop('maintenance_cost')
+        outputs = dict(zip(OUTPUT_COLUMNS + FINANCIAL_COLUMNS, [
+            'min_panels', 'total_battery_capacity', 'number_of_batteries',
+            'total_procurement_cost', 'total_installation_cost', 'commission_cost', 'usage_cost',
+            'total_grid_cost', 'total_pv_cost', None, None, 'total_grid_emission', 'total_solar_emission',
+            'npv_pv_cost', 'npv_grid_cost', 'lcoe_pv', 'lcoe_grid', 'payback_year']))
+
+        imported = 0
+        connection = self.connect()
+        try:
+            for chunk in pd.read_csv(path, chunksize=chunksize):
+                scenarios = pd.DataFrame(index=chunk.index)
+                scenarios['timestamp'] = chunk['timestamp'].map(parse_time) if 'timestamp' in chunk else time.time()
+                scenarios['source'] = source
+                for name, column in inputs.items():
+                    if column in chunk:
+                        scenarios[name] = chunk[column]
+                    elif column in OPTIONAL_INPUT_COLUMNS.values():
+                        scenarios[name] = 0.0  # yst_batch defaults
+                for name in ['maintenance_cost_per_panel', 'maintenance_cost_controller',
+                             'maintenance_cost_inverter', 'maintenance_cost_per_battery']:
+                    scenarios[name] = 0.0
+                scenarios['daily_target_energy_emission'] = scenarios['daily_target_energy']
+                for column, name in outputs.items():
+                    if name and column in chunk:
+                        scenarios[name] = chunk[column]
+                if 'npv_pv_cost' in scenarios and 'npv_grid_cost' in scenarios:
+                    scenarios['npv_savings'] = scenarios['npv_grid_cost'] - scenarios['npv_pv_cost']
+
+                scenarios = scenarios.reindex(columns=COLUMNS).astype(object)
+                rows = list(scenarios.where(scenarios.notna(), None).itertuples(index=False, name=None))
+                imported += self._insert_rows(rows, connection)
+        finally:
+            connection.close()
+        return imported
+
+
+_store = None
+_store_lock = threading.Lock()
+
+# Outputs reported by the handler currently running
+_current = contextvars.ContextVar('yst_scenario_outputs', default=None)
+
+
+def get_store():
+    """The store at ``SCENARIO_DB``, created on first use; None when disabled."""
+    global _store
+    if _store is None and ENABLED:
+        with _store_lock:
+            if _store is None:
+                _store = ScenarioStore(SCENARIO_DB)
+                atexit.register(_store.flush, 5)  # write what is still queued on a normal exit
+    return _store
+
+
+def report(stage, result):
+    """Add the outputs of a stage result to the scenario recorded for the current handler call."""
+    outputs = _current.get()
+    if outputs is not None:
+        outputs.update(stage_outputs(stage, result))
+
+
+def recorded(handler):
+    """Store every call of a handler: its scenario inputs and the stage results it ``report``s.
+
+    Returned as-is when the store is disabled.
+    """
+    if not ENABLED:
+        return handler
+    signature = inspect.signature(handler)
+
+    @functools.wraps(handler)
+    def wrapper(*args, **kwargs):
+        outputs = {}
+        token = _current.set(outputs)
+        try:
+            result = handler(*args, **kwargs)
+        finally:
+            _current.reset(token)
+
+        if outputs:
+            arguments = signature.bind(*args, **kwargs).arguments
+            scenario = {name: value for name, value in arguments.items() if name in INPUTS}
+            scenario.update(outputs, timestamp=time.time(), source=handler.__name__)
+            get_store().put(scenario)
+        return result
+
+    return wrapper
+
+
+def configure(path=None):
+    """Override the database path ('' disables); must be called before the handlers are decorated."""
+    global SCENARIO_DB, ENABLED
+    if path is not None:
+        SCENARIO_DB = path
+    ENABLED = bool(SCENARIO_DB)
+
+
+def flush(timeout=None):
+    if _store is not None:
+        return _store.flush(timeout)
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query and replay the Yellow Sun Tool scenario store.")
+    parser.add_argument('--db', default=SCENARIO_DB, help="Scenario database (default: %(default)s)")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    def add_filters(subparser):
+        subparser.add_argument('--state')
+        subparser.add_argument('--since', help="Unix time or ISO date/time")
+        subparser.add_argument('--until', help="Unix time or ISO date/time")
+        subparser.add_argument('--source', help="Handler name, or the --source given to import")
+
+    import_parser = subparsers.add_parser('import', help="Import a flagged/log.csv or yst_batch output file.")
+    import_parser.add_argument('csv')
+    import_parser.add_argument('--source', default='import')
+
+    query_parser = subparsers.add_parser('query', help="Write matching scenarios as CSV.")
+    add_filters(query_parser)
+    query_parser.add_argument('--limit', type=int)
+    query_parser.add_argument('--output', default='-', help="CSV file (default: standard output)")
+
+    summary_parser = subparsers.add_parser('summary', help="Aggregate an output or input column by group.")
+    summary_parser.add_argument('metric', choices=INPUTS + OUTPUTS)
+    summary_parser.add_argument('--by', default='state', choices=['source'] + INPUTS)
+    summary_parser.add_argument('--statistic', default='median', choices=STATISTICS)
+    add_filters(summary_parser)
+
+    replay_parser = subparsers.add_parser('replay', help="Recompute stored scenarios and compare their outputs.")
+    replay_parser.add_argument('--rtol', type=float, default=1e-9)
+    replay_parser.add_argument('--atol', type=float, default=1e-6)
+    add_filters(replay_parser)
+
+    args = parser.parse_args(argv)
+    store = ScenarioStore(args.db)
+    filters = {name: getattr(args, name) for name in ('state', 'since', 'until', 'source')
+               if args.command != 'import' and getattr(args, name) is not None}
+
+    if args.command == 'import':
+        print(f"Imported {store.import_csv(args.csv, source=args.source):,} scenarios into {args.db}")
+    elif args.command == 'query':
+        store.query(limit=args.limit, **filters).to_csv(sys.stdout if args.output == '-' else args.output, index=False)
+    elif args.command == 'summary':
+        print(store.summary(args.metric, by=args.by, statistic=args.statistic, **filters).to_string())
+    elif args.command == 'replay':
+        report = store.replay(rtol=args.rtol, atol=args.atol, **filters)
+        print(report.to_string())
+        mismatched = int(report['mismatched'].sum())
+        print(f"{mismatched:,} mismatched outputs in {int(report['compared'].sum()):,} compared")
+        return 1 if mismatched else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
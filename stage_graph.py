@@ -0,0 +1,162 @@
+# stage_graph.py
+#
+# The model as a graph of cached stages, potential -> sizing -> cost, plus the
+# independent emissions stage. Each stage takes the results of its upstream
+# stages followed by its own inputs, named after the UI components.
+#
+# A GraphState remembers the inputs and upstream versions every stage was last
+# computed from. Re-evaluating it with new inputs recomputes only the stages
+# whose own inputs changed or whose upstream result changed. Changing only
+# ``inflation_rate``, for example, reruns the cost stage and nothing else.
+# When a recomputed result equals the previous one, its downstream stages stay
+# valid. The stage functions are the memoized ones from pv_model and
+# cost_model, so results are also shared between sessions.
+
+import copy
+import inspect
+import threading
+
+from cost_model import simulate_costs
+from pv_model import calculate_monthly_pv_potential, size_from_potential, calculate_emissions
+from result_cache import normalize_key
+
+
+class Stage:
+    """A named model step: ``function(*upstream_results, *inputs)``.
+
+    The input names are the parameters of ``function`` after the upstream results.
+    """
+
+    def __init__(self, name, function, upstream=()):
+        self.name = name
+        self.function = function
+        self.upstream = tuple(upstream)
+        parameters = list(inspect.signature(function).parameters)
+        self.inputs = tuple(parameters[len(self.upstream):])
+
+    def __repr__(self):
+        return f"Stage({self.name!r}, upstream={self.upstream}, inputs={self.inputs})"
+
+
+class StageGraph:
+    def __init__(self, stages):
+        self.stages = {}
+        for stage in stages:
+            missing = [name for name in stage.upstream if name not in self.stages]
+            if missing:
+                raise ValueError(f"Stage {stage.name!r} depends on undefined stages: {', '.join(missing)}")
+            self.stages[stage.name] = stage  # definition order is a topological order
+
+    def dependencies(self, targets):
+        """The stages needed to compute ``targets``, in evaluation order."""
+        needed = set()
+        pending = list(targets)
+        while pending:
+            name = pending.pop()
+            if name not in needed:
+                needed.add(name)
+                pending.extend(self.stages[name].upstream)
+        return [stage for name, stage in self.stages.items() if name in needed]
+
+    def inputs(self, targets):
+        """Names of every input that ``targets`` depend on."""
+        return list(dict.fromkeys(name for stage in self.dependencies(targets) for name in stage.inputs))
+
+    def downstream(self, input_name):
+        """Names of the stages affected by a change of ``input_name``."""
+        affected = set()
+        for name, stage in self.stages.items():
+            if input_name in stage.inputs or affected.intersection(stage.upstream):
+                affected.add(name)
+        return affected
+
+
+class GraphState:
+    """Stage results of one session and what they were computed from."""
+
+    def __init__(self, graph):
+        self.graph = graph
+        self.results = {}
+        self.versions = {}  # stage name -> number of times its result changed
+        self.recomputations = {}  # stage name -> number of times it was computed
+        self._computed_from = {}
+        self._lock = threading.Lock()
+
+    def __deepcopy__(self, memo):
+        # gr.State deep-copies its initial value for every session; the graph itself is shared
+        state = GraphState(self.graph)
+        with self._lock:
+            state.results = copy.deepcopy(self.results, memo)
+            state.versions = dict(self.versions)
+            state.recomputations = dict(self.recomputations)
+            state._computed_from = dict(self._computed_from)
+        return state
+
+    def evaluate(self, targets, **inputs):
+        """Bring ``targets`` (and their upstream stages) up to date with ``inputs``.
+
+        Returns the names of the stages whose result changed. An unchanged result does not mean
+        unchanged outputs: a view that also shows raw inputs must still be refreshed when they change.
+        """
+        stages = self.graph.dependencies(targets)
+        missing = [name for stage in stages for name in stage.inputs if name not in inputs]
+        if missing:
+            raise ValueError(f"Missing stage inputs: {', '.join(dict.fromkeys(missing))}")
+
+        changed = set()
+        with self._lock:
+            for stage in stages:
+                source = (tuple(normalize_key(inputs[name]) for name in stage.inputs),
+                          tuple(self.versions[name] for name in stage.upstream))
+                if self._computed_from.get(stage.name) == source:
+                    continue
+
+                result = stage.function(*[self.results[name] for name in stage.upstream],
+                                        *[inputs[name] for name in stage.inputs])
+                self.recomputations[stage.name] = self.recomputations.get(stage.name, 0) + 1
+                if stage.name not in self.results or normalize_key(result) != normalize_key(self.results[stage.name]):
+                    self.versions[stage.name] = self.versions.get(stage.name, 0) + 1
+                    changed.add(stage.name)
+                self.results[stage.name] = result
+                self._computed_from[stage.name] = source
+        return changed
+
+
+def potential_stage(panel_length, panel_width, panel_efficiency, inverter_efficiency, state):
+    monthly_pv_potential, _ = calculate_monthly_pv_potential(
+        panel_length, panel_width, panel_efficiency, inverter_efficiency, state)
+    return monthly_pv_potential
+
+
+def sizing_stage(monthly_pv_potential, daily_target_energy, autonomy_days, battery_voltage, depth_of_discharge,
+                 battery_efficiency, battery_capacity):
+    return size_from_potential(monthly_pv_potential, daily_target_energy, autonomy_days, battery_voltage,
+                               depth_of_discharge, battery_efficiency, battery_capacity)
+
+
+def cost_stage(sizing,
+               solar_panel_unit_cost, controller_cost, inverter_cost, battery_unit_cost, misc_procurement_cost,
+               solar_panel_install_cost, controller_install_cost, inverter_install_cost, battery_install_cost, misc_install_cost,
+               maintenance_visits_per_year, warranty_years, grid_rate, inflation_rate, num_years,
+               maintenance_cost_per_panel, maintenance_cost_controller, maintenance_cost_inverter,
+               maintenance_cost_per_battery, maintenance_misc_cost, daily_target_energy, discount_rate):
+    min_panels, _, number_of_batteries, _, _ = sizing
+    return simulate_costs(
+        min_panels, number_of_batteries,
+        solar_panel_unit_cost, controller_cost, inverter_cost, battery_unit_cost, misc_procurement_cost,
+        solar_panel_install_cost, controller_install_cost, inverter_install_cost, battery_install_cost, misc_install_cost,
+        maintenance_visits_per_year, warranty_years, grid_rate, inflation_rate, num_years,
+        maintenance_cost_per_panel, maintenance_cost_controller, maintenance_cost_inverter,
+        maintenance_cost_per_battery, maintenance_misc_cost, daily_target_energy, discount_rate)
+
+
+def emissions_stage(num_years_emission, daily_target_energy_emission):
+    return calculate_emissions(daily_target_energy_emission, num_years_emission)
+
+
+model_graph = StageGraph([
+    Stage('potential', potential_stage),
+    Stage('sizing', sizing_stage, upstream=['potential']),
+    Stage('cost', cost_stage, upstream=['sizing']),
+    Stage('emissions', emissions_stage),
+])
@@ -0,0 +1,93 @@
+# startup.py
+#
+# Cold-start helpers for the Gradio app: lazily imported modules, startup phase
+# timings and background pre-warming once the server is listening.
+
+import importlib
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds spent in each startup phase, in the order they ran
+timings = {}
+_timings_lock = threading.Lock()
+
+
+def record(name, seconds):
+    with _timings_lock:
+        timings[name] = seconds
+
+
+@contextmanager
+def phase(name):
+    """Time the enclosed block as startup phase ``name``."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+
+class LazyModule:
+    """Stand-in for a module that is only imported on first attribute access.
+
+    ``px = LazyModule('plotly.express')`` can be used exactly like ``import plotly.express as px``;
+    the import cost moves from startup to the first handler that touches it (or to ``prewarm``).
+    """
+
+    def __init__(self, name):
+        self.__dict__['_name'] = name
+        self.__dict__['_module'] = None
+
+    def _load(self):
+        module = self.__dict__['_module']
+        if module is None:
+            name = self.__dict__['_name']
+            already_loaded = name in sys.modules
+            start = time.perf_counter()
+            module = importlib.import_module(name)
+            if not already_loaded:
+                record(f'import {name}', time.perf_counter() - start)
+            self.__dict__['_module'] = module
+        return module
+
+    def __getattr__(self, attribute):
+        return getattr(self._load(), attribute)
+
+    def __setattr__(self, attribute, value):
+        setattr(self._load(), attribute, value)
+
+    def __repr__(self):
+        state = 'loaded' if self.__dict__['_module'] is not None else 'not loaded'
+        return f"<lazy module '{self.__dict__['_name']}' ({state})>"
+
+
+def ensure_loaded(*modules):
+    """Import the given LazyModule instances now."""
+    for module in modules:
+        module._load()
+
+
+def prewarm(modules, tasks=(), delay=0.0):
+    """Import ``modules`` (LazyModule instances) and run ``tasks`` in a daemon thread.
+
+    Meant to be started right after the server is listening, so the first user request does not pay
+    for the imports. The total time is recorded as the ``prewarm`` phase.
+    """
+    def run():
+        time.sleep(delay)
+        with phase('prewarm'):
+            ensure_loaded(*modules)
+            for task in tasks:
+                task()
+
+    thread = threading.Thread(target=run, name='yst-prewarm', daemon=True)
+    thread.start()
+    return thread
+
+
+def report():
+    """One-line summary of the recorded startup phases."""
+    with _timings_lock:
+        return ', '.join(f'{name} {seconds * 1000:.0f} ms' for name, seconds in timings.items())
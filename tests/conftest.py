@@ -0,0 +1,9 @@
+# conftest.py
+#
+# The app's modules live at the repository root rather than in a package; make
+# them importable however pytest is invoked.
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,85 @@
+# test_cost_model.py
+#
+# The closed-form life-cycle sums against the year-by-year loop they replace.
+
+import numpy as np
+import pytest
+
+from cost_model import cost_tables_batch, geometric_series_sum, life_cycle_metrics_batch, payback_year_batch
+
+
+@pytest.mark.parametrize('ratio', [0.5, 0.9, 1.0, 1.0 + 1e-9, 1.1, 1.25])
+@pytest.mark.parametrize('start, stop', [(0, 0), (0, 1), (0, 10), (2, 10), (3, 50), (5, 2)])
+def test_geometric_series_sum_matches_loop(ratio, start, stop):
+    expected = sum(ratio ** i for i in range(start, stop))
+    assert geometric_series_sum(ratio, start, stop) == pytest.approx(expected, rel=1e-9, abs=1e-12)
+
+
+def test_geometric_series_sum_broadcasts():
+    ratio = np.array([0.8, 1.0, 1.1])
+    stop = np.array([[4], [12]])
+    expected = [[sum(r ** i for i in range(1, n)) for r in ratio] for n in (4, 12)]
+    np.testing.assert_allclose(geometric_series_sum(ratio, 1, stop), expected, rtol=1e-12)
+
+
+def year_by_year(daily_target_energy, grid_rate, inflation_rate, num_years, usage_cost, warranty_years,
+                 commission_cost, discount_rate):
+    """Life-cycle metrics of one scenario, accumulated one year at a time."""
+    growth, discount = 1 + inflation_rate / 100, 1 + discount_rate / 100
+    grid_cost = daily_target_energy * grid_rate * 365
+    totals = dict.fromkeys(['total_pv_cost', 'total_grid_cost', 'npv_pv_cost', 'npv_grid_cost'], 0.0)
+    npv_energy = 0.0
+    for year in range(num_years):
+        pv_cost = commission_cost if year == 0 else 0.0
+        if not (warranty_years > 0 and year < warranty_years):
+            pv_cost += usage_cost * growth ** year
+        factor = discount ** -year
+        totals['total_pv_cost'] += pv_cost
+        totals['total_grid_cost'] += grid_cost
+        totals['npv_pv_cost'] += pv_cost * factor
+        totals['npv_grid_cost'] += grid_cost * factor
+        npv_energy += daily_target_energy * 365 * factor
+        grid_cost *= growth
+    totals['npv_savings'] = totals['npv_grid_cost'] - totals['npv_pv_cost']
+    totals['lcoe_pv'] = totals['npv_pv_cost'] / npv_energy
+    totals['lcoe_grid'] = totals['npv_grid_cost'] / npv_energy
+    return totals
+
+
+def random_scenarios(size, seed=0):
+    rng = np.random.default_rng(seed)
+    return {
+        'daily_target_energy': rng.uniform(1, 50, size),
+        'grid_rate': rng.uniform(20, 200, size),
+        'inflation_rate': rng.choice([0.0, 2.5, 10.0, 25.0], size),
+        'num_years': rng.integers(1, 60, size),
+        'usage_cost': rng.uniform(0, 5e4, size),
+        'warranty_years': rng.choice([0, 1, 2, 2.5, 5, 100], size),
+        'commission_cost': rng.uniform(1e5, 5e6, size),
+        'discount_rate': rng.choice([0.0, 5.0, 10.0, 30.0], size),
+    }
+
+
+def test_life_cycle_metrics_batch_matches_year_by_year_loop():
+    scenarios = random_scenarios(300)
+    metrics = life_cycle_metrics_batch(**scenarios)
+    for i in range(300):
+        expected = year_by_year(**{name: values[i] for name, values in scenarios.items()})
+        for name, value in expected.items():
+            assert metrics[name][i] == pytest.approx(value, rel=1e-9), (name, i)
+
+
+def test_life_cycle_totals_match_cost_tables():
+    scenarios = random_scenarios(100, seed=1)
+    metrics = life_cycle_metrics_batch(**scenarios)
+    pv_cost_table, grid_cost_table = cost_tables_batch(
+        scenarios['daily_target_energy'], scenarios['grid_rate'], scenarios['inflation_rate'], scenarios['num_years'],
+        scenarios['usage_cost'], scenarios['warranty_years'], scenarios['commission_cost'])
+    np.testing.assert_allclose(metrics['total_pv_cost'], pv_cost_table.sum(axis=1), rtol=1e-9)
+    np.testing.assert_allclose(metrics['total_grid_cost'], grid_cost_table.sum(axis=1), rtol=1e-9)
+
+
+def test_cost_tables_without_years():
+    pv_cost_table, grid_cost_table = cost_tables_batch([10, 5], 50, 10, [0, 0], 1000, 2, 1e6)
+    assert pv_cost_table.shape == grid_cost_table.shape == (2, 0)
+    assert np.isnan(payback_year_batch(pv_cost_table, grid_cost_table, [0, 0])).all()
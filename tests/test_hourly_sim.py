@@ -0,0 +1,57 @@
+# test_hourly_sim.py
+#
+# The vectorized dispatch scans against the hour-by-hour loops they replace.
+
+import numpy as np
+import pytest
+
+from hourly_sim import clipped_cumsum, compose_prefix_maps
+
+
+def naive_clipped_cumsum(flows, lower, upper, initial):
+    soc = np.empty_like(flows)
+    for site in range(flows.shape[0]):
+        x = initial[site]
+        for t in range(flows.shape[1]):
+            x = min(max(x + flows[site, t], lower[site]), upper[site])
+            soc[site, t] = x
+    return soc
+
+
+@pytest.mark.parametrize('block', [1, 4, 24])
+def test_clipped_cumsum_matches_loop(block):
+    rng = np.random.default_rng(block)
+    n_sites, hours = 6, 24 * 15
+    flows = rng.normal(0, 3, size=(n_sites, hours))
+    lower = rng.uniform(0, 2, size=n_sites)
+    upper = lower + rng.uniform(0, 10, size=n_sites)
+    upper[0] = lower[0]  # no usable storage
+    initial = rng.uniform(lower, upper)
+
+    np.testing.assert_allclose(clipped_cumsum(flows, lower, upper, initial, block=block),
+                               naive_clipped_cumsum(flows, lower, upper, initial), rtol=1e-12, atol=1e-9)
+
+
+def test_clipped_cumsum_scalar_bounds():
+    flows = np.array([[5.0, -2.0, 8.0, -20.0, 1.0, 3.0]])
+    expected = naive_clipped_cumsum(flows, [0.0], [10.0], [4.0])
+    np.testing.assert_allclose(clipped_cumsum(flows, 0.0, 10.0, 4.0, block=3), expected)
+
+
+@pytest.mark.parametrize('length', [1, 2, 7, 16, 33])
+def test_compose_prefix_maps_matches_sequential_composition(length):
+    rng = np.random.default_rng(length)
+    n_sites = 4
+    shift = rng.normal(0, 3, size=(n_sites, length))
+    low = rng.uniform(-5, 5, size=(n_sites, length))
+    high = low + rng.uniform(0, 5, size=(n_sites, length))
+    composed = [array.copy() for array in (shift, low, high)]
+    compose_prefix_maps(*composed)
+
+    points = np.linspace(-20, 20, 41)
+    for site in range(n_sites):
+        x = points.copy()
+        for t in range(length):
+            x = np.clip(x + shift[site, t], low[site, t], high[site, t])
+            c_shift, c_low, c_high = (array[site, t] for array in composed)
+            np.testing.assert_allclose(np.clip(points + c_shift, c_low, c_high), x, rtol=1e-12, atol=1e-9)
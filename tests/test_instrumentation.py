@@ -0,0 +1,50 @@
+# test_instrumentation.py
+#
+# collect_stages records each stage's peak heap growth, including what an
+# enclosing stage reached before a nested stage reset the traced peak.
+
+import tracemalloc
+
+import pytest
+
+from instrumentation import collect_stages, stage
+
+KIB = 1024
+
+
+@pytest.fixture
+def tracing():
+    tracemalloc.start()
+    yield
+    tracemalloc.stop()
+
+
+def test_stage_peaks(tracing):
+    peaks = {}
+    with collect_stages(peaks=peaks) as stages:
+        with stage('outer'):
+            block = bytearray(512 * KIB)
+            del block
+            with stage('inner'):
+                block = bytearray(64 * KIB)
+                del block
+    assert set(stages) == {'outer', 'inner'}
+    assert 64 * KIB <= peaks['inner'] < 512 * KIB
+    assert peaks['outer'] >= 512 * KIB
+
+
+def test_stage_peaks_keep_largest_run(tracing):
+    peaks = {}
+    with collect_stages(peaks=peaks):
+        for size in (256, 16):
+            with stage('render'):
+                block = bytearray(size * KIB)
+                del block
+    assert peaks['render'] >= 256 * KIB
+
+
+def test_no_peaks_without_dict():
+    with collect_stages() as stages:
+        with stage('compute'):
+            pass
+    assert set(stages) == {'compute'}
@@ -0,0 +1,125 @@
+# test_irradiance.py
+#
+# The nearest data cell of every grid cell, and of every looked-up location,
+# matches a brute-force search over all cells with data.
+
+import json
+import os
+
+import numpy as np
+import pytest
+
+from irradiance import IrradianceGrid, nearest_cells
+
+N_GRIDS = 60
+
+
+def random_grid(rng):
+    n_lat, n_lon = rng.integers(1, 14, size=2)
+    step_lat, step_lon = rng.choice([0.25, 0.5, 1.0], size=2)
+    lat0, lon0 = rng.uniform(-10, 14), rng.uniform(2, 14)
+    latitude = lat0 + np.arange(n_lat) * step_lat
+    longitude = lon0 + np.arange(n_lon) * step_lon
+    has_data = rng.random((n_lat, n_lon)) < rng.uniform(0.05, 0.6)
+    has_data[rng.integers(n_lat), rng.integers(n_lon)] = True
+    return has_data, latitude, longitude
+
+
+def brute_force_nearest(has_data, latitude, longitude, row, column):
+    """Flat index of the data cell nearest to cell (row, column); ties go to the lower index."""
+    n_lat, n_lon = has_data.shape
+    scale = np.cos(np.radians(latitude))
+    best, best_index = np.inf, None
+    for index in np.flatnonzero(has_data):
+        other_row, other_column = divmod(index, n_lon)
+        distance = ((latitude[row] - latitude[other_row]) ** 2
+                    + ((longitude[column] - longitude[other_column]) * scale[row]) ** 2)
+        if distance < best:
+            best, best_index = distance, index
+    return best_index
+
+
+@pytest.mark.parametrize('seed', range(N_GRIDS))
+def test_nearest_cells(seed):
+    has_data, latitude, longitude = random_grid(np.random.default_rng(seed))
+    nearest = nearest_cells(has_data, latitude, longitude)
+    n_lat, n_lon = has_data.shape
+    expected = [[brute_force_nearest(has_data, latitude, longitude, row, column) for column in range(n_lon)]
+                for row in range(n_lat)]
+    np.testing.assert_array_equal(nearest, expected)
+
+
+def test_nearest_cells_ties():
+    # Equidistant data cells on either side, and above and below: the lower index wins
+    has_data = np.zeros((3, 5), dtype=bool)
+    has_data[1, [0, 4]] = True
+    has_data[[0, 2], 2] = True
+    nearest = nearest_cells(has_data, np.arange(3.0), np.arange(5.0))
+    assert nearest[1, 2] == 2
+    assert nearest[1, 1] == 5
+    assert nearest[1, 3] == 9
+    # Without a latitude difference, a cell of the row above ties with one of its own row
+    nearest = nearest_cells(has_data, np.zeros(3), np.arange(5.0))
+    assert nearest[1, 1] == 2
+
+
+def test_nearest_cells_without_data():
+    with pytest.raises(ValueError):
+        nearest_cells(np.zeros((2, 2), dtype=bool), np.zeros(2), np.zeros(2))
+
+
+def write_grid(directory, has_data, latitude, longitude, rng):
+    n_lat, n_lon = has_data.shape
+    monthly_ghi = np.where(has_data[..., None], rng.uniform(3, 7, (n_lat, n_lon, 12)), np.nan).astype(np.float32)
+    np.save(os.path.join(directory, 'monthly_ghi.npy'), monthly_ghi)
+    np.save(os.path.join(directory, 'nearest.npy'), nearest_cells(has_data, latitude, longitude).astype(np.int32))
+    with open(os.path.join(directory, 'grid.json'), 'w') as file:
+        json.dump({'lat0': latitude[0], 'lon0': longitude[0],
+                   'step_lat': latitude[1] - latitude[0] if n_lat > 1 else 1.0,
+                   'step_lon': longitude[1] - longitude[0] if n_lon > 1 else 1.0,
+                   'n_lat': int(n_lat), 'n_lon': int(n_lon)}, file)
+    return IrradianceGrid(directory)
+
+
+def nearest_centres(centres, value):
+    """Indices of the cell centres nearest to ``value`` (two on a cell edge), clipped to the grid."""
+    distance = np.abs(centres - value)
+    return np.flatnonzero(np.isclose(distance, distance.min(), rtol=0, atol=1e-9))
+
+
+@pytest.mark.parametrize('seed', range(0, N_GRIDS, 6))
+def test_lookup(tmp_path, seed):
+    rng = np.random.default_rng(seed)
+    has_data, latitude, longitude = random_grid(rng)
+    grid = write_grid(str(tmp_path), has_data, latitude, longitude, rng)
+    step_lat, step_lon = grid.step_lat, grid.step_lon
+
+    # Random points over the grid and up to a cell beyond it, cell centres, and points on cell edges
+    queries = [(rng.uniform(latitude[0] - step_lat, latitude[-1] + step_lat),
+                rng.uniform(longitude[0] - step_lon, longitude[-1] + step_lon)) for _ in range(50)]
+    queries += [(lat, lon) for lat in latitude for lon in longitude]
+    queries += [(lat + step_lat / 2, lon + step_lon / 2) for lat in latitude for lon in longitude]
+    queries += [(lat, lon - step_lon / 2) for lat in latitude for lon in longitude]
+    queries = [(round(lat, 6), round(lon, 6)) for lat, lon in queries]
+
+    for lat, lon in queries:
+        # Any of the nearest cell centres (one per axis off the edges) is a correct location
+        accepted = {brute_force_nearest(has_data, latitude, longitude, row, column)
+                    for row in nearest_centres(latitude, lat) for column in nearest_centres(longitude, lon)}
+        index = int(grid.cell_index(lat, lon))
+        assert index in accepted, (lat, lon)
+        np.testing.assert_array_equal(grid.monthly_ghi_at(f"{lat}, {lon}"), grid.monthly_ghi[index])
+
+    batch = grid.cell_index([lat for lat, _ in queries], [lon for _, lon in queries])
+    assert batch.tolist() == [int(grid.cell_index(lat, lon)) for lat, lon in queries]
+
+
+def test_lookup_outside(tmp_path):
+    rng = np.random.default_rng(0)
+    has_data, latitude, longitude = random_grid(rng)
+    grid = write_grid(str(tmp_path), has_data, latitude, longitude, rng)
+    outside = latitude[-1] + 3 * grid.step_lat
+    with pytest.raises(ValueError, match="outside the irradiance dataset"):
+        grid.cell_index(outside, longitude[0])
+    with pytest.raises(ValueError, match="outside the irradiance dataset"):
+        grid.monthly_ghi_at(f"{outside}, {longitude[0]}")
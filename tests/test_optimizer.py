@@ -0,0 +1,56 @@
+# test_optimizer.py
+#
+# The Pareto front of the system optimizer against a brute-force dominance check.
+
+import numpy as np
+import pytest
+
+from optimizer import invalid_catalog_rows, pareto_front
+
+
+def brute_force_front(cost, autonomy, emissions):
+    """Objective triples not dominated by any other configuration."""
+    points = list(zip(cost, autonomy, emissions))
+    front = set()
+    for c, a, e in points:
+        dominated = any(oc <= c and oa >= a and oe <= e and (oc < c or oa > a or oe < e)
+                        for oc, oa, oe in points)
+        if not dominated:
+            front.add((c, a, e))
+    return front
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_pareto_front_matches_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    size = rng.integers(1, 400)
+    # Few distinct values, so ties and exact duplicates are common
+    cost = rng.integers(0, 30, size).astype(float) * 1000
+    autonomy = rng.choice([1.0, 2.0, 3.0], size)
+    emissions = rng.integers(0, 30, size).astype(float)
+
+    front = pareto_front(cost, autonomy, emissions)
+    triples = [(cost[i], autonomy[i], emissions[i]) for i in front]
+    # One configuration per non-dominated objective triple, cheapest first
+    assert set(triples) == brute_force_front(cost, autonomy, emissions)
+    assert len(triples) == len(set(triples))
+    assert np.all(np.diff(cost[front]) >= 0)
+
+
+def test_pareto_front_empty():
+    assert pareto_front([], [], []).size == 0
+
+
+@pytest.mark.parametrize('bad', [np.nan, np.inf, -np.inf])
+def test_pareto_front_rejects_non_finite_objectives(bad):
+    with pytest.raises(ValueError):
+        pareto_front([1.0, bad], [1.0, 1.0], [1.0, 1.0])
+
+
+def test_invalid_catalog_rows():
+    panels = {'length': [1.6, 0, 1.6], 'width': [1.0, 1.0, 1.0], 'efficiency': [20, 20, np.nan],
+              'unit_cost': [5e4, 5e4, 5e4]}
+    batteries = {'capacity': [200, 100], 'voltage': [12, 12], 'unit_cost': [6e4, -1]}
+    bad_panels, bad_batteries = invalid_catalog_rows(panels, batteries)
+    assert bad_panels.tolist() == [1, 2]
+    assert bad_batteries.tolist() == [1]
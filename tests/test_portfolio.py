@@ -0,0 +1,64 @@
+# test_portfolio.py
+#
+# Sites the portfolio cannot compute get a Note and empty outputs instead of
+# failing their chunk, and no Within Budget verdict.
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from portfolio import RESULT_COLUMNS, evaluate_sites
+
+# The app's default inputs
+DEFAULT_DESIGN = {
+    'panel_length': 1.6, 'panel_width': 1.0, 'panel_efficiency': 20, 'inverter_efficiency': 95, 'state': 'Lagos',
+    'daily_target_energy': 10, 'autonomy_days': 2, 'battery_voltage': 12, 'depth_of_discharge': 50,
+    'battery_efficiency': 95, 'battery_capacity': 200,
+    'solar_panel_unit_cost': 50000, 'controller_cost': 20000, 'inverter_cost': 100000, 'battery_unit_cost': 60000,
+    'misc_procurement_cost': 10000, 'solar_panel_install_cost': 5000, 'controller_install_cost': 2000,
+    'inverter_install_cost': 5000, 'battery_install_cost': 3000, 'misc_install_cost': 5000,
+    'maintenance_visits_per_year': 2, 'warranty_years': 2, 'grid_rate': 50, 'inflation_rate': 10, 'num_years': 10,
+    'maintenance_cost_per_panel': 500, 'maintenance_cost_controller': 500, 'maintenance_cost_inverter': 1000,
+    'maintenance_cost_per_battery': 500, 'maintenance_misc_cost': 500, 'discount_rate': 10,
+    'num_years_emission': 10, 'daily_target_energy_emission': 10,
+}
+
+COMPUTED_COLUMNS = ['Panels', 'Batteries', 'Capex (₦)', 'Payback Year', 'PV LCOE (₦/kWh)',
+                    'Grid Emissions (kgCO2)', 'PV Emissions (kgCO2)']
+
+
+def sites(loads, budget=1e12):
+    return pd.DataFrame({'site': [f"Site {i + 1}" for i in range(len(loads))], 'state': 'Lagos',
+                         'daily_target_energy': loads, 'budget': budget})
+
+
+def test_valid_sites():
+    results = evaluate_sites(sites([10.0, 12.5, np.nan]), DEFAULT_DESIGN)
+    assert list(results.columns) == RESULT_COLUMNS
+    assert (results['Note'] == '').all()
+    assert results[COMPUTED_COLUMNS].notna().all().all()
+    assert (results['Within Budget'] == 'Yes').all()
+    # A site without a load uses the design's
+    assert results['Daily Target Energy (kWh)'].iloc[2] == DEFAULT_DESIGN['daily_target_energy']
+
+
+def test_zero_load():
+    results = evaluate_sites(sites([0.0]), DEFAULT_DESIGN)
+    assert results['Note'].iloc[0] == ''
+    assert results['Panels'].iloc[0] == 0
+
+
+@pytest.mark.parametrize('load', [-5.0, np.inf, -np.inf])
+def test_bad_load(load):
+    results = evaluate_sites(sites([10.0, load]), DEFAULT_DESIGN)
+    assert results['Note'].iloc[0] == ''
+    assert 'Daily Target Energy' in results['Note'].iloc[1]
+    assert results[COMPUTED_COLUMNS].iloc[1].isna().all()
+    assert results['Within Budget'].tolist() == ['Yes', '']
+
+
+def test_unsizable_design():
+    results = evaluate_sites(sites([10.0, 20.0]), {**DEFAULT_DESIGN, 'depth_of_discharge': 0})
+    assert results['Note'].str.startswith('Cannot be sized').all()
+    assert results['Batteries'].isna().all()
+    assert (results['Within Budget'] == '').all()
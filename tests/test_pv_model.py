@@ -0,0 +1,141 @@
+# test_pv_model.py
+#
+# The batch sizing engine against the single-site functions the UI calls, and
+# against the original per-month formulas, site by site.
+
+import math
+
+import numpy as np
+import pytest
+
+from pv_model import (DAYS_IN_MONTH, calculate_monthly_pv_potential, calculate_monthly_pv_potential_batch, ghi,
+                      months, monthly_variation_factors, size_from_potential_batch, size_pv_system,
+                      size_pv_system_batch)
+
+N_SITES = 200
+
+COUNTS = ['min_panels', 'total_battery_capacity', 'number_of_batteries']
+
+
+def random_sites(n_sites, seed=0):
+    rng = np.random.default_rng(seed)
+    return {
+        'panel_length': rng.uniform(0.5, 2.5, n_sites).round(2),
+        'panel_width': rng.uniform(0.5, 1.5, n_sites).round(2),
+        'panel_efficiency': rng.uniform(5, 25, n_sites).round(1),
+        'inverter_efficiency': rng.uniform(80, 99, n_sites).round(1),
+        'state': rng.choice(list(ghi), n_sites),
+        'daily_target_energy': rng.uniform(0, 60, n_sites).round(1),
+        'autonomy_days': rng.integers(0, 5, n_sites).astype(float),
+        'battery_voltage': rng.choice([12.0, 24.0, 48.0], n_sites),
+        'depth_of_discharge': rng.uniform(20, 100, n_sites).round(),
+        'battery_efficiency': rng.uniform(70, 100, n_sites).round(),
+        'battery_capacity': rng.choice([100.0, 150.0, 200.0, 250.0], n_sites),
+    }
+
+
+def unsizable_sites(n_sites):
+    """Sites with one input each that the panels or the batteries cannot be sized with."""
+    sites = random_sites(n_sites, seed=1)
+    for i, (name, value) in enumerate([('panel_efficiency', 0.0), ('inverter_efficiency', -5.0),
+                                       ('panel_length', 0.0), ('daily_target_energy', np.nan),
+                                       ('depth_of_discharge', 0.0), ('battery_efficiency', 0.0),
+                                       ('battery_voltage', -12.0), ('battery_capacity', 0.0),
+                                       ('battery_voltage', np.inf), ('panel_length', np.inf),
+                                       ('battery_capacity', np.inf)]):
+        sites[name][2 * i] = value
+    return sites
+
+
+def site(sites, i):
+    return {name: values[i].item() for name, values in sites.items()}
+
+
+def original_sizing(panel_length, panel_width, panel_efficiency, inverter_efficiency, state, daily_target_energy,
+                    autonomy_days, battery_voltage, depth_of_discharge, battery_efficiency, battery_capacity):
+    """The app's original per-month sizing of one site."""
+    panel_area = panel_length * panel_width
+    panel_efficiency /= 100
+    inverter_efficiency /= 100
+    monthly_pv_potential = [ghi[state] * panel_area * panel_efficiency * inverter_efficiency
+                            * monthly_variation_factors[month] for month in months]
+    min_panels = math.ceil(daily_target_energy / min(monthly_pv_potential))
+    depth_of_discharge /= 100
+    battery_efficiency /= 100
+    total_battery_capacity = (((daily_target_energy * autonomy_days * 1000) / battery_voltage)
+                              * (1 / battery_efficiency) * (1 / depth_of_discharge))
+    total_battery_capacity = math.ceil(total_battery_capacity)
+    number_of_batteries = math.ceil(total_battery_capacity / battery_capacity)
+    monthly_generation = [min_panels * potential * days for potential, days in zip(monthly_pv_potential, DAYS_IN_MONTH)]
+    return min_panels, total_battery_capacity, number_of_batteries, monthly_pv_potential, monthly_generation
+
+
+def test_potential_matches_scalar():
+    sites = random_sites(N_SITES)
+    arguments = [sites[name] for name in ('panel_length', 'panel_width', 'panel_efficiency',
+                                          'inverter_efficiency', 'state')]
+    batch = calculate_monthly_pv_potential_batch(*arguments)
+    assert batch.shape == (N_SITES, 12)
+    for i in range(N_SITES):
+        potential, potential_months = calculate_monthly_pv_potential(*[argument[i].item() for argument in arguments])
+        assert potential_months == months
+        assert batch[i].tolist() == potential
+
+
+def test_sizing_matches_scalar_and_original():
+    sites = random_sites(N_SITES)
+    batch = size_pv_system_batch(**sites)
+    for name in COUNTS:
+        assert batch[name].dtype == np.int64
+    for i in range(N_SITES):
+        expected = size_pv_system(**site(sites, i))
+        assert expected[:3] == original_sizing(**site(sites, i))[:3]
+        assert tuple(batch[name][i] for name in COUNTS) == expected[:3]
+        assert batch['monthly_pv_potential'][i].tolist() == expected[3]
+        assert batch['monthly_generation'][i].tolist() == expected[4]
+        np.testing.assert_allclose(expected[4], original_sizing(**site(sites, i))[4], rtol=1e-12)
+
+
+def test_size_from_potential_batch_matches_size_pv_system_batch():
+    sites = random_sites(N_SITES)
+    potential = calculate_monthly_pv_potential_batch(
+        sites['panel_length'], sites['panel_width'], sites['panel_efficiency'], sites['inverter_efficiency'],
+        sites['state'])
+    sizing_arguments = {name: values for name, values in sites.items() if name not in (
+        'panel_length', 'panel_width', 'panel_efficiency', 'inverter_efficiency', 'state')}
+    from_potential = size_from_potential_batch(potential, **sizing_arguments)
+    batch = size_pv_system_batch(**sites)
+    for name, values in batch.items():
+        np.testing.assert_array_equal(from_potential[name], values)
+
+
+def test_unsizable_sites():
+    sites = unsizable_sites(40)
+    batch = size_pv_system_batch(**sites)
+    for name in COUNTS:
+        assert batch[name].dtype == np.float64
+    for i in range(40):
+        try:
+            expected = size_pv_system(**site(sites, i))
+        except ValueError as error:
+            if 'panels' in str(error):
+                assert np.isnan(batch['min_panels'][i])
+                assert np.isnan(batch['monthly_generation'][i]).all()
+            else:
+                assert not np.isnan(batch['min_panels'][i])
+                assert np.isnan(batch['total_battery_capacity'][i])
+                assert np.isnan(batch['number_of_batteries'][i])
+        else:
+            assert tuple(batch[name][i] for name in COUNTS) == expected[:3]
+            assert batch['monthly_generation'][i].tolist() == expected[4]
+    # Every site that was made unsizable is NaN, and only those
+    unsizable = np.isnan(batch['min_panels']) | np.isnan(batch['number_of_batteries'])
+    assert np.flatnonzero(unsizable).tolist() == list(range(0, 22, 2))
+
+
+def test_scalar_broadcast():
+    sites = random_sites(5)
+    batch = size_pv_system_batch(**{**sites, 'state': 'Kano', 'battery_voltage': 24.0})
+    for i in range(5):
+        expected = size_pv_system(**{**site(sites, i), 'state': 'Kano', 'battery_voltage': 24.0})
+        assert tuple(batch[name][i] for name in COUNTS) == expected[:3]
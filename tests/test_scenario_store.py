@@ -0,0 +1,61 @@
+# test_scenario_store.py
+#
+# Replaying an imported yst_batch output file through the current model finds
+# no mismatches, including for the scenarios the batch could not compute.
+
+import pandas as pd
+import pytest
+
+from scenario_store import ScenarioStore
+from yst_batch import INPUT_COLUMNS, run_pipeline
+
+# The app's default inputs
+DEFAULT_SCENARIO = {
+    'panel_length': 1.6, 'panel_width': 1.0, 'panel_efficiency': 20, 'inverter_efficiency': 95, 'state': 'Lagos',
+    'daily_target_energy': 10, 'autonomy_days': 2, 'battery_voltage': 12, 'depth_of_discharge': 50,
+    'battery_efficiency': 95, 'battery_capacity': 200,
+    'solar_panel_unit_cost': 50000, 'controller_cost': 20000, 'inverter_cost': 100000,
+    'battery_unit_cost': 60000, 'misc_procurement_cost': 10000, 'maintenance_cost': 500,
+    'maintenance_visits_per_year': 2, 'warranty_years': 2, 'grid_rate': 50, 'inflation_rate': 10,
+    'num_years': 10, 'num_years_emission': 10,
+}
+
+# Scenarios the batch computes, and ones it notes as unsizable, unknown or with bad years
+SCENARIOS = [
+    {}, {'daily_target_energy': 25, 'state': 'Kano'}, {'num_years': 30, 'inflation_rate': 0},
+    {'depth_of_discharge': 0}, {'panel_efficiency': 0}, {'state': 'Nowhere'}, {'num_years': 0},
+]
+
+
+@pytest.fixture
+def batch_output(tmp_path):
+    scenarios = pd.DataFrame([{INPUT_COLUMNS[name]: value for name, value in {**DEFAULT_SCENARIO, **changes}.items()}
+                              for changes in SCENARIOS])
+    results = run_pipeline(scenarios)
+    assert (results['Note'] != '').sum() == 4
+    path = tmp_path / 'results.csv'
+    results.to_csv(path, index=False)
+    return path, results
+
+
+def test_replay_imported_batch(tmp_path, batch_output):
+    path, _ = batch_output
+    store = ScenarioStore(str(tmp_path / 'scenarios.db'))
+    assert store.import_csv(str(path)) == len(SCENARIOS)
+    report = store.replay()
+    assert report['mismatched'].sum() == 0, report[report['mismatched'] > 0]
+    # Costs of the three computed scenarios; sizing also of the two where only panels or batteries could be sized
+    assert report.loc['commission_cost', 'compared'] == 3
+    assert report.loc['min_panels', 'compared'] == 5
+
+
+def test_replay_finds_changed_result(tmp_path, batch_output):
+    path, results = batch_output
+    results.loc[1, 'Total Commissioning Cost (Naira)'] += 1000
+    results.to_csv(path, index=False)
+    store = ScenarioStore(str(tmp_path / 'scenarios.db'))
+    store.import_csv(str(path))
+    report = store.replay()
+    assert report.loc['commission_cost', 'mismatched'] == 1
+    assert report.loc['commission_cost', 'max_abs_diff'] == pytest.approx(1000)
+    assert report['mismatched'].sum() == 1
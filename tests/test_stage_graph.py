@@ -0,0 +1,73 @@
+# test_stage_graph.py
+#
+# A GraphState recomputes only the stages whose own inputs or upstream results
+# changed.
+
+import pytest
+
+from stage_graph import GraphState, Stage, StageGraph, model_graph
+
+# The app's default inputs
+DEFAULT_INPUTS = {
+    'panel_length': 1.6, 'panel_width': 1.0, 'panel_efficiency': 20, 'inverter_efficiency': 95, 'state': 'Lagos',
+    'daily_target_energy': 10, 'autonomy_days': 2, 'battery_voltage': 12, 'depth_of_discharge': 50,
+    'battery_efficiency': 95, 'battery_capacity': 200,
+    'solar_panel_unit_cost': 50000, 'controller_cost': 20000, 'inverter_cost': 100000, 'battery_unit_cost': 60000,
+    'misc_procurement_cost': 10000, 'solar_panel_install_cost': 5000, 'controller_install_cost': 2000,
+    'inverter_install_cost': 5000, 'battery_install_cost': 3000, 'misc_install_cost': 5000,
+    'maintenance_visits_per_year': 2, 'warranty_years': 2, 'grid_rate': 50, 'inflation_rate': 10, 'num_years': 10,
+    'maintenance_cost_per_panel': 500, 'maintenance_cost_controller': 500, 'maintenance_cost_inverter': 1000,
+    'maintenance_cost_per_battery': 500, 'maintenance_misc_cost': 500, 'discount_rate': 10,
+    'num_years_emission': 10, 'daily_target_energy_emission': 10,
+}
+
+TARGETS = ['cost', 'emissions']
+
+
+@pytest.fixture
+def state():
+    state = GraphState(model_graph)
+    assert state.evaluate(TARGETS, **DEFAULT_INPUTS) == {'potential', 'sizing', 'cost', 'emissions'}
+    return state
+
+
+def test_unchanged_inputs_recompute_nothing(state):
+    counts = dict(state.recomputations)
+    assert state.evaluate(TARGETS, **DEFAULT_INPUTS) == set()
+    assert state.recomputations == counts
+
+
+def test_inflation_rate_recomputes_only_the_cost_stage(state):
+    counts = dict(state.recomputations)
+    assert state.evaluate(TARGETS, **{**DEFAULT_INPUTS, 'inflation_rate': 12}) == {'cost'}
+    assert state.recomputations == {**counts, 'cost': counts['cost'] + 1}
+
+
+def test_unchanged_upstream_result_stops_invalidation():
+    def tens(x):
+        return x // 10
+
+    def label(tens, suffix):
+        return f'{tens}{suffix}'
+
+    graph = StageGraph([Stage('tens', tens), Stage('label', label, upstream=['tens'])])
+    state = GraphState(graph)
+    state.evaluate(['label'], x=11, suffix='0s')
+    # 'tens' is recomputed with the same result, so 'label' stays valid
+    assert state.evaluate(['label'], x=12, suffix='0s') == set()
+    assert state.recomputations == {'tens': 2, 'label': 1}
+    assert state.evaluate(['label'], x=25, suffix='0s') == {'tens', 'label'}
+    assert state.results['label'] == '20s'
+
+
+def test_state_recomputes_the_model_chain_but_not_emissions(state):
+    counts = dict(state.recomputations)
+    state.evaluate(TARGETS, **{**DEFAULT_INPUTS, 'state': 'Kano'})
+    assert state.recomputations == {**counts, 'potential': counts['potential'] + 1, 'sizing': counts['sizing'] + 1,
+                                    'cost': counts['cost'] + 1}
+
+
+def test_downstream():
+    assert model_graph.downstream('inflation_rate') == {'cost'}
+    assert model_graph.downstream('state') == {'potential', 'sizing', 'cost'}
+    assert model_graph.downstream('num_years_emission') == {'emissions'}
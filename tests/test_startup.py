@@ -0,0 +1,23 @@
+# test_startup.py
+#
+# The spawned simulation workers re-import the app script; that must not pull in gradio, pandas or
+# plotly.
+
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ['gradio', 'pandas', 'matplotlib', 'plotly']
+
+
+def test_worker_import_skips_heavy_modules():
+    # A fresh interpreter, importing the script the way a spawned worker does
+    code = (
+        "import runpy, sys\n"
+        "runpy.run_path('YST-V1.py', run_name='__mp_main__')\n"
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))\n"
+    )
+    result = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == ''
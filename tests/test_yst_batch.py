@@ -0,0 +1,63 @@
+# test_yst_batch.py
+#
+# Scenarios the batch pipeline cannot compute get a Note and empty outputs
+# instead of failing their chunk.
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from yst_batch import FINANCIAL_COLUMNS, INPUT_COLUMNS, NOTE_COLUMN, OUTPUT_COLUMNS, run_batch, run_pipeline
+
+# The app's default inputs
+DEFAULT_SCENARIO = {
+    'panel_length': 1.6, 'panel_width': 1.0, 'panel_efficiency': 20, 'inverter_efficiency': 95, 'state': 'Lagos',
+    'daily_target_energy': 10, 'autonomy_days': 2, 'battery_voltage': 12, 'depth_of_discharge': 50,
+    'battery_efficiency': 95, 'battery_capacity': 200,
+    'solar_panel_unit_cost': 50000, 'controller_cost': 20000, 'inverter_cost': 100000,
+    'battery_unit_cost': 60000, 'misc_procurement_cost': 10000, 'maintenance_cost': 500,
+    'maintenance_visits_per_year': 2, 'warranty_years': 2, 'grid_rate': 50, 'inflation_rate': 10,
+    'num_years': 10, 'num_years_emission': 10,
+}
+
+COMPUTED_COLUMNS = OUTPUT_COLUMNS + FINANCIAL_COLUMNS
+
+
+def scenarios(num_years):
+    rows = [{INPUT_COLUMNS[name]: value for name, value in DEFAULT_SCENARIO.items()} for _ in num_years]
+    frame = pd.DataFrame(rows)
+    frame[INPUT_COLUMNS['num_years']] = num_years
+    return frame
+
+
+def test_bad_years_get_a_note_and_empty_outputs():
+    results = run_pipeline(scenarios([10, 0, np.nan, 2.5, -3, 25]))
+    bad = [False, True, True, True, True, False]
+
+    assert (results[NOTE_COLUMN] != '').tolist() == bad
+    assert results.loc[bad, COMPUTED_COLUMNS].isna().all().all()
+    assert results.loc[[not b for b in bad], COMPUTED_COLUMNS].notna().all().all()
+
+    # The valid rows are computed as if they were alone
+    for i in (0, 5):
+        alone = run_pipeline(scenarios([results[INPUT_COLUMNS['num_years']][i]]))
+        pd.testing.assert_series_equal(results.loc[i, COMPUTED_COLUMNS], alone.loc[0, COMPUTED_COLUMNS],
+                                       check_names=False)
+
+
+def test_series_of_bad_years_are_nan():
+    _, series = run_pipeline(scenarios([0, 5]), return_series=True)
+    for values in series.values():
+        assert np.isnan(values[0]).all()
+        assert not np.isnan(values[1]).any()
+
+
+@pytest.mark.parametrize('num_years', [[0, 0, 0], [np.nan, np.nan, np.nan]])
+def test_chunk_of_only_bad_years_does_not_abort_the_batch(tmp_path, num_years):
+    # The first chunk is valid, the second has only bad rows
+    input_path, output_path = tmp_path / 'scenarios.csv', tmp_path / 'results.csv'
+    scenarios([10, 20, 30] + num_years).to_csv(input_path, index=False)
+
+    assert run_batch(str(input_path), str(output_path), chunksize=3, workers=1) == (6, 3)
+    results = pd.read_csv(output_path, keep_default_na=False, na_values=[''])
+    assert results[NOTE_COLUMN].isna().tolist() == [True] * 3 + [False] * 3
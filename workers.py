@@ -0,0 +1,127 @@
+# workers.py
+#
+# Worker pools for the Gradio app. Light handlers (sizing, charts, cost tables)
+# run on Gradio's queue threads; heavy simulations (Monte Carlo, optimizer,
+# hourly dispatch) are sent to a shared process pool so they neither hold the
+# GIL against other users nor block the light handlers.
+#
+# The number of heavy jobs admitted at once is bounded: when every slot is
+# taken, new jobs wait up to ADMISSION_TIMEOUT seconds and are then rejected
+# with ServerBusy instead of piling up in memory.
+
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+PROCESS_WORKERS = int(os.environ.get('YST_PROCESS_WORKERS', os.cpu_count() or 1))
+MAX_HEAVY_JOBS = int(os.environ.get('YST_MAX_HEAVY_JOBS', 0)) or None  # None: 2 x process workers
+ADMISSION_TIMEOUT = float(os.environ.get('YST_ADMISSION_TIMEOUT', 10))
+
+
+class ServerBusy(RuntimeError):
+    """Raised when a heavy job cannot be admitted within the admission timeout."""
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def heavy_job_limit():
+    """Heavy jobs admitted at once: MAX_HEAVY_JOBS, or 2 x process workers when it is not set."""
+    return MAX_HEAVY_JOBS or 2 * PROCESS_WORKERS
+
+
+_slots = threading.BoundedSemaphore(heavy_job_limit())
+
+
+def configure(process_workers=None, max_heavy_jobs=None, admission_timeout=None):
+    """Override the pool settings; must be called before the first heavy job.
+
+    Without ``max_heavy_jobs`` (or YST_MAX_HEAVY_JOBS) the admission limit follows the process workers.
+    """
+    global PROCESS_WORKERS, MAX_HEAVY_JOBS, ADMISSION_TIMEOUT, _slots
+    with _pool_lock:
+        if _pool is not None:
+            raise RuntimeError("The process pool is already running")
+        if process_workers:
+            PROCESS_WORKERS = process_workers
+        if max_heavy_jobs:
+            MAX_HEAVY_JOBS = max_heavy_jobs
+        _slots = threading.BoundedSemaphore(heavy_job_limit())
+        if admission_timeout is not None:
+            ADMISSION_TIMEOUT = admission_timeout
+
+
+def get_process_pool():
+    """The shared process pool, started on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: forking a process that is running server threads is not safe
+            _pool = ProcessPoolExecutor(max_workers=PROCESS_WORKERS,
+                                        mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def run_heavy(function, *args, **kwargs):
+    """Run ``function(*args, **kwargs)`` in the process pool and wait for its result.
+
+    ``function`` must be importable from a module (not a closure) and its arguments picklable.
+    """
+    if PROCESS_WORKERS <= 1:
+        return function(*args, **kwargs)
+
+    if not _slots.acquire(timeout=ADMISSION_TIMEOUT):
+        raise ServerBusy("The server is busy with other simulations, please try again shortly.")
+    try:
+        return get_process_pool().submit(function, *args, **kwargs).result()
+    finally:
+        _slots.release()
+
+
+def imap_heavy(function, items, *args, max_pending=None):
+    """Yield ``function(item, *args)`` for every item, in order, computed in the process pool.
+
+    At most ``max_pending`` items (default: 2 x process workers) are in flight, so ``items`` is consumed
+    only as fast as results are taken and memory stays bounded. The whole stream uses one heavy-job slot.
+    """
+    if PROCESS_WORKERS <= 1:
+        for item in items:
+            yield function(item, *args)
+        return
+
+    max_pending = max_pending or 2 * PROCESS_WORKERS
+    if not _slots.acquire(timeout=ADMISSION_TIMEOUT):
+        raise ServerBusy("The server is busy with other simulations, please try again shortly.")
+    pending = deque()
+    try:
+        pool = get_process_pool()
+        for item in items:
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+            pending.append(pool.submit(function, item, *args))
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        # Closed early (e.g. the client left): drop the work that has not started
+        for future in pending:
+            future.cancel()
+        _slots.release()
+
+
+def warm_up():
+    """Start every worker process ahead of the first heavy job."""
+    if PROCESS_WORKERS > 1:
+        pool = get_process_pool()
+        for future in [pool.submit(os.getpid) for _ in range(PROCESS_WORKERS)]:
+            future.result()
+
+
+def shutdown():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
@@ -0,0 +1,233 @@
+# yst_batch.py
+#
+# Headless batch mode: streams a scenario CSV (same columns as flagged/log.csv)
+# through the design / cost / carbon pipeline and writes the computed columns.
+# Only numpy and pandas are needed, so it runs without Gradio or any plotting.
+#
+# Usage:
+#     python yst_batch.py scenarios.csv results.csv --chunksize 50000 --workers 8
+
+import argparse
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from pv_model import ghi, site_errors, size_pv_system_batch, calculate_emissions_batch
+from cost_model import commissioning_costs_batch, cost_tables_batch, life_cycle_metrics_batch, payback_year_batch
+
+# Input columns, keyed by the pipeline argument they feed
+INPUT_COLUMNS = {
+    'panel_length': 'Solar Panel Length (m)',
+    'panel_width': 'Solar Panel Width (m)',
+    'panel_efficiency': 'Solar Panel Efficiency (%)',
+    'inverter_efficiency': 'Inverter Efficiency (%)',
+    'state': 'State',
+    'daily_target_energy': 'Daily Target Energy (kWh)',
+    'autonomy_days': 'Autonomy Days',
+    'battery_voltage': 'Battery Voltage (V)',
+    'depth_of_discharge': 'Depth of Discharge (%)',
+    'battery_efficiency': 'Battery Efficiency (%)',
+    'battery_capacity': 'Battery Capacity (Ah)',
+    'solar_panel_unit_cost': 'Solar Panel Cost (Naira)',
+    'controller_cost': 'Controller Cost (Naira)',
+    'inverter_cost': 'Inverter Cost (Naira)',
+    'battery_unit_cost': 'Battery Cost (Naira)',
+    'misc_procurement_cost': 'Miscellaneous Cost (Naira)',
+    'maintenance_cost': 'Maintenance Cost per visit (Naira)',
+    'maintenance_visits_per_year': 'Maintenance Rounds per Year',
+    'warranty_years': 'Warranty Years',
+    'grid_rate': 'Grid Electricity Rate (Naira/kWh)',
+    'inflation_rate': 'Inflation Rate (%)',
+    'num_years': 'Number of Years for Price Simulation',
+    'num_years_emission': 'Number of Years for Carbon Emissions Assessment',
+}
+
+# flagged/log.csv has no installation costs or discount rate; these columns are read when present and default to 0
+OPTIONAL_INPUT_COLUMNS = {
+    'solar_panel_install_cost': 'Installation Cost per Solar Panel (Naira)',
+    'controller_install_cost': 'Installation Cost of Charge Controller (Naira)',
+    'inverter_install_cost': 'Installation Cost of Inverter (Naira)',
+    'battery_install_cost': 'Installation Cost per Battery (Naira)',
+    'misc_install_cost': 'Miscellaneous Installation Costs (Naira)',
+    'discount_rate': 'Discount Rate (%)',
+}
+
+# Computed columns, in flagged/log.csv order
+OUTPUT_COLUMNS = [
+    'Number of Panels Required',
+    'Total Battery Capacity (Ah)',
+    'Number of Batteries Needed',
+    'Total Procurement Cost (Naira)',
+    'Total Installation Cost (Naira)',
+    'Total Commissioning Cost (Naira)',
+    'Maintenance Cost per Year (Naira)',
+    'Total Grid Electricity Cost Over Simulation Period (Naira)',
+    'Total PV Electricity Cost Over Simulation Period (Naira)',
+    'Cumulative Grid Cost (Naira)',
+    'Cumulative PV Cost (Naira)',
+    'Total Grid Carbon Emissions (kgCO2)',
+    'Total PV Carbon Emissions (kgCO2)',
+]
+
+# Financial metrics not recorded in flagged/log.csv, appended after the other columns
+FINANCIAL_COLUMNS = [
+    'PV Cost NPV (Naira)',
+    'Grid Cost NPV (Naira)',
+    'PV LCOE (Naira/kWh)',
+    'Grid LCOE (Naira/kWh)',
+    'Payback Year',
+]
+
+# Why a scenario's computed columns are empty; blank for the scenarios that were computed
+NOTE_COLUMN = 'Note'
+
+
+def pipeline_inputs(scenarios):
+    """Pipeline arguments by name, read from the ``INPUT_COLUMNS`` and ``OPTIONAL_INPUT_COLUMNS`` of ``scenarios``."""
+    missing = [column for column in INPUT_COLUMNS.values() if column not in scenarios.columns]
+    if missing:
+        raise ValueError(f"Scenario file is missing columns: {', '.join(missing)}")
+
+    inputs = {name: scenarios[column].to_numpy() for name, column in INPUT_COLUMNS.items()}
+    for name, column in OPTIONAL_INPUT_COLUMNS.items():
+        inputs[name] = scenarios[column].fillna(0).to_numpy() if column in scenarios.columns else 0
+    return inputs
+
+
+def run_pipeline(scenarios, return_series=False):
+    """Compute the design, cost and carbon outputs for a DataFrame of scenarios.
+
+    Returns a copy of ``scenarios`` with every column in ``OUTPUT_COLUMNS`` and ``FINANCIAL_COLUMNS`` filled in.
+    Scenarios with a blank or unknown state, a number of years that is not a whole number of at least 1,
+    or that cannot be sized, get NaN outputs and a ``NOTE_COLUMN`` explaining why, instead of failing the
+    whole chunk.
+
+    With ``return_series``, returns ``(results, series)`` where ``series`` holds the per-scenario
+    ``monthly_pv_potential`` and ``monthly_generation`` (n, 12) and ``pv_cost_table`` and ``grid_cost_table``
+    (n, max years) arrays behind the results, NaN for scenarios with an unknown state or number of years.
+    """
+    inputs = pipeline_inputs(scenarios)
+    notes = site_errors(inputs['state'])
+    unknown_site = notes != ''
+    if unknown_site.any():
+        # Any state will do: the outputs of these scenarios are blanked below
+        inputs['state'] = np.where(unknown_site, next(iter(ghi)), inputs['state'])
+
+    num_years = pd.to_numeric(inputs['num_years'], errors='coerce').astype(float)
+    with np.errstate(invalid='ignore'):
+        bad_years = ~(np.isfinite(num_years) & (num_years >= 1) & (num_years == np.round(num_years)))
+    notes[bad_years & ~unknown_site] = f"{INPUT_COLUMNS['num_years']} must be a whole number of at least 1"
+    # As with unknown states, any valid value will do for the scenarios blanked below
+    inputs['num_years'] = np.where(bad_years, 1, num_years).astype(np.int64)
+    blank = unknown_site | bad_years
+
+    sizing = size_pv_system_batch(
+        inputs['panel_length'], inputs['panel_width'], inputs['panel_efficiency'], inputs['inverter_efficiency'],
+        inputs['state'], inputs['daily_target_energy'], inputs['autonomy_days'], inputs['battery_voltage'],
+        inputs['depth_of_discharge'], inputs['battery_efficiency'], inputs['battery_capacity'])
+    min_panels = sizing['min_panels']
+    number_of_batteries = sizing['number_of_batteries']
+
+    total_procurement_cost, total_installation_cost, commission_cost = commissioning_costs_batch(
+        min_panels, number_of_batteries,
+        inputs['solar_panel_unit_cost'], inputs['controller_cost'], inputs['inverter_cost'],
+        inputs['battery_unit_cost'], inputs['misc_procurement_cost'],
+        inputs['solar_panel_install_cost'], inputs['controller_install_cost'], inputs['inverter_install_cost'],
+        inputs['battery_install_cost'], inputs['misc_install_cost'])
+    usage_cost = inputs['maintenance_cost'] * inputs['maintenance_visits_per_year']
+
+    metrics = life_cycle_metrics_batch(
+        inputs['daily_target_energy'], inputs['grid_rate'], inputs['inflation_rate'], inputs['num_years'],
+        usage_cost, inputs['warranty_years'], commission_cost, inputs['discount_rate'])
+    pv_cost_table, grid_cost_table = cost_tables_batch(
+        inputs['daily_target_energy'], inputs['grid_rate'], inputs['inflation_rate'], inputs['num_years'],
+        usage_cost, inputs['warranty_years'], commission_cost)
+    payback_year = payback_year_batch(pv_cost_table, grid_cost_table, inputs['num_years'])
+
+    total_grid_emission, total_solar_emission = calculate_emissions_batch(
+        inputs['daily_target_energy'], inputs['num_years_emission'])
+
+    results = scenarios.copy()
+    outputs = [min_panels, sizing['total_battery_capacity'], number_of_batteries,
+               total_procurement_cost, total_installation_cost, commission_cost, usage_cost,
+               metrics['total_grid_cost'], metrics['total_pv_cost'], metrics['total_grid_cost'], metrics['total_pv_cost'],
+               total_grid_emission, total_solar_emission,
+               metrics['npv_pv_cost'], metrics['npv_grid_cost'], metrics['lcoe_pv'], metrics['lcoe_grid'], payback_year]
+    notes[~blank & (np.isnan(min_panels) | np.isnan(number_of_batteries))] = (
+        "Cannot be sized: efficiencies, depth of discharge, battery voltage and capacity must be positive")
+    for column, values in zip(OUTPUT_COLUMNS + FINANCIAL_COLUMNS, outputs):
+        values = np.broadcast_to(values, (len(scenarios),))
+        results[column] = np.where(blank, np.nan, values) if blank.any() else values
+    results[NOTE_COLUMN] = notes
+
+    if not return_series:
+        return results
+    series = {'monthly_pv_potential': sizing['monthly_pv_potential'], 'monthly_generation': sizing['monthly_generation'],
+              'pv_cost_table': pv_cost_table, 'grid_cost_table': grid_cost_table}
+    if blank.any():
+        series = {name: np.where(blank[:, None], np.nan, values) for name, values in series.items()}
+    return results, series
+
+
+def run_batch(input_path, output_path, chunksize=50000, workers=None):
+    """Stream ``input_path`` through the pipeline and write the results to ``output_path``.
+
+    Chunks are computed in a process pool; at most ``2 * workers`` chunks are in flight so memory
+    stays bounded regardless of file size, and results are written in input order. The results go to a
+    partial file that replaces ``output_path`` only once every chunk succeeded.
+
+    Returns ``(rows_written, rows_with_notes)``.
+    """
+    workers = workers or os.cpu_count() or 1
+    max_pending = 2 * workers
+    partial_path = f'{output_path}.partial'
+    rows_written = 0
+    rows_with_notes = 0
+    header = True
+
+    def write(results):
+        nonlocal rows_written, rows_with_notes, header
+        results.to_csv(partial_path, mode='w' if header else 'a', header=header, index=False)
+        rows_written += len(results)
+        rows_with_notes += int((results[NOTE_COLUMN] != '').sum())
+        header = False
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = deque()
+            for chunk in pd.read_csv(input_path, chunksize=chunksize):
+                if len(pending) >= max_pending:
+                    write(pending.popleft().result())
+                pending.append(executor.submit(run_pipeline, chunk))
+
+            while pending:
+                write(pending.popleft().result())
+    except BaseException:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+    if rows_written:
+        os.replace(partial_path, output_path)
+
+    return rows_written, rows_with_notes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run Yellow Sun Tool scenarios without the UI.")
+    parser.add_argument('input', help="Scenario CSV with the same columns as flagged/log.csv")
+    parser.add_argument('output', help="Where to write the scenarios with their computed columns")
+    parser.add_argument('--chunksize', type=int, default=50000, help="Rows per chunk (default: 50000)")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: CPU count)")
+    args = parser.parse_args()
+
+    rows, rows_with_notes = run_batch(args.input, args.output, chunksize=args.chunksize, workers=args.workers)
+    print(f"Wrote {rows:,} scenarios to {args.output}")
+    if rows_with_notes:
+        print(f"{rows_with_notes:,} scenarios could not be computed; see the {NOTE_COLUMN} column")
+
+
+if __name__ == "__main__":
+    main()